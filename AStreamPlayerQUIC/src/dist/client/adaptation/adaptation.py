@@ -2,10 +2,13 @@
 Adaptation algorithms
 1. basic_dash
 2. weighted_dash
+The throughput estimators are in throughput.py
 """
 
 from __future__ import division
 
+from throughput import HarmonicMeanEstimator
+
 
 def calculate_rate_index(bitrates, curr_rate):
     """ Module that finds the bitrate closes to the curr_rate
@@ -28,10 +31,10 @@ class WeightedMean:
         The weights are the sizes of the segments
     """
     def __init__(self, sample_count):
-        # List of (size, download_rate)
-        self.segment_info = list()
         self.weighted_mean_rate = 0
         self.sample_count = sample_count
+        # The mean is over the last sample_count + 1 segments
+        self.estimator = HarmonicMeanEstimator(sample_count + 1)
 
     def update_weighted_mean(self, segment_size, segment_download_time):
         """ Method to update the weighted harmonic mean for the segments.
@@ -39,10 +42,5 @@ class WeightedMean:
             segment_download_time is in seconds
             http://en.wikipedia.org/wiki/Harmonic_mean#Weighted_harmonic_mean
         """
-        segment_download_rate = segment_size / segment_download_time
-        while len(self.segment_info) > self.sample_count:
-            self.segment_info.pop(0)
-        self.segment_info.append((segment_size, segment_download_rate))
-        self.weighted_mean_rate = sum([size for size, _ in self.segment_info]) / sum([s/r for s, r in self.segment_info])
+        self.weighted_mean_rate = self.estimator.update(segment_size, segment_download_time)
         return self.weighted_mean_rate
-
@@ -1,6 +1,9 @@
+from __future__ import division
+
 __author__ = 'pjuluri'
 
 from adaptation import calculate_rate_index
+from bitrate_ladder import as_ladder
 import config_dash
 
 
@@ -9,7 +12,7 @@ def basic_dash(segment_number, bitrates, average_dwn_time,
     """
     Module to predict the next_bitrate using the basic_dash algorithm
     :param segment_number: Current segment number
-    :param bitrates: A tuple/list of available bitrates
+    :param bitrates: Bitrate ladder or tuple/list of available bitrates
     :param average_dwn_time: Average download time observed so far
     :param segment_download_time:  Time taken to download the current segment
     :param curr_rate: Current bitrate being used
@@ -25,8 +28,7 @@ def basic_dash(segment_number, bitrates, average_dwn_time,
                                                                                                      updated_dwn_time,
                                                                                                      average_dwn_time))
 
-    bitrates = [float(i) for i in bitrates]
-    bitrates.sort()
+    bitrates = as_ladder(bitrates)
     try:
         sigma_download = average_dwn_time / segment_download_time
         config_dash.LOG.debug("Sigma Download = {}/{} = {}".format(average_dwn_time, segment_download_time,
@@ -35,7 +37,7 @@ def basic_dash(segment_number, bitrates, average_dwn_time,
         config_dash.LOG.error("Download time = 0. Unable to calculate the sigma_download")
         return curr_rate, updated_dwn_time
     try:
-        curr = bitrates.index(curr_rate)
+        curr = bitrates.rank(curr_rate)
     except ValueError:
         config_dash.LOG.error("Current Bitrate not in the bitrate lsit. Setting to minimum")
         curr = calculate_rate_index(bitrates, curr_rate)
@@ -0,0 +1,122 @@
+"""
+Bitrate ladder: the sorted bitrates of a manifest with the lookups of the adaptation algorithms.
+A ladder is built once for each list of bitrates (as_ladder), so the algorithms accept either a ladder
+or a plain list and no longer sort the bitrates for every segment.
+"""
+
+from __future__ import division
+
+from bisect import bisect_left
+from collections import OrderedDict
+
+import config_dash
+
+# Ladders built by as_ladder, keyed by the tuple of bitrates they were built from
+LADDERS = dict()
+
+
+def build_rate_map(bitrates, reservoir, cushion):
+    """ Module to generate the Netflix rate map (buffer occupancy marker -> bitrate) for the sorted bitrates """
+    rate_map = OrderedDict()
+    rate_map[reservoir] = bitrates[0]
+    intermediate_levels = bitrates[1:-1]
+    marker_length = (cushion - reservoir) / (len(intermediate_levels) + 1)
+    current_marker = reservoir + marker_length
+    for bitrate in intermediate_levels:
+        rate_map[current_marker] = bitrate
+        current_marker += marker_length
+    rate_map[cushion] = bitrates[-1]
+    return rate_map
+
+
+class BitrateLadder(object):
+    """ Immutable sorted bitrates. Indexing, len() and iteration work like on the sorted list """
+    __slots__ = ('bitrates', 'ranks', 'rate_maps')
+
+    def __init__(self, bitrates):
+        object.__setattr__(self, 'bitrates', tuple(sorted(int(bitrate) for bitrate in bitrates)))
+        object.__setattr__(self, 'ranks', dict((bitrate, rank) for rank, bitrate in enumerate(self.bitrates)))
+        # Netflix rate maps and their markers, keyed by (reservoir, cushion)
+        object.__setattr__(self, 'rate_maps', dict())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("BitrateLadder is immutable")
+
+    def __len__(self):
+        return len(self.bitrates)
+
+    def __iter__(self):
+        return iter(self.bitrates)
+
+    def __reversed__(self):
+        return reversed(self.bitrates)
+
+    def __getitem__(self, index):
+        return self.bitrates[index]
+
+    def __contains__(self, bitrate):
+        return bitrate in self.ranks
+
+    def __repr__(self):
+        return "BitrateLadder({})".format(list(self.bitrates))
+
+    @property
+    def lowest(self):
+        return self.bitrates[0]
+
+    @property
+    def highest(self):
+        return self.bitrates[-1]
+
+    def rank(self, bitrate):
+        """ :return: The index of bitrate in the ladder. ValueError if it is not in the ladder, like list.index """
+        try:
+            return self.ranks[bitrate]
+        except KeyError:
+            raise ValueError("{} is not in the ladder".format(bitrate))
+
+    def higher(self, bitrate):
+        """ :return: The bitrate above bitrate. IndexError for the highest bitrate """
+        return self.bitrates[self.rank(bitrate) + 1]
+
+    def below(self, rate):
+        """ :return: The bitrates lower than rate, in increasing order """
+        return self.bitrates[:bisect_left(self.bitrates, rate)]
+
+    def at_least(self, rate):
+        """ :return: The bitrates at or above rate, in increasing order """
+        return self.bitrates[bisect_left(self.bitrates, rate):]
+
+    def highest_below(self, rate):
+        """ :return: The highest bitrate lower than rate. None if there is none """
+        index = bisect_left(self.bitrates, rate)
+        return self.bitrates[index - 1] if index else None
+
+    def get_rate_map(self):
+        """ :return: The Netflix rate map for the current NETFLIX_RESERVOIR and NETFLIX_CUSHION """
+        return self.get_rate_map_entry()[0]
+
+    def get_rate_map_entry(self):
+        """ :return: (rate map, markers, bitrates of the markers), built once for each reservoir and cushion """
+        key = (config_dash.NETFLIX_RESERVOIR, config_dash.NETFLIX_CUSHION)
+        entry = self.rate_maps.get(key)
+        if entry is None:
+            rate_map = build_rate_map(self.bitrates, *key)
+            entry = self.rate_maps[key] = (rate_map, tuple(rate_map.keys()), tuple(rate_map.values()))
+        return entry
+
+    def rate_map_bitrate(self, buffer_percentage):
+        """ :return: The bitrate of the first rate map marker at or above buffer_percentage """
+        _, markers, bitrates = self.get_rate_map_entry()
+        return bitrates[min(bisect_left(markers, buffer_percentage), len(markers) - 1)]
+
+
+def as_ladder(bitrates):
+    """ Module to get the ladder of a list of bitrates. Ladders are returned as they are """
+    if isinstance(bitrates, BitrateLadder):
+        return bitrates
+    key = tuple(bitrates)
+    ladder = LADDERS.get(key)
+    if ladder is None:
+        ladder = LADDERS[key] = BitrateLadder(key)
+    return ladder
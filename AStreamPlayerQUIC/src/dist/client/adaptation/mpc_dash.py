@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""
+ Model predictive control (MPC) rate adaptation. Every segment, the bitrate is the first one of the sequence of
+ the next MPC_HORIZON bitrates with the best predicted QoE:
+    sum of the bitrates - MPC_REBUFFER_PENALTY * rebuffering time - MPC_SWITCH_PENALTY * sum of the bitrate switches
+ (bitrates in Mbps, times in seconds), predicted from the throughput estimate, the buffer level and the segment sizes.
+ The throughput estimate is lowered by the recent estimation errors, like RobustMPC.
+
+ The decisions are memoized in a decision table shared by all the sessions of a manifest, keyed by the horizon,
+ the current bitrate, the buffer level (in MPC_BUFFER_STEP seconds) and the throughput (in MPC_THROUGHPUT_STEP
+ steps). The segment sizes enter through the throughput: the throughput is scaled by the size of the next segments
+ relative to the average segment size (SegmentSizes.window_size), so the table does not depend on the segment.
+ A decision that is not in the table yet is planned with a dynamic program over the horizon.
+ Ref. FastMPC in [1]
+
+[1] Yin, Xiaoqi, et al. "A control-theoretic approach for dynamic adaptive video streaming over HTTP."
+    Proceedings of the 2015 ACM Conference on Special Interest Group on Data Communication. ACM, 2015.
+"""
+from __future__ import division
+
+import math
+
+from bitrate_ladder import as_ladder
+import config_dash
+
+
+# Decision tables by (bitrates, average segment sizes, segment duration, MPC constants)
+DECISION_TABLES = dict()
+
+
+class DecisionTable(object):
+    """ Memoized MPC decisions for one bitrate ladder and segment duration """
+    def __init__(self, bitrates, average_sizes, segment_duration):
+        """
+        :param bitrates: sorted bitrates in bps
+        :param average_sizes: average segment size in bits of each bitrate
+        """
+        self.rates = [bitrate / 1000000 for bitrate in bitrates]
+        self.average_sizes = list(average_sizes)
+        self.segment_duration = segment_duration
+        self.max_buffer = config_dash.MPC_BUFFER_SIZE * segment_duration
+        self.buffer_step = config_dash.MPC_BUFFER_STEP
+        self.log_throughput_step = math.log(1 + config_dash.MPC_THROUGHPUT_STEP)
+        self.decisions = dict()
+
+    def decision(self, horizon, level, buffer_level, throughput):
+        """
+        :param horizon: number of segments to plan
+        :param level: index of the current bitrate
+        :param buffer_level: seconds of video in the buffer
+        :param throughput: estimated throughput in bits per second
+        :return: index of the bitrate of the next segment
+        """
+        # The buffer level and the throughput are rounded down to their steps
+        buffer_bin = int(min(buffer_level, self.max_buffer) / self.buffer_step)
+        throughput_bin = int(math.floor(math.log(throughput) / self.log_throughput_step))
+        key = (horizon, level, buffer_bin, throughput_bin)
+        decision = self.decisions.get(key)
+        if decision is None:
+            decision = self.decisions[key] = self.plan(horizon, level, buffer_bin * self.buffer_step,
+                                                       math.exp(throughput_bin * self.log_throughput_step))
+        return decision
+
+    def plan(self, horizon, level, buffer_level, throughput):
+        """ Module to find the first bitrate of the best sequence of `horizon` bitrates
+        :return: index of the bitrate
+        """
+        download_times = [size / throughput for size in self.average_sizes]
+        rates = self.rates
+        segment_duration = self.segment_duration
+        max_buffer = self.max_buffer
+        buffer_step = self.buffer_step
+        switch_penalty = config_dash.MPC_SWITCH_PENALTY
+        rebuffer_penalty = config_dash.MPC_REBUFFER_PENALTY
+        # The best state after each step for each (level, buffer level in buffer_step): (QoE, buffer level, first
+        # level). Sequences that reach the same level with about the same buffer are only continued from the best
+        states = {(level, 0): (0, buffer_level, None)}
+        for _ in range(horizon):
+            next_states = dict()
+            for (previous_level, _), (qoe, buffer, first_level) in states.items():
+                previous_rate = rates[previous_level]
+                for next_level, rate in enumerate(rates):
+                    download_time = download_times[next_level]
+                    next_qoe = qoe + rate - switch_penalty * abs(rate - previous_rate)
+                    if download_time > buffer:
+                        next_qoe -= rebuffer_penalty * (download_time - buffer)
+                        next_buffer = segment_duration
+                    else:
+                        next_buffer = buffer - download_time + segment_duration
+                        if next_buffer > max_buffer:
+                            next_buffer = max_buffer
+                    key = (next_level, int(next_buffer / buffer_step))
+                    state = next_states.get(key)
+                    if state is None or next_qoe > state[0]:
+                        next_states[key] = (next_qoe, next_buffer,
+                                            next_level if first_level is None else first_level)
+            states = next_states
+        return max(states.values())[2]
+
+
+def get_decision_table(bitrates, average_sizes, segment_duration):
+    """ Module to get the decision table of the bitrates for the current MPC constants """
+    key = (tuple(bitrates), tuple(average_sizes), segment_duration, config_dash.MPC_BUFFER_SIZE,
+           config_dash.MPC_REBUFFER_PENALTY, config_dash.MPC_SWITCH_PENALTY, config_dash.MPC_BUFFER_STEP,
+           config_dash.MPC_THROUGHPUT_STEP)
+    table = DECISION_TABLES.get(key)
+    if table is None:
+        table = DECISION_TABLES[key] = DecisionTable(bitrates, average_sizes, segment_duration)
+    return table
+
+
+def mpc_dash(bitrates, segment_sizes, segment_index, remaining_segments, buffer_level, segment_duration,
+             throughput, current_bitrate, prediction_error=0):
+    """
+    Module to predict the next_bitrate using the MPC algorithm
+    :param bitrates: Bitrate ladder or list of bitrates
+    :param segment_sizes: read_mpd.SegmentSizes of the manifest
+    :param segment_index: SegmentSize index of the next segment
+    :param remaining_segments: number of segments left to download, including the next segment
+    :param buffer_level: seconds of video in the buffer
+    :param segment_duration: playback duration of a segment in seconds
+    :param throughput: estimated download rate in bytes per second
+    :param current_bitrate: bitrate of the last segment
+    :param prediction_error: largest relative error of the recent throughput estimates. The throughput is divided
+                             by 1 + prediction_error (RobustMPC in [1])
+    :return: next_bitrate
+    """
+    bitrates = as_ladder(bitrates)
+    if throughput <= 0:
+        return bitrates.lowest
+    horizon = min(config_dash.MPC_HORIZON, remaining_segments)
+    if horizon <= 0:
+        return current_bitrate
+    # Bitrates without SegmentSize lists are assumed to be encoded at exactly the bitrate
+    average_sizes = [segment_sizes.average_sizes.get(bitrate) or bitrate * segment_duration for bitrate in bitrates]
+    table = get_decision_table(bitrates, average_sizes, segment_duration)
+    # Scale the throughput by the size of the next segments relative to the average segment size
+    throughput = throughput * 8 / (1 + prediction_error)
+    listed_segments = min(horizon, segment_sizes.segment_count - segment_index)
+    if segment_index >= 0 and listed_segments > 0:
+        window_size = sum(segment_sizes.window_size(segment_index, listed_segments, bitrate) for bitrate in bitrates)
+        if window_size > 0:
+            throughput *= sum(average_sizes) * listed_segments / window_size
+    level = table.decision(horizon, bitrates.rank(current_bitrate), buffer_level, throughput)
+    config_dash.LOG.info("MPC: Throughput = {} bps, buffer = {} seconds, next_bitrate = {}".format(
+        throughput, buffer_level, bitrates[level]))
+    return bitrates[level]
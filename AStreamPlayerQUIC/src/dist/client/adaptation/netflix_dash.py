@@ -2,8 +2,7 @@
 
 from __future__ import division
 
-from collections import OrderedDict
-
+from bitrate_ladder import as_ladder
 import config_dash
 
 
@@ -21,18 +20,10 @@ __author__ = 'pjuluri'
 
 def get_rate_map(bitrates):
     """
-    Module to generate the rate map for the bitrates, reservoir, and cushion
+    Module to generate the rate map for the bitrates, reservoir, and cushion.
+    The map is built once for each ladder (bitrate_ladder.py)
     """
-    rate_map = OrderedDict()
-    rate_map[config_dash.NETFLIX_RESERVOIR] = bitrates[0]
-    intermediate_levels = bitrates[1:-1]
-    marker_length = (config_dash.NETFLIX_CUSHION - config_dash.NETFLIX_RESERVOIR)/(len(intermediate_levels)+1)
-    current_marker = config_dash.NETFLIX_RESERVOIR + marker_length
-    for bitrate in intermediate_levels:
-        rate_map[current_marker] = bitrate
-        current_marker += marker_length
-    rate_map[config_dash.NETFLIX_CUSHION] = bitrates[-1]
-    return rate_map
+    return as_ladder(bitrates).get_rate_map()
 
 
 def get_rate_netflix(bitrates, current_buffer_occupancy, buffer_size=config_dash.NETFLIX_BUFFER_SIZE, rate_map=None):
@@ -48,15 +39,11 @@ def get_rate_netflix(bitrates, current_buffer_occupancy, buffer_size=config_dash
     Ref. Fig. 6 from [1]
 
     :param current_buffer_occupancy: Current buffer occupancy in number of segments
-    :param bitrates: List of available bitrates [r_min, .... r_max]
+    :param bitrates: Bitrate ladder or list of available bitrates [r_min, .... r_max]
     :return:the bitrate for the next segment
     """
     next_bitrate = None
-    try:
-        bitrates = [int(i) for i in bitrates]
-        bitrates.sort()
-    except ValueError:
-        config_dash.LOG.error("Unable to sort the bitrates. Assuming they are sorted")
+    bitrates = as_ladder(bitrates)
     # Calculate the current buffer occupancy percentage
     try:
         buffer_percentage = current_buffer_occupancy/buffer_size
@@ -65,12 +52,13 @@ def get_rate_netflix(bitrates, current_buffer_occupancy, buffer_size=config_dash
         config_dash.LOG.error("Buffer Size was found to be Zero")
         return None
     # Selecting the next bitrate based on the rate map
-    if not rate_map:
-        rate_map = get_rate_map(bitrates)
     if buffer_percentage <= config_dash.NETFLIX_RESERVOIR:
-        next_bitrate = bitrates[0]
+        next_bitrate = bitrates.lowest
     elif buffer_percentage >= config_dash.NETFLIX_CUSHION:
-        next_bitrate = bitrates[-1]
+        next_bitrate = bitrates.highest
+    elif not rate_map or rate_map is bitrates.get_rate_map():
+        # Bisection on the markers of the ladder's rate map
+        next_bitrate = bitrates.rate_map_bitrate(buffer_percentage)
     else:
         config_dash.LOG.info("Rate Map: {}".format(rate_map))
         for marker in reversed(rate_map.keys()):
@@ -84,15 +72,16 @@ def netflix_dash(bitrates, dash_player, segment_download_rate, curr_bitrate, ave
     """
     Netflix rate adaptation module
     """
+    bitrates = as_ladder(bitrates)
     current_buffer_size=dash_player.buffer.qsize()
     if JUMP_BUFFER_COUNTER>0:
         current_buffer_size=config_dash.NETFLIX_BUFFER_SIZE
         JUMP_BUFFER_COUNTER=JUMP_BUFFER_COUNTER-1
     available_video_segments = current_buffer_size - dash_player.initial_buffer
     if not (curr_bitrate or rate_map or state):
-        rate_map = get_rate_map(bitrates)
+        rate_map = bitrates.get_rate_map()
         state = "INITIAL"
-        next_bitrate = bitrates[0]
+        next_bitrate = bitrates.lowest
     elif state == "INITIAL":
         # if the B increases by more than 0.875V s. Since B = V - ChunkSize/c[k],
         # B > 0:875V also means that the chunk is downloaded eight times faster than it is played
@@ -101,7 +90,7 @@ def netflix_dash(bitrates, dash_player, segment_download_rate, curr_bitrate, ave
         delta_B = dash_player.segment_duration - average_segment_sizes[curr_bitrate]/segment_download_rate
         # Select the higher bitrate as long as delta B > 0.875 * V
         if delta_B > config_dash.NETFLIX_INITIAL_FACTOR * dash_player.segment_duration:
-            next_bitrate = bitrates[bitrates.index(curr_bitrate)+1]
+            next_bitrate = bitrates.higher(curr_bitrate)
         # if the current buffer occupancy is less that NETFLIX_INITIAL_BUFFER, then do NOY use rate map
         if not available_video_segments < config_dash.NETFLIX_INITIAL_BUFFER:
 
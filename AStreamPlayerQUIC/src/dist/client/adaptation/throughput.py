@@ -0,0 +1,154 @@
+"""
+Throughput estimators of the adaptation algorithms.
+Every estimator takes the (segment size, download time) of the downloaded segments with update() and
+keeps its estimate of the download rate (bytes per second) in `estimate`, the number of samples it is based on in
+`sample_count` and their mean download time in mean_download_time():
+1. HarmonicMeanEstimator: weighted harmonic mean of the rates in a sliding window (SARA, BASIC-2)
+2. EwmaEstimator: exponentially weighted moving average of the rates
+3. PercentileEstimator: percentile of the rates in a sliding window
+The windows are ring buffers with running sums, so an update does not depend on the window size.
+Download times below MIN_DOWNLOAD_TIME count as MIN_DOWNLOAD_TIME in every estimator, so an instantaneous segment
+gives a high rate instead of a division by zero.
+"""
+
+from __future__ import division
+
+from bisect import bisect_left, insort
+
+# Seconds. Shortest download time of a sample
+MIN_DOWNLOAD_TIME = 1e-3
+
+
+class SlidingWindow(object):
+    """ The last `capacity` (segment size, download time) samples with the sums of the sizes and the times """
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("The window needs room for at least one sample")
+        self.capacity = capacity
+        self.sizes = [0] * capacity
+        self.times = [0] * capacity
+        # Position of the next sample and number of samples in the window
+        self.position = 0
+        self.count = 0
+        self.size_sum = 0
+        self.time_sum = 0
+        # Samples added since the sums were last recomputed
+        self.updates = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, segment_size, segment_download_time):
+        """ Add a sample. Returns the (size, time) sample it replaced, or None while the window is not full """
+        replaced = None
+        if self.count == self.capacity:
+            replaced = self.sizes[self.position], self.times[self.position]
+            self.size_sum -= replaced[0]
+            self.time_sum -= replaced[1]
+        else:
+            self.count += 1
+        self.sizes[self.position] = segment_size
+        self.times[self.position] = segment_download_time
+        self.size_sum += segment_size
+        self.time_sum += segment_download_time
+        self.position = (self.position + 1) % self.capacity
+        # Recompute the sums once per window to drop the rounding errors of the subtractions
+        self.updates += 1
+        if self.updates >= self.capacity:
+            self.updates = 0
+            self.size_sum = sum(self.sizes[:self.count])
+            self.time_sum = sum(self.times[:self.count])
+        return replaced
+
+
+class HarmonicMeanEstimator(object):
+    """ Harmonic mean of the download rates in the window, weighted by the segment sizes.
+        It is the sum of the sizes over the sum of the download times
+        http://en.wikipedia.org/wiki/Harmonic_mean#Weighted_harmonic_mean
+    """
+    def __init__(self, window_size):
+        # Estimated download rate in bytes per second. 0 before the first sample
+        self.estimate = 0
+        self.sample_count = 0
+        self.window = SlidingWindow(window_size)
+
+    def update(self, segment_size, segment_download_time):
+        """ Add the measurement of a downloaded segment (bytes, seconds). Returns the new estimate """
+        segment_download_time = max(segment_download_time, MIN_DOWNLOAD_TIME)
+        self.window.append(segment_size, segment_download_time)
+        self.sample_count = len(self.window)
+        self.estimate = self.window.size_sum / self.window.time_sum if self.window.time_sum else 0
+        return self.estimate
+
+    def mean_download_time(self):
+        return self.window.time_sum / len(self.window) if len(self.window) else 0
+
+
+class EwmaEstimator(object):
+    """ Exponentially weighted moving average of the download rates """
+    def __init__(self, weight):
+        """ :param weight: weight of the newest sample, between 0 and 1 """
+        self.estimate = 0
+        self.sample_count = 0
+        self.weight = weight
+        self.average_download_time = 0
+
+    def update(self, segment_size, segment_download_time):
+        segment_download_time = max(segment_download_time, MIN_DOWNLOAD_TIME)
+        segment_download_rate = segment_size / segment_download_time
+        if not self.sample_count:
+            self.estimate = segment_download_rate
+            self.average_download_time = segment_download_time
+        else:
+            self.estimate += self.weight * (segment_download_rate - self.estimate)
+            self.average_download_time += self.weight * (segment_download_time - self.average_download_time)
+        self.sample_count += 1
+        return self.estimate
+
+    def mean_download_time(self):
+        return self.average_download_time
+
+
+class PercentileEstimator(object):
+    """ Percentile of the download rates in the window, interpolated linearly between the closest ranks
+        (like numpy.percentile). The rates are also kept sorted, so an update is a bisection and one insertion
+    """
+    def __init__(self, window_size, percentile):
+        """ :param percentile: between 0 and 100. Low percentiles give conservative estimates """
+        self.estimate = 0
+        self.sample_count = 0
+        self.window = SlidingWindow(window_size)
+        self.percentile = percentile
+        self.sorted_rates = list()
+
+    def update(self, segment_size, segment_download_time):
+        segment_download_time = max(segment_download_time, MIN_DOWNLOAD_TIME)
+        segment_download_rate = segment_size / segment_download_time
+        replaced = self.window.append(segment_size, segment_download_time)
+        if replaced:
+            del self.sorted_rates[bisect_left(self.sorted_rates, replaced[0] / replaced[1])]
+        insort(self.sorted_rates, segment_download_rate)
+        self.sample_count = len(self.window)
+        rank = (len(self.sorted_rates) - 1) * self.percentile / 100
+        lower = int(rank)
+        upper = min(lower + 1, len(self.sorted_rates) - 1)
+        self.estimate = (self.sorted_rates[lower] +
+                         (self.sorted_rates[upper] - self.sorted_rates[lower]) * (rank - lower))
+        return self.estimate
+
+    def mean_download_time(self):
+        return self.window.time_sum / len(self.window) if len(self.window) else 0
+
+
+def get_estimator(estimator_type, window_size, ewma_weight=0.3, percentile=50):
+    """ Module to create an estimator
+    :param estimator_type: 'harmonic', 'ewma' or 'percentile'
+    :param window_size: number of samples of the windowed estimators
+    """
+    if estimator_type == 'harmonic':
+        return HarmonicMeanEstimator(window_size)
+    elif estimator_type == 'ewma':
+        return EwmaEstimator(ewma_weight)
+    elif estimator_type == 'percentile':
+        return PercentileEstimator(window_size, percentile)
+    raise ValueError("Unknown throughput estimator: {}".format(estimator_type))
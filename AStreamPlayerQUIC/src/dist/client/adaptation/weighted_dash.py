@@ -1,19 +1,19 @@
 __author__ = 'pjuluri'
 
+from bitrate_ladder import as_ladder
 import config_dash
 
 
 def weighted_dash(bitrates, dash_player, weighted_dwn_rate, curr_bitrate, next_segment_sizes,JUMP_BUFFER_COUNTER):
     """
     Module to predict the next_bitrate using the weighted_dash algorithm
-    :param bitrates: List of bitrates
+    :param bitrates: Bitrate ladder or list of bitrates
     :param weighted_dwn_rate:
     :param curr_bitrate:
     :param next_segment_sizes: A dict mapping bitrate: size of next segment
     :return: next_bitrate, delay
     """
-    bitrates = [int(i) for i in bitrates]
-    bitrates.sort()
+    bitrates = as_ladder(bitrates)
     # Waiting time before downloading the next segment
     delay = 0
     next_bitrate = None
@@ -35,26 +35,25 @@ def weighted_dash(bitrates, dash_player, weighted_dwn_rate, curr_bitrate, next_s
                                                                       curr_bitrate))
 
     if weighted_dwn_rate == 0 or available_video_segments == 0:
-        next_bitrate = bitrates[0]
+        next_bitrate = bitrates.lowest
     # If time to download the next segment with current bitrate is longer than current - initial,
     # switch to a lower suitable bitrate
 
     elif float(next_segment_sizes[curr_bitrate])/weighted_dwn_rate > available_video_duration:
         config_dash.LOG.debug("next_segment_sizes[curr_bitrate]) weighted_dwn_rate > available_video")
-        for bitrate in reversed(bitrates):
-            if bitrate < curr_bitrate:
-                if float(next_segment_sizes[bitrate])/weighted_dwn_rate < available_video_duration:
-                    next_bitrate = bitrate
-                    break
+        for bitrate in reversed(bitrates.below(curr_bitrate)):
+            if float(next_segment_sizes[bitrate])/weighted_dwn_rate < available_video_duration:
+                next_bitrate = bitrate
+                break
         if not next_bitrate:
-            next_bitrate = bitrates[0]
+            next_bitrate = bitrates.lowest
     elif available_video_segments <= dash_player.alpha:
         config_dash.LOG.debug("available_video <= dash_player.alpha")
-        if curr_bitrate >= max(bitrates):
+        if curr_bitrate >= bitrates.highest:
             config_dash.LOG.info("Current bitrate is MAX = {}".format(curr_bitrate))
             next_bitrate = curr_bitrate
         else:
-            higher_bitrate = bitrates[bitrates.index(curr_bitrate)+1]
+            higher_bitrate = bitrates.higher(curr_bitrate)
             # Jump only one if suitable else stick to the current bitrate
             config_dash.LOG.info("next_segment_sizes[higher_bitrate] = {}, weighted_dwn_rate = {} , "
                                  "available_video={} seconds, ratio = {}".format(next_segment_sizes[higher_bitrate],
@@ -67,27 +66,25 @@ def weighted_dash(bitrates, dash_player, weighted_dwn_rate, curr_bitrate, next_s
                 next_bitrate = curr_bitrate
     elif available_video_segments <= dash_player.beta:
         config_dash.LOG.debug("available_video <= dash_player.beta")
-        if curr_bitrate >= max(bitrates):
+        if curr_bitrate >= bitrates.highest:
             next_bitrate = curr_bitrate
         else:
-            for bitrate in reversed(bitrates):
-                if bitrate >= curr_bitrate:
-                    if float(next_segment_sizes[bitrate])/weighted_dwn_rate < available_video_duration:
-                        next_bitrate = bitrate
-                        break
+            for bitrate in reversed(bitrates.at_least(curr_bitrate)):
+                if float(next_segment_sizes[bitrate])/weighted_dwn_rate < available_video_duration:
+                    next_bitrate = bitrate
+                    break
             if not next_bitrate:
                 next_bitrate = curr_bitrate
 
     elif available_video_segments > dash_player.beta:
         config_dash.LOG.debug("available_video > dash_player.beta")
-        if curr_bitrate >= max(bitrates):
+        if curr_bitrate >= bitrates.highest:
             next_bitrate = curr_bitrate
         else:
-            for bitrate in reversed(bitrates):
-                if bitrate >= curr_bitrate:
-                    if float(next_segment_sizes[bitrate])/weighted_dwn_rate > available_video_duration:
-                        next_bitrate = bitrate
-                        break
+            for bitrate in reversed(bitrates.at_least(curr_bitrate)):
+                if float(next_segment_sizes[bitrate])/weighted_dwn_rate > available_video_duration:
+                    next_bitrate = bitrate
+                    break
         if not next_bitrate:
             next_bitrate = curr_bitrate
         delay = current_buffer_size - dash_player.beta
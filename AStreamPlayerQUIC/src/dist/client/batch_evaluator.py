@@ -0,0 +1,666 @@
+#!/usr/local/bin/python
+""" Evaluation of a rate adaptation algorithm over a corpus of throughput traces.
+    All the traces are simulated together: the player buffer, the download history and the bitrate of
+    every trace are NumPy arrays, and each segment decision of BASIC-2, SARA or Netflix is made for the
+    whole corpus with vectorized operations. The player and the decisions follow simulator.py, so each
+    trace gets the same result as with simulator.simulate, up to float rounding (when a download ends
+    exactly as the buffer runs out, one of them may count an interruption of zero seconds).
+    Without NumPy, and for the other algorithms (MPC), the traces are simulated one after the other with
+    simulator.simulate. '-check' runs both on every trace and reports the traces where the bitrate decisions or
+    the QoE summaries differ (check_decisions).
+
+    The output has one QoE summary per trace (SUMMARY_HEADER). '-s NAME=VALUE,VALUE,...' sweeps a
+    config_dash constant: the corpus is evaluated with every combination of the given values.
+
+    From commandline:
+    python batch_evaluator.py -m BigBuckBunny_2s.mpd -t traces/ -p netflix -s NETFLIX_RESERVOIR=0.1,0.2,0.3
+    python batch_evaluator.py -m BigBuckBunny_2s.mpd -t traces/ -p sara -check
+"""
+from __future__ import division
+
+from argparse import ArgumentParser
+import csv
+import itertools
+import logging
+import os
+import sys
+import timeit
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from adaptation.bitrate_ladder import as_ladder
+from adaptation.throughput import MIN_DOWNLOAD_TIME
+from bitrate_selector import get_average_segment_sizes
+import config_dash
+from configure_log_file import configure_log_file
+import read_mpd
+import simulator
+
+SUMMARY_HEADER = ("Trace;AverageBitrate;UpShifts;DownShifts;Interruptions;InterruptionTime;StartupDelay;"
+                  "PlaybackTime;SessionDuration;Downloaded;QoE").split(";")
+# Playback types evaluated on arrays
+BATCH_PLAYBACK_TYPES = ("BASIC", "SMART", "NETFLIX")
+# Intervals a trace steps through before its interval is searched (TraceMatrix.find_intervals)
+CURSOR_STEPS = 4
+# Player states of BatchPlayer
+INITIAL_BUFFERING, PLAY, BUFFERING, END = range(4)
+
+
+def get_trace_files(trace_paths):
+    """ Module to list the trace files. Directories are expanded to the files they contain """
+    trace_files = list()
+    for trace_path in trace_paths:
+        if os.path.isdir(trace_path):
+            trace_files.extend(sorted(os.path.join(trace_path, trace_file) for trace_file in os.listdir(trace_path)
+                                      if os.path.isfile(os.path.join(trace_path, trace_file))))
+        else:
+            trace_files.append(trace_path)
+    return trace_files
+
+
+def get_qoe(bitrate_sum, switch_sum, interruption_time, segment_count):
+    """ Module to compute the linear QoE of a session: the mean segment bitrate in Mbps minus the bitrate
+        changes and config_dash.BATCH_QOE_REBUFFER_PENALTY for every second of interruption, per segment
+    :param bitrate_sum: sum of the segment bitrates (bps)
+    :param switch_sum: sum of the absolute bitrate changes between consecutive segments (bps)
+    """
+    return ((bitrate_sum - switch_sum) / 1e6 -
+            config_dash.BATCH_QOE_REBUFFER_PENALTY * interruption_time) / max(segment_count, 1)
+
+
+def get_highest_index(mask, default):
+    """ :return: for each row, the highest column where mask is True. default for the rows without one """
+    highest = mask.shape[1] - 1 - np.argmax(mask[:, ::-1], axis=1)
+    return np.where(mask.any(axis=1), highest, default)
+
+
+class TraceMatrix(object):
+    """ simulator.ThroughputTrace for all the traces at once. Each trace is a (flattened) row of padded arrays """
+    def __init__(self, traces):
+        trace_count = len(traces)
+        width = max(len(trace.boundaries) for trace in traces)
+        self.boundaries = np.empty((trace_count, width))
+        self.cumulative_bytes = np.empty((trace_count, width))
+        self.throughputs = np.zeros((trace_count, width))
+        for row, trace in enumerate(traces):
+            # Padding with the last boundary keeps the rows sorted and is never found by the searches
+            self.boundaries[row] = trace.boundaries[-1]
+            self.boundaries[row, :len(trace.boundaries)] = trace.boundaries
+            self.cumulative_bytes[row] = trace.cumulative_bytes[-1]
+            self.cumulative_bytes[row, :len(trace.cumulative_bytes)] = trace.cumulative_bytes
+            self.throughputs[row, :len(trace.throughputs)] = trace.throughputs
+        self.duration = self.boundaries[:, -1].copy()
+        self.cycle_bytes = self.cumulative_bytes[:, -1].copy()
+        # The rows are used flat: row r starts at the index r * width
+        self.boundaries = self.boundaries.ravel()
+        self.cumulative_bytes = self.cumulative_bytes.ravel()
+        self.throughputs = self.throughputs.ravel()
+        self.row_offsets = np.arange(trace_count) * width
+        self.last_intervals = self.row_offsets + [len(trace.throughputs) - 1 for trace in traces]
+        # Every row is shifted above the previous one, so that one sorted search covers all the rows
+        self.time_shifts = np.arange(trace_count) * (self.duration.max() + 1)
+        self.byte_shifts = np.arange(trace_count) * (self.cycle_bytes.max() + 1)
+        self.boundary_keys = self.boundaries + np.repeat(self.time_shifts, width)
+        self.cumulative_keys = self.cumulative_bytes + np.repeat(self.byte_shifts, width)
+        # Interval found by the last search of each row. The times only grow, so they are the starting points
+        self.time_cursor = self.row_offsets.copy()
+        self.byte_cursor = self.row_offsets.copy()
+
+    def find_intervals(self, values, keys, shifts, cursor, targets, side):
+        """ Module to find the interval of each row that holds the target: the last value below it
+            (or equal to it, for side 'right'). The rows step from their cursor, and the rows that
+            have to move further than CURSOR_STEPS intervals are searched in the keys
+        :return: flat indexes of the intervals
+        """
+        below = np.less_equal if side == 'right' else np.less
+        # The rows that went back (to a new cycle of the trace) start again from the first interval
+        index = np.where(below(values.take(cursor), targets), cursor, self.row_offsets)
+        for _ in range(CURSOR_STEPS):
+            step = (index < self.last_intervals) & below(values.take(index + 1), targets)
+            if not step.any():
+                return index
+            index += step
+        moving = (index < self.last_intervals) & below(values.take(index + 1), targets)
+        index[moving] = np.searchsorted(keys, targets[moving] + shifts[moving], side=side) - 1
+        return np.clip(index, self.row_offsets, self.last_intervals)
+
+    def bytes_until(self, time):
+        """ :return: Bytes transferred in each trace from its start until time """
+        cycles, offset = np.divmod(time, self.duration)
+        index = self.find_intervals(self.boundaries, self.boundary_keys, self.time_shifts, self.time_cursor,
+                                    offset, 'right')
+        self.time_cursor = index
+        return (cycles * self.cycle_bytes + self.cumulative_bytes.take(index) +
+                self.throughputs.take(index) * (offset - self.boundaries.take(index)))
+
+    def time_at(self, transferred):
+        """ :return: The earliest time at which each trace has transferred `transferred` bytes """
+        cycles, remaining = np.divmod(transferred, self.cycle_bytes)
+        index = self.find_intervals(self.cumulative_bytes, self.cumulative_keys, self.byte_shifts, self.byte_cursor,
+                                    remaining, 'left')
+        self.byte_cursor = index
+        with np.errstate(divide='ignore', invalid='ignore'):
+            time = (cycles * self.duration + self.boundaries.take(index) +
+                    (remaining - self.cumulative_bytes.take(index)) / self.throughputs.take(index))
+        return np.where(remaining == 0, cycles * self.duration, time)
+
+    def download_time(self, start_time, size):
+        """ :return: Seconds each trace needs to download size bytes starting at start_time """
+        return self.time_at(self.bytes_until(start_time) + size) - start_time
+
+
+class BatchPlayer(object):
+    """ simulator.SimulatedPlayer for all the traces at once.
+        The segments have the same playback length, so a buffer is the number of waiting segments and
+        the time left of the segment being played.
+    """
+    def __init__(self, trace_count, video_length, segment_duration):
+        self.playback_duration = video_length
+        self.segment_duration = segment_duration
+        self.initial_buffer = config_dash.INITIAL_BUFFERING_COUNT
+        self.alpha = config_dash.ALPHA_BUFFER_COUNT
+        self.beta = config_dash.BETA_BUFFER_COUNT
+        self.state = np.full(trace_count, INITIAL_BUFFERING, dtype=int)
+        # Virtual time of each player and playback length of the played segments in seconds
+        self.time = np.zeros(trace_count)
+        self.playback_time = np.zeros(trace_count)
+        # Segments waiting in the buffer, playback length and seconds left of the segment being played
+        self.queued = np.zeros(trace_count, dtype=int)
+        self.segment_length = np.zeros(trace_count)
+        self.remaining = np.zeros(trace_count)
+        self.initial_buffering_duration = np.full(trace_count, np.nan)
+        self.interruption_start = np.zeros(trace_count)
+        self.interruptions = np.zeros(trace_count, dtype=int)
+        self.interruption_time = np.zeros(trace_count)
+
+    def get_playback_end(self):
+        """ :return: (reaches_end, offset). Whether the buffered segments reach the end of the video, and the
+                     seconds until the end of the video or until the buffer runs out
+        """
+        to_end = np.maximum(self.playback_duration - self.playback_time - self.segment_length, 0)
+        reaches_end = np.ceil(to_end / self.segment_duration) <= self.queued
+        return reaches_end, self.remaining + np.where(reaches_end, to_end, self.queued * self.segment_duration)
+
+    def get_drain_time(self, segment_count):
+        """ :return: Seconds until segment_count more segments have left each buffer, like
+                     DashPlayer.wait_for_buffer_level. 0 for the players that are not playing
+        """
+        # The next segment starts when the one being played ends, the others every segment_duration
+        draining = (self.state == PLAY) & (segment_count > 0)
+        return np.where(draining, self.remaining + (segment_count - 1) * self.segment_duration, 0)
+
+    def advance(self, elapsed):
+        """ Play the buffered segments for elapsed seconds (one value per trace) """
+        playing = self.state == PLAY
+        reaches_end, end_offset = self.get_playback_end()
+        ending = playing & reaches_end & (end_offset <= elapsed)
+        stalling = playing & ~reaches_end & (end_offset <= elapsed)
+        playing &= ~(ending | stalling)
+        # Segments started during the elapsed time. The last one started at remaining + (started - 1) * L
+        crossing = playing & (elapsed >= self.remaining)
+        started = np.where(crossing, np.floor((elapsed - self.remaining) / self.segment_duration) + 1, 0)
+        played = np.where(crossing, self.segment_length + (started - 1) * self.segment_duration, 0)
+        segment_length = np.minimum(self.segment_duration, self.playback_duration - self.playback_time - played)
+        self.remaining = np.where(crossing, self.remaining + played - self.segment_length + segment_length - elapsed,
+                                  np.where(playing, self.remaining - elapsed, self.remaining))
+        self.segment_length = np.where(crossing, segment_length, self.segment_length)
+        self.playback_time += played
+        self.queued -= started.astype(int)
+        self.state[ending] = END
+        self.playback_time[ending] = self.playback_duration
+        self.state[stalling] = BUFFERING
+        self.playback_time[stalling] += (self.segment_length + self.queued * self.segment_duration)[stalling]
+        self.interruption_start[stalling] = self.time[stalling] + end_offset[stalling]
+        self.interruptions += stalling
+        ending |= stalling
+        self.queued[ending] = 0
+        self.segment_length[ending] = 0
+        self.remaining[ending] = 0
+        self.time += elapsed
+
+    def write(self, elapsed):
+        """ Add a segment to every buffer, elapsed seconds after the last call """
+        self.advance(elapsed)
+        self.queued += 1
+        starting = (self.state == INITIAL_BUFFERING) & (self.queued >= config_dash.INITIAL_BUFFERING_COUNT)
+        self.initial_buffering_duration[starting] = self.time[starting]
+        remaining_playback_time = self.playback_duration - self.playback_time
+        resuming = (self.state == BUFFERING) & (
+            (self.queued >= config_dash.RE_BUFFERING_COUNT) |
+            ((config_dash.RE_BUFFERING_COUNT * self.segment_duration >= remaining_playback_time) & (self.queued > 0)))
+        self.interruption_time += np.where(resuming, self.time - self.interruption_start, 0)
+        starting |= resuming
+        self.state[starting] = PLAY
+        self.queued -= starting
+        self.segment_length = np.where(starting, np.minimum(self.segment_duration, remaining_playback_time),
+                                       self.segment_length)
+        self.remaining = np.where(starting, self.segment_length, self.remaining)
+
+    def finish(self):
+        """ Play the rest of the buffers. Returns the virtual time at which each playback ended """
+        _, end_offset = self.get_playback_end()
+        self.advance(np.where(self.state == PLAY, end_offset, 0))
+        return self.time
+
+
+class BatchSelector(object):
+    """ bitrate_selector.BitrateSelector for all the traces at once.
+        The bitrates are indexes in the sorted bitrates of the manifest.
+    """
+    def __init__(self, playback_type, dp_object, player):
+        """
+        :param playback_type: 'BASIC', 'SMART' (SARA) or 'NETFLIX'
+        :param player: BatchPlayer of the traces
+        """
+        self.playback_type = playback_type.upper()
+        self.manifest = dp_object.manifest
+        self.player = player
+        self.bitrates = np.array(self.manifest.bitrates)
+        self.levels = np.arange(len(self.bitrates))
+        self.top = len(self.bitrates) - 1
+        trace_count = len(player.time)
+        self.rows = np.arange(trace_count)
+        self.current = np.zeros(trace_count, dtype=int)
+        # The sizes and download times of the last segments, the window of the throughput estimator
+        if self.playback_type == "BASIC":
+            window = config_dash.BASIC_DELTA_COUNT
+        elif self.playback_type == "SMART":
+            # Like WeightedMean, which keeps one sample more than SARA_SAMPLE_COUNT
+            window = config_dash.SARA_SAMPLE_COUNT + 1
+        elif self.playback_type == "NETFLIX":
+            window = 1
+        else:
+            raise ValueError("Playback type {} cannot be evaluated in batch".format(playback_type))
+        self.history_sizes = np.zeros((trace_count, window))
+        self.history_times = np.zeros((trace_count, window))
+        self.history_count = 0
+        self.estimator_type = config_dash.THROUGHPUT_ESTIMATOR
+        if self.estimator_type not in ('harmonic', 'ewma', 'percentile'):
+            raise ValueError("Unknown throughput estimator: {}".format(self.estimator_type))
+        self.ewma_rate = np.zeros(trace_count)
+        # SARA only measures the segments after its first decision (see BitrateSelector.select)
+        self.recording = self.playback_type != "SMART"
+        if self.playback_type == "SMART":
+            # Sizes in bits of each segment for each bitrate, as given to weighted_dash
+            segment_sizes = self.manifest.segment_sizes
+            self.segment_sizes = np.array(segment_sizes.sizes, dtype=float).reshape(
+                segment_sizes.segment_count, len(self.bitrates)).T
+        elif self.playback_type == "NETFLIX":
+            average_segment_sizes = get_average_segment_sizes(dp_object)
+            self.average_segment_sizes = np.array([average_segment_sizes[bitrate]
+                                                   for bitrate in self.manifest.bitrates])
+            ladder = as_ladder(self.manifest.bitrates)
+            _, rate_markers, rate_bitrates = ladder.get_rate_map_entry()
+            self.rate_markers = np.array(rate_markers)
+            self.rate_levels = np.array([ladder.rank(bitrate) for bitrate in rate_bitrates])
+            self.running = np.zeros(trace_count, dtype=bool)
+
+    def select(self, segment_number, segment_duration):
+        """ Choose the bitrate of the next segment of every trace
+        :param segment_duration: playback length of the last downloaded segment
+        :return: (bitrate indexes, delays, done). Each trace waits until delay more segments have left its buffer
+                 before its request. done is True when there is nothing more to request
+        """
+        delay = np.zeros(len(self.rows))
+        manifest = self.manifest
+        if segment_number == manifest.start:
+            self.current[:] = 0
+            return self.current, delay, False
+        queued = self.player.queued
+        if self.playback_type == "BASIC":
+            self.current = self.select_basic()
+            delay = np.where(queued > config_dash.BASIC_THRESHOLD, queued - config_dash.BASIC_THRESHOLD, 0)
+        elif self.playback_type == "SMART":
+            self.recording = True
+            if segment_number < manifest.segment_count - 1 + manifest.start:
+                if segment_number + 1 < self.segment_sizes.shape[1]:
+                    self.current, delay = self.select_sara(self.segment_sizes[:, segment_number + 1])
+                else:
+                    config_dash.LOG.error("No segment sizes for the segment {}".format(segment_number + 1))
+        else:
+            if not segment_number < manifest.segment_count - 1 + manifest.start:
+                return self.current, delay, True
+            self.current = self.select_netflix()
+            delay = np.where(queued >= config_dash.NETFLIX_BUFFER_SIZE, queued - config_dash.NETFLIX_BUFFER_SIZE + 1, 0)
+        return self.current, delay, False
+
+    def get_history(self):
+        """ :return: (sizes, times) of the measured segments """
+        count = min(self.history_count, self.history_sizes.shape[1])
+        return self.history_sizes[:, :count], self.history_times[:, :count]
+
+    def get_throughput(self):
+        """ :return: The estimate of the throughput estimator (adaptation/throughput.py) of every trace """
+        sizes, times = self.get_history()
+        if not sizes.shape[1]:
+            return np.zeros(len(self.rows))
+        if self.estimator_type == 'ewma':
+            return self.ewma_rate
+        elif self.estimator_type == 'percentile':
+            return np.percentile(sizes / times, config_dash.THROUGHPUT_PERCENTILE, axis=1)
+        return sizes.sum(axis=1) / times.sum(axis=1)
+
+    def select_basic(self):
+        """ basic_dash2.basic_dash2 for all the traces """
+        if not self.history_count:
+            return np.zeros(len(self.rows), dtype=int)
+        download_rate = self.get_throughput() * 8
+        upper_rates = self.bitrates * config_dash.BASIC_UPPER_THRESHOLD
+        increase = download_rate > upper_rates[self.current]
+        # Highest bitrate that stays under the download rate by the margin
+        suitable = np.maximum((download_rate[:, None] > upper_rates[None, :]).sum(axis=1) - 1, 0)
+        return np.where(increase, np.minimum(self.current + 1, self.top), suitable)
+
+    def select_sara(self, next_segment_sizes):
+        """ weighted_dash.weighted_dash for all the traces
+        :param next_segment_sizes: size of the next segment for each bitrate
+        :return: (bitrate indexes, delays)
+        """
+        weighted_dwn_rate = self.get_throughput()
+        player = self.player
+        current = self.current
+        available_video_segments = player.queued - player.initial_buffer
+        available_video_duration = available_video_segments * player.segment_duration
+        with np.errstate(divide='ignore', invalid='ignore'):
+            next_times = next_segment_sizes[None, :] / weighted_dwn_rate[:, None]
+        fits = next_times < available_video_duration[:, None]
+        at_max = current == self.top
+        higher = np.minimum(current + 1, self.top)
+        not_lower = self.levels[None, :] >= current[:, None]
+        empty = (weighted_dwn_rate == 0) | (available_video_segments == 0)
+        too_slow = ~empty & (next_times[self.rows, current] > available_video_duration)
+        steady = ~empty & ~too_slow
+        below_alpha = steady & (available_video_segments <= player.alpha)
+        below_beta = steady & ~below_alpha & (available_video_segments <= player.beta)
+        above_beta = steady & (available_video_segments > player.beta)
+        next_bitrate = np.where(empty, 0, current)
+        next_bitrate = np.where(too_slow, get_highest_index(fits & ~not_lower, 0), next_bitrate)
+        next_bitrate = np.where(below_alpha & ~at_max & fits[self.rows, higher], higher, next_bitrate)
+        next_bitrate = np.where(below_beta & ~at_max, get_highest_index(fits & not_lower, current), next_bitrate)
+        next_bitrate = np.where(above_beta & ~at_max, get_highest_index(
+            (next_times > available_video_duration[:, None]) & not_lower, current), next_bitrate)
+        delay = np.where(above_beta, player.queued - player.beta, 0)
+        return next_bitrate, delay
+
+    def get_rate_netflix(self, available_video_segments):
+        """ netflix_dash.get_rate_netflix for all the traces """
+        buffer_percentage = available_video_segments / config_dash.NETFLIX_BUFFER_SIZE
+        # The bitrate of the first marker at or above the buffer occupancy
+        marker = np.minimum(np.searchsorted(self.rate_markers, buffer_percentage, side='left'),
+                            len(self.rate_markers) - 1)
+        next_bitrate = np.where(buffer_percentage <= config_dash.NETFLIX_RESERVOIR, 0, self.rate_levels[marker])
+        return np.where(buffer_percentage >= config_dash.NETFLIX_CUSHION, self.top, next_bitrate)
+
+    def select_netflix(self):
+        """ netflix_dash.netflix_dash for all the traces """
+        segment_download_rate = self.get_throughput()
+        current = self.current
+        available_video_segments = self.player.queued - self.player.initial_buffer
+        rate_map_bitrate = self.get_rate_netflix(available_video_segments)
+        # INITIAL: step up while the segments download much faster than they play
+        delta_b = (self.player.segment_duration -
+                   self.average_segment_sizes[current] / segment_download_rate)
+        step_up = delta_b > config_dash.NETFLIX_INITIAL_FACTOR * self.player.segment_duration
+        initial_bitrate = np.where(step_up, np.minimum(current + 1, self.top), current)
+        leave_initial = ((available_video_segments >= config_dash.NETFLIX_INITIAL_BUFFER) &
+                         (rate_map_bitrate > initial_bitrate))
+        initial_bitrate = np.where(leave_initial, rate_map_bitrate, initial_bitrate)
+        # Stepping up from the highest bitrate fails with an IndexError: nothing changes
+        failed = ~self.running & step_up & (current == self.top)
+        next_bitrate = np.where(self.running, rate_map_bitrate, np.where(failed, current, initial_bitrate))
+        self.running |= ~failed & leave_initial
+        return next_bitrate
+
+    def update(self, segment_sizes, segment_download_times):
+        """ Add the measurements of the downloaded segments """
+        if not self.recording:
+            return
+        segment_download_times = np.maximum(segment_download_times, MIN_DOWNLOAD_TIME)
+        if self.estimator_type == 'ewma':
+            segment_download_rate = segment_sizes / segment_download_times
+            self.ewma_rate = (segment_download_rate if not self.history_count else
+                              self.ewma_rate + config_dash.THROUGHPUT_EWMA_WEIGHT * (segment_download_rate -
+                                                                                     self.ewma_rate))
+        column = self.history_count % self.history_sizes.shape[1]
+        self.history_sizes[:, column] = segment_sizes
+        self.history_times[:, column] = segment_download_times
+        self.history_count += 1
+
+
+def get_segment_sizes(dp_object, segment_count):
+    """ Module to get the download sizes in bytes (simulator.get_segment_size)
+    :return: array [bitrate index, segment number]
+    """
+    bitrates = dp_object.manifest.bitrates
+    segment_sizes = np.zeros((len(bitrates), segment_count + 1))
+    for level, bitrate in enumerate(bitrates):
+        for segment_number in range(1, segment_count + 1):
+            segment_sizes[level, segment_number] = simulator.get_segment_size(dp_object, segment_number, bitrate)
+    return segment_sizes
+
+
+def evaluate(dp_object, video_segment_duration, traces, playback_type,
+             request_latency=config_dash.SIM_REQUEST_LATENCY, decisions=None):
+    """ Module to simulate a playback session over each trace
+    :param dp_object: DashPlayback from read_mpd.read_mpd
+    :param traces: list of simulator.ThroughputTrace
+    :param playback_type: 'BASIC', 'SMART', 'NETFLIX' or 'MPC'. Only the BATCH_PLAYBACK_TYPES run on arrays
+    :param decisions: list that gets the array of the bitrates chosen for the traces at every segment. Only filled
+                      for the BATCH_PLAYBACK_TYPES with NumPy
+    :return: dict with a list of one value per trace for each column of SUMMARY_HEADER except 'Trace'
+    """
+    if np is None or playback_type.upper() not in BATCH_PLAYBACK_TYPES:
+        return evaluate_sequential(dp_object, video_segment_duration, traces, playback_type, request_latency)
+    manifest = dp_object.manifest
+    trace_count = len(traces)
+    trace_matrix = TraceMatrix(traces)
+    player = BatchPlayer(trace_count, dp_object.playback_duration, video_segment_duration)
+    selector = BatchSelector(playback_type, dp_object, player)
+    segment_sizes = get_segment_sizes(dp_object, manifest.segment_count)
+    bitrates = selector.bitrates
+    segment_duration = 0
+    previous_bitrate = np.zeros(trace_count, dtype=int)
+    bitrate_sum = np.zeros(trace_count)
+    switch_sum = np.zeros(trace_count)
+    up_shifts = np.zeros(trace_count, dtype=int)
+    down_shifts = np.zeros(trace_count, dtype=int)
+    total_downloaded = np.zeros(trace_count)
+    segment_count = 0
+    for segment_number in range(1, manifest.segment_count + 1):
+        bitrate, delay, requests_done = selector.select(segment_number, segment_duration)
+        if requests_done:
+            break
+        player.advance(player.get_drain_time(delay))
+        if decisions is not None:
+            decisions.append(bitrates[bitrate])
+        segment_size = segment_sizes[bitrate, segment_number]
+        segment_download_time = trace_matrix.download_time(player.time, segment_size) + request_latency
+        selector.update(segment_size, segment_download_time)
+        total_downloaded += segment_size
+        bitrate_sum += bitrates[bitrate]
+        switch_sum += np.abs(bitrates[bitrate] - bitrates[previous_bitrate])
+        up_shifts += bitrate > previous_bitrate
+        down_shifts += bitrate < previous_bitrate
+        previous_bitrate = bitrate
+        segment_count += 1
+        segment_duration = video_segment_duration
+        player.write(segment_download_time)
+    session_duration = player.finish()
+    return {'AverageBitrate': bitrate_sum / max(segment_count, 1),
+            'UpShifts': up_shifts,
+            'DownShifts': down_shifts,
+            'Interruptions': player.interruptions,
+            'InterruptionTime': player.interruption_time,
+            'StartupDelay': player.initial_buffering_duration,
+            'PlaybackTime': player.playback_time,
+            'SessionDuration': session_duration,
+            'Downloaded': total_downloaded,
+            'QoE': get_qoe(bitrate_sum, switch_sum, player.interruption_time, segment_count)}
+
+
+def evaluate_sequential(dp_object, video_segment_duration, traces, playback_type,
+                        request_latency=config_dash.SIM_REQUEST_LATENCY):
+    """ Module to evaluate the traces one after the other with simulator.simulate. Same output as evaluate """
+    summary = dict((column, list()) for column in SUMMARY_HEADER[1:])
+    for trace in traces:
+        playback_time, total_downloaded, session_duration = simulator.simulate(
+            dp_object, video_segment_duration, trace, playback_type, connection_type=None,
+            request_latency=request_latency)
+        playback_info = config_dash.JSON_HANDLE['playback_info']
+        bitrates = [segment_info[1] for segment_info in config_dash.JSON_HANDLE['segment_info']]
+        switch_sum = sum(abs(bitrate - previous_bitrate) for previous_bitrate, bitrate in zip(bitrates, bitrates[1:]))
+        if bitrates:
+            switch_sum += abs(bitrates[0] - dp_object.manifest.bitrates[0])
+        interruption_time = playback_info['interruptions']['total_duration']
+        summary['AverageBitrate'].append(sum(bitrates) / len(bitrates) if bitrates else 0)
+        summary['UpShifts'].append(playback_info['up_shifts'])
+        summary['DownShifts'].append(playback_info['down_shifts'])
+        summary['Interruptions'].append(playback_info['interruptions']['count'])
+        summary['InterruptionTime'].append(interruption_time)
+        summary['StartupDelay'].append(playback_info['initial_buffering_duration'])
+        summary['PlaybackTime'].append(playback_time)
+        summary['SessionDuration'].append(session_duration)
+        summary['Downloaded'].append(total_downloaded)
+        summary['QoE'].append(get_qoe(sum(bitrates), switch_sum, interruption_time, len(bitrates)))
+    return summary
+
+
+def check_decisions(dp_object, video_segment_duration, traces, playback_type,
+                    request_latency=config_dash.SIM_REQUEST_LATENCY):
+    """ Module to check evaluate against simulator.simulate: both run on every trace, which must get the same
+        bitrate for every segment and the same QoE summary up to float rounding
+    :return: list of (trace index, description of the first difference) of the traces that differ
+    """
+    if np is None or playback_type.upper() not in BATCH_PLAYBACK_TYPES:
+        raise ValueError("Playback type {} cannot be evaluated in batch".format(playback_type))
+    decisions = list()
+    summary = evaluate(dp_object, video_segment_duration, traces, playback_type, request_latency, decisions)
+    # [trace, segment]
+    decisions = np.array(decisions, dtype=int).reshape(len(decisions), len(traces)).T
+    mismatches = list()
+    for index, trace in enumerate(traces):
+        sequential = evaluate_sequential(dp_object, video_segment_duration, [trace], playback_type, request_latency)
+        bitrates = [segment_info[1] for segment_info in config_dash.JSON_HANDLE['segment_info']]
+        batch_bitrates = decisions[index].tolist()
+        if batch_bitrates != bitrates:
+            # The simulator can also stop after a different number of segments
+            segment = 0
+            while batch_bitrates[segment:segment + 1] == bitrates[segment:segment + 1]:
+                segment += 1
+            mismatches.append((index, "segment {}: bitrate {} instead of {}".format(
+                segment + 1, batch_bitrates[segment:segment + 1], bitrates[segment:segment + 1])))
+            continue
+        for column in SUMMARY_HEADER[1:]:
+            if not np.isclose(summary[column][index], sequential[column][0], rtol=1e-6, atol=1e-6, equal_nan=True):
+                mismatches.append((index, "{}: {} instead of {}".format(column, summary[column][index],
+                                                                        sequential[column][0])))
+                break
+    return mismatches
+
+
+def parse_sweeps(sweep_arguments):
+    """ Module to parse the '-s NAME=VALUE,VALUE' arguments
+    :return: list of (name, [values]). The values have the type of the config_dash constant
+    """
+    sweeps = list()
+    for sweep_argument in sweep_arguments or []:
+        name, _, values = sweep_argument.partition("=")
+        name = name.strip().upper()
+        if not hasattr(config_dash, name) or not values:
+            raise ValueError("Unknown config_dash constant or no values: {}".format(sweep_argument))
+        value_type = type(getattr(config_dash, name))
+        if value_type not in (int, float):
+            value_type = float
+        sweeps.append((name, [value_type(value) for value in values.split(",")]))
+    return sweeps
+
+
+def run_sweeps(dp_object, video_segment_duration, traces, playback_type, sweeps, request_latency):
+    """ Module to evaluate the traces with each combination of the swept config_dash values
+    :param sweeps: list of (name, [values])
+    :return: list of (combination, summary). combination is the list of values, in the order of sweeps
+    """
+    names = [name for name, _ in sweeps]
+    original_values = [getattr(config_dash, name) for name in names]
+    results = list()
+    try:
+        for combination in itertools.product(*[values for _, values in sweeps]):
+            for name, value in zip(names, combination):
+                setattr(config_dash, name, value)
+            results.append((combination, evaluate(dp_object, video_segment_duration, traces, playback_type,
+                                                  request_latency)))
+    finally:
+        for name, value in zip(names, original_values):
+            setattr(config_dash, name, value)
+    return results
+
+
+def write_summary(results, sweep_names, trace_names, summary_file):
+    """ Module to write the QoE summaries to a CSV file, one row per trace and swept combination """
+    with open(summary_file, 'wb') as summary_file_handle:
+        summary_writer = csv.writer(summary_file_handle, delimiter=";")
+        summary_writer.writerow(list(sweep_names) + SUMMARY_HEADER)
+        for combination, summary in results:
+            for index, trace_name in enumerate(trace_names):
+                summary_writer.writerow(list(combination) + [trace_name] +
+                                        [summary[column][index] for column in SUMMARY_HEADER[1:]])
+
+
+def create_arguments(parser):
+    """ Adding arguments to the parser """
+    parser.add_argument('-m', '--MPD', required=True,
+                        help="MPD file")
+    parser.add_argument('-t', '--TRACES', required=True, nargs='+',
+                        help="Throughput trace files or directories of trace files")
+    parser.add_argument('-p', '--PLAYBACK', default='sara',
+                        help="Playback type (basic, sara, netflix or mpc)")
+    parser.add_argument('-s', '--SWEEP', action='append',
+                        help="config_dash constant and the values to evaluate. Eg: ALPHA_BUFFER_COUNT=3,5,7")
+    parser.add_argument('-latency', '--LATENCY', type=float, default=config_dash.SIM_REQUEST_LATENCY,
+                        help="Seconds added to every segment download")
+    parser.add_argument('-o', '--OUTPUT', default=config_dash.BATCH_SUMMARY_FILENAME,
+                        help="CSV file for the QoE summaries")
+    parser.add_argument('-check', '--CHECK', action='store_true', default=False,
+                        help="Check the batch evaluation against simulator.simulate on every trace and exit")
+
+
+def main():
+    """ Main Program wrapper """
+    parser = ArgumentParser(description='Evaluate a rate adaptation algorithm over many throughput traces')
+    create_arguments(parser)
+    args = parser.parse_args()
+    playback_type = simulator.PLAYBACK_TYPES.get(args.PLAYBACK.lower(), args.PLAYBACK.upper())
+    configure_log_file(playback_type=args.PLAYBACK.lower(), connection_type="BATCH", log_file=None)
+    config_dash.LOG.setLevel(logging.WARNING)
+    start_time = timeit.default_timer()
+    trace_files = get_trace_files(args.TRACES)
+    if not trace_files:
+        print "No trace files in ", args.TRACES
+        return 1
+    traces = [simulator.load_trace(trace_file) for trace_file in trace_files]
+    dp_object, video_segment_duration = read_mpd.read_mpd(args.MPD, read_mpd.DashPlayback())
+    if args.CHECK:
+        mismatches = check_decisions(dp_object, video_segment_duration, traces, playback_type, args.LATENCY)
+        for index, description in mismatches:
+            print "MISMATCH: ", trace_files[index], description
+        print "CHECKED: ", len(traces), "traces,", len(mismatches), "mismatches"
+        return 1 if mismatches else 0
+    sweeps = parse_sweeps(args.SWEEP)
+    results = run_sweeps(dp_object, video_segment_duration, traces, playback_type, sweeps, args.LATENCY)
+    write_summary(results, [name for name, _ in sweeps], [os.path.basename(trace_file) for trace_file in trace_files],
+                  args.OUTPUT)
+    for combination, summary in results:
+        print "{}AVERAGE BITRATE: {} INTERRUPTIONS: {} QoE: {}".format(
+            "".join("{}={} ".format(name, value) for (name, _), value in zip(sweeps, combination)),
+            sum(summary['AverageBitrate']) / len(traces), sum(summary['Interruptions']),
+            sum(summary['QoE']) / len(traces))
+    print "TRACES: ", len(traces), "EVALUATED IN: ", timeit.default_timer() - start_time, "seconds", \
+        "(NumPy)" if np is not None else "(sequential)"
+    print "SUMMARY: ", args.OUTPUT
+
+
+if __name__ == "__main__":
+    sys.exit(main())
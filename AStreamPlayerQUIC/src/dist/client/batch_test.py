@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+""" Test of the batch evaluation (batch_evaluator.py) against simulator.simulate.
+    Random throughput traces are evaluated on a synthetic MPD (benchmark.write_mpd) with every playback type of
+    batch_evaluator.BATCH_PLAYBACK_TYPES, with and without request latency. Every trace must get the same bitrate
+    for every segment and the same QoE summary from both (batch_evaluator.check_decisions).
+
+    From commandline:
+    python batch_test.py
+"""
+from __future__ import division
+
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+import batch_evaluator
+from benchmark import write_mpd
+import config_dash
+from configure_log_file import configure_log_file
+import read_mpd
+import simulator
+
+TRACE_COUNT = 100
+# Longest trace in intervals
+MAX_TRACE_LENGTH = 400
+REQUEST_LATENCIES = (0, 0.05)
+
+
+def get_random_trace(generator):
+    """ Module to generate a trace with intervals of 1 second or of random lengths. Some intervals have no
+        throughput at all
+    """
+    interval_count = generator.randint(1, MAX_TRACE_LENGTH)
+    timestamps = list()
+    timestamp = 0
+    for _ in range(interval_count):
+        timestamps.append(timestamp)
+        timestamp += generator.choice((1, 1, 0.5, 2.5, 4))
+    # Kbps
+    throughputs = [generator.choice((generator.uniform(50, 8000), generator.uniform(100, 600), 0))
+                   for _ in range(interval_count)]
+    if not any(throughputs):
+        throughputs[0] = 500
+    return simulator.ThroughputTrace(timestamps, [throughput * config_dash.SIM_TRACE_SCALE
+                                                  for throughput in throughputs])
+
+
+def run_test(seed=0):
+    """ :return: True if the batch evaluation matched the simulator on all the traces """
+    if batch_evaluator.np is None:
+        print "ERROR: The batch evaluation needs NumPy"
+        return False
+    generator = random.Random(seed)
+    traces = [get_random_trace(generator) for _ in range(TRACE_COUNT)]
+    test_folder = tempfile.mkdtemp(prefix="astream_batch_test_")
+    try:
+        mpd_file = os.path.join(test_folder, "test.mpd")
+        write_mpd(mpd_file, 8, 150, 2, seed)
+        dp_object, video_segment_duration = read_mpd.read_mpd(mpd_file, read_mpd.DashPlayback())
+    finally:
+        shutil.rmtree(test_folder, ignore_errors=True)
+    passed = True
+    for playback_type in batch_evaluator.BATCH_PLAYBACK_TYPES:
+        for request_latency in REQUEST_LATENCIES:
+            mismatches = batch_evaluator.check_decisions(dp_object, video_segment_duration, traces, playback_type,
+                                                         request_latency)
+            for index, description in mismatches:
+                print "ERROR: {} trace {}: {}".format(playback_type, index, description)
+            print "{} latency={}: {}".format(playback_type, request_latency, "FAILED" if mismatches else "OK")
+            passed = passed and not mismatches
+    return passed
+
+
+if __name__ == "__main__":
+    configure_log_file(playback_type="test", connection_type="BATCH_TEST", log_file=None)
+    config_dash.LOG.setLevel(logging.ERROR)
+    # The compiled test MPD is not kept
+    config_dash.MPD_CACHE_FOLDER = None
+    sys.exit(0 if run_test() else 1)
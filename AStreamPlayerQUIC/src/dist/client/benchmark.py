@@ -0,0 +1,342 @@
+#!/usr/local/bin/python
+""" Micro-benchmarks of the player on a synthetic manifest.
+    An MPD with REPRESENTATIONS bitrates and SEGMENTS segments (random SegmentSize lists) is generated in a
+    temporary folder. The benchmarks time the MPD parsing, the URL generation, each adaptation function,
+    DashPlayer.write and log_entry, and the per-segment work of dash_client.start_playback_smart for every playback
+    type. The playback runs on a fast playback clock, with dash_client.download_segment replaced by a
+    BenchmarkDownload that takes the time of the segment size of the MPD. Its times are the CPU seconds of the
+    process per segment, since the playback itself waits on the clock.
+
+    The results are written as JSON, so runs can be compared across changes ('-b' prints the ratios to a
+    previous result file). Times are seconds per call:
+        {"parameters": {...}, "environment": {...},
+         "benchmarks": {name: {"calls": .., "repeat": .., "best": .., "median": .., "mean": ..}}}
+
+    From commandline:
+    python benchmark.py -r 10 -n 3600 -o after.json -b before.json
+"""
+from __future__ import division
+
+from argparse import ArgumentParser
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+from time import strftime
+import urlparse
+
+from adaptation import basic_dash, basic_dash2, mpc_dash, netflix_dash, weighted_dash
+from adaptation.bitrate_ladder import as_ladder
+from adaptation.throughput import HarmonicMeanEstimator
+from bitrate_selector import get_average_segment_sizes
+import config_dash
+from configure_log_file import close_event_log, configure_log_file
+import dash_buffer
+import dash_client
+import playback_clock
+import read_mpd
+import simulator
+
+# Lowest and highest bitrate of the synthetic ladder (bps). The bitrates in between are spaced geometrically
+LOWEST_BITRATE = 200000
+HIGHEST_BITRATE = 20000000
+PLAYBACK_TYPES = ("BASIC", "SMART", "NETFLIX", "MPC")
+# The segment URLs of the playback benchmarks are relative to this domain. Nothing is requested
+DOMAIN = "http://127.0.0.1/media/"
+
+
+def write_mpd(mpd_file, representation_count, segment_count, segment_duration, seed=0):
+    """ Module to write a synthetic MPD. The segment sizes vary by +-40% around the bitrate
+    :return: list of the bitrates
+    """
+    generator = random.Random(seed)
+    ratio = (HIGHEST_BITRATE / LOWEST_BITRATE) ** (1 / max(representation_count - 1, 1))
+    bitrates = [int(round(LOWEST_BITRATE * ratio ** index, -3)) for index in range(representation_count)]
+    playback_duration = segment_count * segment_duration
+    lines = ['<?xml version="1.0"?>',
+             '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" mediaPresentationDuration="PT{}H{}M{}S" '
+             'minBufferTime="PT2S">'.format(int(playback_duration // 3600), int(playback_duration % 3600 // 60),
+                                             playback_duration % 60),
+             '<Period>',
+             '<AdaptationSet mimeType="video/mp4">']
+    for bitrate in bitrates:
+        lines.append('<Representation bandwidth="{}">'.format(bitrate))
+        lines.append('<SegmentTemplate media="video_$Bandwidth$/seg_$Number%05d$.m4s" startNumber="1" '
+                     'timescale="1000" duration="{}" initialization="video_$Bandwidth$/init.mp4"/>'.format(
+                         int(segment_duration * 1000)))
+        for segment in range(1, segment_count + 1):
+            lines.append('<SegmentSize id="{}" size="{}" scale="bytes"/>'.format(
+                segment, int(bitrate * segment_duration / 8 * generator.uniform(0.6, 1.4))))
+        lines.append('</Representation>')
+    lines += ['</AdaptationSet>', '</Period>', '</MPD>']
+    with open(mpd_file, 'w') as mpd_file_handle:
+        mpd_file_handle.write("\n".join(lines))
+    return bitrates
+
+
+def time_calls(function, arguments, repeat, setup=None, timer=timeit.default_timer):
+    """ Module to time function over a list of argument tuples
+    :param repeat: number of times the whole list is timed
+    :param setup: called before every repetition, not timed
+    :param timer: function returning the current time in seconds. Default the wall clock
+    :return: dict with the seconds per call of the best, median and mean repetition
+    """
+    timings = list()
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start_time = timer()
+        for function_arguments in arguments:
+            function(*function_arguments)
+        timings.append((timer() - start_time) / len(arguments))
+    timings.sort()
+    return {'calls': len(arguments),
+            'repeat': repeat,
+            'best': timings[0],
+            'median': timings[len(timings) // 2],
+            'mean': sum(timings) / len(timings)}
+
+
+class BenchmarkBuffer(object):
+    """ Buffer with a fixed number of segments """
+    def __init__(self, segment_count):
+        self.segment_count = segment_count
+
+    def qsize(self):
+        return self.segment_count
+
+
+class BenchmarkPlayer(object):
+    """ The attributes of dash_buffer.DashPlayer that the adaptation functions read """
+    def __init__(self, buffer_segments, segment_duration):
+        self.buffer = BenchmarkBuffer(buffer_segments)
+        self.segment_duration = segment_duration
+        self.initial_buffer = config_dash.INITIAL_BUFFERING_COUNT
+        self.alpha = config_dash.ALPHA_BUFFER_COUNT
+        self.beta = config_dash.BETA_BUFFER_COUNT
+
+
+def get_url_list(media, segment_duration, playback_duration, bitrate):
+    """ read_mpd.get_url_list on an empty URL list """
+    media.url_list = list()
+    return read_mpd.get_url_list(media, segment_duration, playback_duration, bitrate)
+
+
+def get_adaptation_arguments(dp_object, segment_duration, decision_count, generator):
+    """ Module to generate random inputs for every adaptation function
+    :return: dict of the list of argument tuples by function name
+    """
+    manifest = dp_object.manifest
+    ladder = as_ladder(manifest.bitrates)
+    segment_sizes = manifest.segment_sizes
+    average_segment_sizes = get_average_segment_sizes(dp_object)
+    rate_map = ladder.get_rate_map()
+    arguments = dict((name, list()) for name in ('basic_dash', 'basic_dash2', 'weighted_dash', 'netflix_dash',
+                                                 'get_rate_netflix', 'mpc_dash'))
+    for _ in range(decision_count):
+        segment_index = generator.randrange(segment_sizes.segment_count - 1)
+        bitrate = generator.choice(ladder)
+        # Download rate in bytes per second, around the current bitrate
+        download_rate = bitrate / 8 * generator.uniform(0.3, 3)
+        buffer_segments = generator.randint(0, 2 * config_dash.BETA_BUFFER_COUNT)
+        player = BenchmarkPlayer(buffer_segments, segment_duration)
+        segment_download_time = segment_sizes.size(segment_index, bitrate) / 8 / download_rate
+        # basic_dash only handles a download slower than the average (sigma_download < 1)
+        arguments['basic_dash'].append((segment_index + 1, ladder, segment_download_time * generator.uniform(0.5, 1),
+                                        segment_download_time, bitrate))
+        throughput = HarmonicMeanEstimator(config_dash.BASIC_DELTA_COUNT)
+        for _ in range(config_dash.BASIC_DELTA_COUNT):
+            throughput.update(download_rate * segment_duration, segment_duration * generator.uniform(0.8, 1.2))
+        arguments['basic_dash2'].append((segment_index + 1, ladder, 0, throughput, bitrate))
+        arguments['weighted_dash'].append((ladder, player, download_rate, bitrate, segment_sizes.row(segment_index + 1),
+                                           0))
+        # The INITIAL state steps up one bitrate, so it starts below the highest bitrate
+        state = generator.choice(("INITIAL", "RUNNING")) if bitrate < ladder.highest else "RUNNING"
+        arguments['netflix_dash'].append((ladder, player, download_rate, bitrate, average_segment_sizes, rate_map,
+                                          state, 0))
+        arguments['get_rate_netflix'].append((ladder, buffer_segments - player.initial_buffer,
+                                              config_dash.NETFLIX_BUFFER_SIZE, rate_map))
+        arguments['mpc_dash'].append((ladder, segment_sizes, segment_index, segment_sizes.segment_count - segment_index,
+                                      buffer_segments * segment_duration, segment_duration, download_rate, bitrate,
+                                      generator.uniform(0, 0.5)))
+    return arguments
+
+
+class BenchmarkDownload(object):
+    """ Replaces dash_client.download_segment: a segment takes its size in the MPD at the next rate of
+        download_rates (bytes per second) on the playback clock. Nothing is requested or written
+    """
+    def __init__(self, dp_object, download_rates):
+        self.dp_object = dp_object
+        self.download_rates = download_rates
+        manifest = dp_object.manifest
+        # Segment URL -> (segment number, bitrate)
+        self.segments = dict()
+        for bitrate in manifest.bitrates:
+            for segment_number in range(manifest.start, manifest.start + manifest.segment_count):
+                segment_url = urlparse.urljoin(DOMAIN, manifest.segment_url(segment_number, bitrate))
+                self.segments[segment_url] = segment_number, bitrate
+
+    def __call__(self, segment_url, dash_folder, sb, download=False, cache_key=None, progress=None):
+        segment_number, bitrate = self.segments[segment_url]
+        segment_size = simulator.get_segment_size(self.dp_object, segment_number, bitrate)
+        playback_clock.get_clock().sleep(segment_size / self.download_rates[segment_number % len(self.download_rates)])
+        return segment_size, None, None
+
+
+def play_segments(dp_object, video_segment_duration, playback_type):
+    """ Module to play the MPD with dash_client.start_playback_smart. The downloads and the segment limit are set
+        by run_benchmarks
+    :return: number of segments downloaded
+    """
+    simulator.reset_playback_info()
+    dash_client.start_playback_smart(dp_object, DOMAIN, playback_type, False, video_segment_duration, "BENCHMARK")
+    return len(config_dash.JSON_HANDLE['segment_info'])
+
+
+def run_benchmarks(mpd_file, repeat, decision_count, speed, playback_segments, seed=0):
+    """ Module to run all the benchmarks on an MPD file
+    :param speed: speed of the playback clock of the start_playback_smart benchmarks
+    :param playback_segments: number of segments played by the start_playback_smart benchmarks
+    :return: dict of the timings by benchmark name
+    """
+    generator = random.Random(seed)
+    results = dict()
+    results['read_mpd.compile_mpd'] = time_calls(read_mpd.compile_mpd, [(mpd_file,)], repeat)
+    # load_manifest without the in-memory cache reads the compiled manifest from the disk cache
+    read_mpd.load_manifest(mpd_file)
+    results['read_mpd.load_manifest'] = time_calls(read_mpd.load_manifest, [(mpd_file,)], repeat,
+                                                   setup=read_mpd.MANIFEST_CACHE.clear)
+    dp_object, video_segment_duration = read_mpd.read_mpd(mpd_file, read_mpd.DashPlayback())
+    manifest = dp_object.manifest
+
+    results['read_mpd.get_url_list'] = time_calls(
+        get_url_list, [(dp_object.video[bitrate], video_segment_duration, dp_object.playback_duration, bitrate)
+                       for bitrate in manifest.bitrates], repeat)
+    results['CompiledManifest.segment_url'] = time_calls(
+        manifest.segment_url, [(segment_number, generator.choice(manifest.bitrates))
+                               for segment_number in range(manifest.start, manifest.start + manifest.segment_count)],
+        repeat)
+
+    arguments = get_adaptation_arguments(dp_object, video_segment_duration, decision_count, generator)
+    adaptation_functions = {'basic_dash': basic_dash.basic_dash,
+                            'basic_dash2': basic_dash2.basic_dash2,
+                            'weighted_dash': weighted_dash.weighted_dash,
+                            'netflix_dash': netflix_dash.netflix_dash,
+                            'get_rate_netflix': netflix_dash.get_rate_netflix,
+                            'mpc_dash': mpc_dash.mpc_dash}
+    for name, function in adaptation_functions.items():
+        results['adaptation.' + name] = time_calls(function, arguments[name], repeat)
+    # Every MPC decision planned from an empty decision table
+    results['adaptation.mpc_dash.cold'] = time_calls(mpc_dash.mpc_dash, arguments['mpc_dash'], repeat,
+                                                     setup=mpc_dash.DECISION_TABLES.clear)
+
+    dash_player = dash_buffer.DashPlayer(dp_object.playback_duration, video_segment_duration, "BENCHMARK")
+    segment = {'playback_length': video_segment_duration, 'size': 0, 'bitrate': manifest.bitrates[0],
+               'data': None, 'URI': None, 'segment_number': 1}
+    results['DashPlayer.write'] = time_calls(dash_player.write, [(segment,)] * decision_count, repeat)
+    results['DashPlayer.log_entry'] = time_calls(dash_player.log_entry, [("Writing", manifest.bitrates[0])] *
+                                                 decision_count, repeat)
+    dash_player.close_log()
+
+    download_rates = [generator.uniform(LOWEST_BITRATE, HIGHEST_BITRATE) / 8 for _ in range(100)]
+    playback_clock.set_speed(speed)
+    dash_client.SEGMENT_LIMIT = playback_segments
+    download_segment = dash_client.download_segment
+    dash_client.download_segment = BenchmarkDownload(dp_object, download_rates)
+    try:
+        for playback_type in PLAYBACK_TYPES:
+            segment_counts = list()
+            # time.clock is the CPU time of the process on Unix
+            timing = time_calls(lambda: segment_counts.append(play_segments(
+                dp_object, video_segment_duration, playback_type)), [()], repeat, timer=time.clock)
+            # Per segment
+            for key in ('best', 'median', 'mean'):
+                timing[key] /= max(segment_counts[0], 1)
+            timing['calls'] = segment_counts[0]
+            results['start_playback_smart.segment.' + playback_type] = timing
+    finally:
+        dash_client.download_segment = download_segment
+    close_event_log()
+    return results
+
+
+def print_results(results, baseline=None):
+    """ Module to print the median time per call of every benchmark, and the ratio to the baseline results """
+    for name in sorted(results):
+        line = "{:<45} {:>12.3f} us".format(name, results[name]['median'] * 1e6)
+        if baseline and name in baseline and baseline[name]['median']:
+            line += "  x{:.2f} of the baseline".format(results[name]['median'] / baseline[name]['median'])
+        print line
+
+
+def create_arguments(parser):
+    """ Adding arguments to the parser """
+    parser.add_argument('-r', '--REPRESENTATIONS', type=int, default=10,
+                        help="Number of bitrates of the synthetic MPD")
+    parser.add_argument('-n', '--SEGMENTS', type=int, default=3600,
+                        help="Number of segments of the synthetic MPD")
+    parser.add_argument('-s', '--SEGMENT_DURATION', type=int, default=2,
+                        help="Segment duration in seconds")
+    parser.add_argument('-repeat', '--REPEAT', type=int, default=5,
+                        help="Number of times every benchmark is timed")
+    parser.add_argument('-decisions', '--DECISIONS', type=int, default=1000,
+                        help="Number of random inputs of the adaptation benchmarks")
+    parser.add_argument('-speed', '--SPEED', type=float, default=1000,
+                        help="Speed of the playback clock of the start_playback_smart benchmarks")
+    parser.add_argument('-playback_segments', '--PLAYBACK_SEGMENTS', type=int, default=300,
+                        help="Number of segments played by the start_playback_smart benchmarks")
+    parser.add_argument('-o', '--OUTPUT', default=config_dash.BENCHMARK_FILENAME,
+                        help="JSON file for the results")
+    parser.add_argument('-b', '--BASELINE',
+                        help="JSON results of an earlier run to compare with")
+
+
+def main():
+    """ Main Program wrapper """
+    parser = ArgumentParser(description='Time the player code on a synthetic manifest')
+    create_arguments(parser)
+    args = parser.parse_args()
+    configure_log_file(playback_type="benchmark", connection_type="BENCHMARK", log_file=None)
+    config_dash.LOG.setLevel(logging.CRITICAL)
+    benchmark_folder = tempfile.mkdtemp(prefix="astream_benchmark_")
+    # Keep the buffer logs, the event log and the compiled manifests of the benchmark out of ASTREAM_LOGS
+    config_dash.BUFFER_LOG_FILENAME = os.path.join(benchmark_folder, "DASH_BUFFER_LOG")
+    config_dash.JSON_EVENT_LOG = os.path.join(benchmark_folder, "events.ndjson")
+    config_dash.JSON_LOG = os.path.join(benchmark_folder, "playback.json")
+    config_dash.MPD_CACHE_FOLDER = os.path.join(benchmark_folder, "mpd_cache")
+    try:
+        mpd_file = os.path.join(benchmark_folder, "benchmark.mpd")
+        write_mpd(mpd_file, args.REPRESENTATIONS, args.SEGMENTS, args.SEGMENT_DURATION)
+        results = run_benchmarks(mpd_file, args.REPEAT, args.DECISIONS, args.SPEED, args.PLAYBACK_SEGMENTS)
+    finally:
+        shutil.rmtree(benchmark_folder, ignore_errors=True)
+    output = {'parameters': {'representations': args.REPRESENTATIONS,
+                             'segments': args.SEGMENTS,
+                             'segment_duration': args.SEGMENT_DURATION,
+                             'repeat': args.REPEAT,
+                             'decisions': args.DECISIONS,
+                             'speed': args.SPEED,
+                             'playback_segments': args.PLAYBACK_SEGMENTS},
+              'environment': {'python': platform.python_version(),
+                              'platform': platform.platform(),
+                              'time': strftime('%Y-%m-%d %H:%M:%S')},
+              'benchmarks': results}
+    with open(args.OUTPUT, 'w') as output_handle:
+        json.dump(output, output_handle, indent=2, sort_keys=True)
+    baseline = None
+    if args.BASELINE:
+        with open(args.BASELINE) as baseline_handle:
+            baseline = json.load(baseline_handle)['benchmarks']
+    print_results(results, baseline)
+    print "RESULTS: ", args.OUTPUT
+
+
+if __name__ == "__main__":
+    sys.exit(main())
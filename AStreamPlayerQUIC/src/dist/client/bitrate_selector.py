@@ -0,0 +1,238 @@
+""" Module that chooses the bitrate of each segment of a playback session.
+    BitrateSelector holds the rate adaptation state of one session (throughput estimator, Netflix rate map, ...)
+    and calls the algorithms of the adaptation package.
+    It is shared by the live player (dash_client.start_playback_smart) and the offline simulator (simulator.py).
+
+    Usage:
+        selector = BitrateSelector("SMART", dp_object)
+        bitrate, delay, done = selector.select(segment_number, dash_player, segment_duration)
+        ... download the segment, reporting its progress ...
+        selector.progress(segment_number, downloaded_size, elapsed_time)
+        lower_bitrate = selector.abandon_bitrate(segment_number, bitrate, downloaded_size, elapsed_time, buffer_left)
+        ...
+        selector.update(segment_size, segment_download_time, segment_number)
+"""
+from __future__ import division
+
+from collections import deque
+
+from adaptation import basic_dash, basic_dash2, weighted_dash, netflix_dash, mpc_dash
+from adaptation.bitrate_ladder import as_ladder
+from adaptation.throughput import get_estimator
+import config_dash
+
+
+def get_segment_sizes(dp_object, segment_number):
+    """ Module to get the segment sizes for the segment_number
+    :param dp_object:
+    :param segment_number:
+    :return: The row of the manifest's SegmentSizes, indexed by bitrate. IndexError after the last segment
+    """
+    segment_sizes = dp_object.manifest.segment_sizes.row(segment_number)
+    config_dash.LOG.debug("The segment sizes of {} are {}".format(segment_number, segment_sizes))
+    return segment_sizes
+
+
+def get_throughput_estimator(window_size):
+    """ Module to create the throughput estimator of config_dash.THROUGHPUT_ESTIMATOR
+    :param window_size: number of segments of the windowed estimators
+    """
+    return get_estimator(config_dash.THROUGHPUT_ESTIMATOR, window_size, ewma_weight=config_dash.THROUGHPUT_EWMA_WEIGHT,
+                         percentile=config_dash.THROUGHPUT_PERCENTILE)
+
+
+def get_average_segment_sizes(dp_object):
+    """
+    Module to get the avearge segment sizes for each bitrate
+    :param dp_object:
+    :return: A dictionary of aveage segment sizes for each bitrate
+    """
+    average_segment_sizes = dict(dp_object.manifest.segment_sizes.average_sizes)
+    config_dash.LOG.info("The avearge segment size for is {}".format(average_segment_sizes.items()))
+    return average_segment_sizes
+
+
+class BitrateSelector(object):
+    """ Rate adaptation state of a playback session """
+    def __init__(self, playback_type, dp_object):
+        """
+        :param playback_type: 'BASIC', 'SMART' (SARA), 'NETFLIX' or 'MPC'. Other types use basic_dash
+        :param dp_object: DashPlayback with the compiled manifest
+        """
+        self.playback_type = playback_type.upper()
+        self.dp_object = dp_object
+        self.manifest = dp_object.manifest
+        # Sorted bitrates of the manifest, shared by all the sessions of the manifest
+        self.bitrates = as_ladder(self.manifest.bitrates)
+        self.current_bitrate = self.bitrates[0]
+        self.average_dwn_time = 0
+        # Throughput estimator of the algorithm. SARA only creates it at its first decision
+        self.throughput = None
+        if self.playback_type == "BASIC":
+            self.throughput = get_throughput_estimator(config_dash.BASIC_DELTA_COUNT)
+        elif self.playback_type == "NETFLIX":
+            # Netflix looks at the download rate of the last segment
+            self.throughput = get_throughput_estimator(1)
+        elif self.playback_type == "MPC":
+            self.throughput = get_throughput_estimator(config_dash.MPC_SAMPLE_COUNT)
+        # Relative errors of the last throughput estimates of MPC
+        self.throughput_errors = deque(maxlen=config_dash.MPC_SAMPLE_COUNT)
+        # Measurement of the last downloaded segment
+        self.segment_size = self.segment_download_time = None
+        # Download rates of the segments in flight, by segment number (progress)
+        self.in_flight_rates = dict()
+        # Netflix Variables
+        self.average_segment_sizes = self.netflix_rate_map = None
+        self.netflix_state = "INITIAL"
+        # The bitrate is kept for this many segments after a jump
+        self.jump_buffer_counter = 0
+
+    def select(self, segment_number, dash_player, segment_duration):
+        """ Choose the bitrate of the next segment request
+        :param dash_player: player with the buffer (buffer.qsize(), initial_buffer, alpha, beta, segment_duration)
+        :param segment_duration: playback length of the last downloaded segment
+        :return: (bitrate, delay, done). Wait until delay more segments have left the buffer before the request
+                 (DashPlayer.wait_for_buffer_level). done is True when there is nothing more to request
+        """
+        delay = 0
+        if segment_number == self.manifest.start:
+            self.current_bitrate = self.bitrates[0]
+            return self.current_bitrate, delay, False
+        if self.segment_size is None:
+            # Nothing measured yet: the segments so far came from the segment cache
+            return self.current_bitrate, delay, False
+        bitrates = self.bitrates
+        manifest = self.manifest
+        if self.playback_type == "BASIC":
+            self.current_bitrate, self.average_dwn_time = basic_dash2.basic_dash2(
+                segment_number, bitrates, self.average_dwn_time, self.throughput, self.current_bitrate)
+            if dash_player.buffer.qsize() > config_dash.BASIC_THRESHOLD:
+                delay = dash_player.buffer.qsize() - config_dash.BASIC_THRESHOLD
+            config_dash.LOG.info("Basic-DASH: Selected {} for the segment {}".format(self.current_bitrate,
+                                                                                     segment_number + 1))
+        elif self.playback_type == "SMART":
+            if not self.throughput:
+                # The weighted harmonic mean is over SARA_SAMPLE_COUNT + 1 segments (adaptation.WeightedMean)
+                self.throughput = get_throughput_estimator(config_dash.SARA_SAMPLE_COUNT + 1)
+                config_dash.LOG.debug("Initializing the throughput estimator")
+            # Checking the segment number is in acceptable range
+            if segment_number < manifest.segment_count - 1 + manifest.start:
+                try:
+                    config_dash.LOG.info("JUMP_BUFFER_COUNTER: %s", str(self.jump_buffer_counter))
+                    self.current_bitrate, delay, self.jump_buffer_counter = weighted_dash.weighted_dash(
+                        bitrates, dash_player, self.get_throughput(), self.current_bitrate,
+                        get_segment_sizes(self.dp_object, segment_number + 1), self.jump_buffer_counter)
+                except IndexError, e:
+                    config_dash.LOG.error(e)
+        elif self.playback_type == "NETFLIX":
+            config_dash.LOG.info("Playback is NETFLIX")
+            # Calculate the average segment sizes for each bitrate
+            if not self.average_segment_sizes:
+                self.average_segment_sizes = get_average_segment_sizes(self.dp_object)
+            if segment_number < manifest.segment_count - 1 + manifest.start:
+                try:
+                    segment_download_rate = self.get_throughput()
+                    config_dash.LOG.info("JUMP_BUFFER_COUNTER: %s", str(self.jump_buffer_counter))
+                    (self.current_bitrate, self.netflix_rate_map, self.netflix_state,
+                     self.jump_buffer_counter) = netflix_dash.netflix_dash(
+                        bitrates, dash_player, segment_download_rate, self.current_bitrate,
+                        self.average_segment_sizes, self.netflix_rate_map, self.netflix_state,
+                        self.jump_buffer_counter)
+                    config_dash.LOG.info("NETFLIX: Next bitrate = {}".format(self.current_bitrate))
+                except IndexError, e:
+                    config_dash.LOG.error(e)
+            else:
+                config_dash.LOG.critical("Completed segment playback for Netflix")
+                return self.current_bitrate, delay, True
+            # If the buffer is full wait till there is room for the segment
+            if dash_player.buffer.qsize() >= config_dash.NETFLIX_BUFFER_SIZE:
+                delay = dash_player.buffer.qsize() - config_dash.NETFLIX_BUFFER_SIZE + 1
+                config_dash.LOG.info("NETFLIX: delay = {} segments".format(delay))
+        elif self.playback_type == "MPC":
+            last_segment = manifest.segment_count - 1 + manifest.start
+            # SegmentSize index of the segment: the initialization segment has none
+            self.current_bitrate = mpc_dash.mpc_dash(
+                bitrates, manifest.segment_sizes, segment_number - manifest.start - 1,
+                last_segment - segment_number + 1, dash_player.buffer.qsize() * dash_player.segment_duration,
+                dash_player.segment_duration, self.get_throughput(), self.current_bitrate,
+                max(self.throughput_errors or [0]))
+            if dash_player.buffer.qsize() > config_dash.MPC_BUFFER_SIZE:
+                delay = dash_player.buffer.qsize() - config_dash.MPC_BUFFER_SIZE
+            config_dash.LOG.info("MPC: Selected {} for the segment {}".format(self.current_bitrate, segment_number))
+        else:
+            config_dash.LOG.error("Unknown playback type:{}. Continuing with basic playback".format(
+                self.playback_type))
+            self.current_bitrate, self.average_dwn_time = basic_dash.basic_dash(
+                segment_number, bitrates, self.average_dwn_time, self.segment_download_time, self.current_bitrate)
+        return self.current_bitrate, delay, False
+
+    def get_throughput(self):
+        """ :return: The throughput estimate in bytes per second, lowered to the rate of the downloads in flight
+                     while they are slower
+        """
+        estimate = self.throughput.estimate
+        if self.in_flight_rates and self.throughput.sample_count:
+            estimate = min(estimate, sum(self.in_flight_rates.values()))
+        return estimate
+
+    def get_segment_size(self, segment_number, bitrate):
+        """ :return: The size in bytes of the segment at bitrate. Segments without a SegmentSize are assumed to be
+                     encoded at exactly the bitrate
+        """
+        try:
+            # The MPD sizes are in bits and the initialization segment has none
+            return self.manifest.segment_sizes.size(segment_number - self.manifest.start - 1, bitrate) / 8
+        except (IndexError, KeyError):
+            return bitrate * self.manifest.segment_duration / 8
+
+    def progress(self, segment_number, downloaded_size, elapsed_time):
+        """ Add the progress of a segment download in flight (bytes and seconds since the request) """
+        if elapsed_time >= config_dash.PROGRESS_MIN_TIME and downloaded_size > 0:
+            self.in_flight_rates[segment_number] = downloaded_size / elapsed_time
+
+    def abandon_bitrate(self, segment_number, bitrate, downloaded_size, elapsed_time, buffer_left):
+        """ Abandonment policy of a segment download in flight. A download that would complete after the buffer
+            ahead of it has played is abandoned for the highest lower bitrate that downloads in time at the current
+            rate, or else the lowest bitrate if it downloads faster than the rest of the current one
+        :param buffer_left: seconds of video that play before the segment is needed
+        :return: The bitrate to request the segment again at, None to complete the download
+        """
+        if (segment_number == self.manifest.start or elapsed_time < config_dash.PROGRESS_MIN_TIME or
+                downloaded_size <= 0):
+            return None
+        download_rate = downloaded_size / elapsed_time
+        remaining_time = (self.get_segment_size(segment_number, bitrate) - downloaded_size) / download_rate
+        if remaining_time <= buffer_left:
+            return None
+        lower_bitrates = self.bitrates.below(bitrate)
+        for lower_bitrate in reversed(lower_bitrates):
+            if self.get_segment_size(segment_number, lower_bitrate) / download_rate <= buffer_left:
+                return lower_bitrate
+        if lower_bitrates and self.get_segment_size(segment_number, lower_bitrates[0]) / download_rate < remaining_time:
+            return lower_bitrates[0]
+        return None
+
+    def abandon(self, segment_number, bitrate, downloaded_size, elapsed_time):
+        """ Add the measurement of an abandoned download. The segment is requested again at bitrate """
+        self.in_flight_rates.pop(segment_number, None)
+        if self.throughput and downloaded_size > 0 and elapsed_time > 0:
+            self.throughput.update(downloaded_size, elapsed_time)
+        self.current_bitrate = min(self.current_bitrate, bitrate)
+
+    def update(self, segment_size, segment_download_time, segment_number=None):
+        """ Add the measurement of a downloaded segment """
+        self.in_flight_rates.pop(segment_number, None)
+        self.segment_size = segment_size
+        self.segment_download_time = segment_download_time
+        if self.throughput:
+            if (self.playback_type == "MPC" and self.throughput.sample_count and segment_size > 0 and
+                    segment_download_time > 0):
+                segment_download_rate = segment_size / segment_download_time
+                self.throughput_errors.append(abs(self.throughput.estimate - segment_download_rate) /
+                                              segment_download_rate)
+            self.throughput.update(segment_size, segment_download_time)
+
+    def jump(self):
+        """ Keep the bitrate for the next segments after a jump. The downloads in flight are dropped """
+        self.jump_buffer_counter = config_dash.JUMP_BUFFER_COUNTER_CONSTANT
+        self.in_flight_rates.clear()
@@ -22,6 +22,7 @@
 import copy
 import time
 
+from configure_log_file import configure_log_file
 import dash_buffer
 
 
@@ -41,7 +42,7 @@ def run_test(segment_arrival_times=SEGMENT_ARRIVAL_TIMES):
     :param segment_arrival_times: list of times the segement is loaded into the buffer
     :return: None
     """
-    db = dash_buffer.DashBuffer(20)
+    db = dash_buffer.DashPlayer(20, SEGMENT['playback_length'], "BUFFER_TEST")
     start_time = time.time()
     db.start()
     for count, arrival_time in enumerate(segment_arrival_times):
@@ -56,9 +57,13 @@ def run_test(segment_arrival_times=SEGMENT_ARRIVAL_TIMES):
                 print "ERROR: Missed the time slot for segemt {}".format(count)
                 break
             time.sleep(1)
-    if time.time() - start_time >= 40:
+    # Wait for the player to play the buffer
+    if not db.wait_for_exit(40 - (time.time() - start_time)):
         print "Killing the player after 40 seconds"
         db.stop()
+    db.close_log()
 
 
-run_test()
\ No newline at end of file
+if __name__ == "__main__":
+    configure_log_file(playback_type="test", connection_type="BUFFER_TEST", log_file=None)
+    run_test()
\ No newline at end of file
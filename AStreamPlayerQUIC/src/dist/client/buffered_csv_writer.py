@@ -0,0 +1,75 @@
+""" Module for CSV logs that are written from several threads.
+    BufferedCsvWriter keeps the rows in memory and appends them to the file in batches:
+    every `flush_rows` rows, every `flush_interval` seconds and when the program exits.
+"""
+import atexit
+import csv
+import os
+import threading
+
+
+class BufferedCsvWriter(object):
+    """ Long lived, thread safe CSV writer that flushes the rows in batches """
+    def __init__(self, filename, header_row=None, delimiter=";", flush_rows=100, flush_interval=5):
+        """
+        :param filename: CSV file. Rows are appended if the file exists
+        :param header_row: written first if the file does not exist yet
+        :param flush_rows: flush when this many rows are buffered
+        :param flush_interval: seconds between timed flushes. None or 0 disables the timer
+        """
+        self.filename = filename
+        self.delimiter = delimiter
+        self.flush_rows = flush_rows
+        self.rows = list()
+        if header_row and not os.path.exists(filename):
+            self.rows.append(header_row)
+        self.rows_lock = threading.Lock()
+        # Serializes the writes to the file
+        self.file_lock = threading.Lock()
+        self.file_handle = None
+        self.stopped = threading.Event()
+        self.flush_thread = None
+        if flush_interval:
+            self.flush_thread = threading.Thread(target=self.flush_periodically, args=(flush_interval,))
+            self.flush_thread.daemon = True
+            self.flush_thread.start()
+        # Flush whatever is left if the program exits without closing the writer
+        atexit.register(self.close)
+
+    def writerow(self, row):
+        self.rows_lock.acquire()
+        self.rows.append(row)
+        flush_now = len(self.rows) >= self.flush_rows
+        self.rows_lock.release()
+        if flush_now:
+            self.flush()
+
+    def flush(self):
+        """ Append the buffered rows to the file """
+        self.file_lock.acquire()
+        try:
+            self.rows_lock.acquire()
+            rows, self.rows = self.rows, list()
+            self.rows_lock.release()
+            if not rows:
+                return
+            if not self.file_handle:
+                self.file_handle = open(self.filename, "ab")
+            csv.writer(self.file_handle, delimiter=self.delimiter).writerows(rows)
+            self.file_handle.flush()
+        finally:
+            self.file_lock.release()
+
+    def flush_periodically(self, flush_interval):
+        while not self.stopped.wait(flush_interval):
+            self.flush()
+
+    def close(self):
+        """ Flush the rows and close the file. Rows written after close are kept until the next flush """
+        self.stopped.set()
+        self.flush()
+        self.file_lock.acquire()
+        if self.file_handle:
+            self.file_handle.close()
+            self.file_handle = None
+        self.file_lock.release()
@@ -25,9 +25,27 @@ from time import strftime
 
 #Command line parameters for QUIC and TCP clients 
 QUIC_SERVER_IP='0.0.0.0'
-QUIC_CLIENT_CMD="/home/sevket/proto-quic/src/out/Default/quic_client --host=" + QUIC_SERVER_IP + " --port=443 --v=0 x --disable-certificate-verification --folder=/home/sevket/tmp/python-quic/"
+QUIC_CLIENT_CMD="/home/sevket/proto-quic/src/out/Default/quic_client --host=" + QUIC_SERVER_IP + " --port=443 --v=0 x --disable-certificate-verification"
 QUIC_FILES_HEADER_XORIGINAL_URL_DOMAIN="https://www.example.com"
-CURL_CLIENT_CMD="/home/sevket/eclipse_kepler_work_libcurl/LibCurlCppConsole/Release/LibCurlCppConsole -f /home/sevket/tmp/python-curl/"
+CURL_CLIENT_CMD="/home/sevket/eclipse_kepler_work_libcurl/LibCurlCppConsole/Release/LibCurlCppConsole"
+# Folders the helpers save the segments in. Only passed with -d (DOWNLOAD), otherwise the helpers only measure
+QUIC_CLIENT_FOLDER_OPTION=" --folder=/home/sevket/tmp/python-quic/"
+CURL_CLIENT_FOLDER_OPTION=" -f /home/sevket/tmp/python-curl/"
+# hashlib algorithm used to digest the measured segments when they are not saved (eg: 'sha1'). None to only count bytes
+SEGMENT_HASH = None
+# Maximum number of keep-alive connections the URLLIB transport opens to one origin
+HTTP_POOL_MAX_CONNECTIONS = 8
+# Seconds to wait for a helper to print its start-up line and for the result of one segment request
+HELPER_READY_TIMEOUT = 10
+HELPER_REQUEST_TIMEOUT = 60
+# Seconds a helper is given to exit after the exit command before its process group is killed
+HELPER_EXIT_TIMEOUT = 2
+# Keep a started helper in standby to take over as soon as the active helper fails (helper_supervisor.py)
+HELPER_STANDBY = True
+# Helpers started in a row before giving up when none gets ready, and the seconds waited after the first failed
+# start. The wait doubles after every failed start
+HELPER_START_ATTEMPTS = 3
+HELPER_RESTART_DELAY = 1
 
 # The configuration file for the AStream module
 # create logger
@@ -43,12 +61,20 @@ LOG_FILENAME = os.path.join(LOG_FOLDER, 'DASH_RUNTIME_LOG')
 # Logs related to the statistics for the video
 # Buffer logs created by dash_buffer.py
 BUFFER_LOG_FILENAME = os.path.join(LOG_FOLDER, strftime('DASH_BUFFER_LOG_%Y-%m-%d.%H_%M_%S'))
+# The buffer log rows are written in batches of this many rows, or every this many seconds
+BUFFER_LOG_FLUSH_ROWS = 100
+BUFFER_LOG_FLUSH_INTERVAL = 5
 LOG_FILE_HANDLE = None
 # To be set by configure_log_file.py
 LOG = None
 # JSON Filename
 JSON_LOG = os.path.join(LOG_FOLDER, strftime('ASTREAM_%Y-%m-%d.%H_%M_%S.json'))
 JSON_HANDLE = dict()
+# Events of the session (one JSON record per line). JSON_LOG is written once, at the end of the playback
+JSON_EVENT_LOG = os.path.join(LOG_FOLDER, strftime('ASTREAM_%Y-%m-%d.%H_%M_%S.ndjson'))
+JSON_EVENT_LOG_HANDLE = None
+# Compiled MPD files, keyed by the hash of the MPD content (read_mpd.py). None disables the disk cache
+MPD_CACHE_FOLDER = "ASTREAM_MPD_CACHE/"
 JSON_HANDLE['playback_info'] = {'start_time': None,
                                 'end_time': None,
                                 'initial_buffering_duration': None,
@@ -56,6 +82,59 @@ JSON_HANDLE['playback_info'] = {'start_time': None,
                                 'up_shifts': 0,
                                 'down_shifts': 0
                                 }
+# Number of segment requests kept in flight by the downloader (dash_client.py -w)
+PREFETCH_WINDOW = 1
+# Speed of the playback clock (playback_clock.py, dash_client.py -speed): clock seconds per wall clock second.
+# Scale the bandwidth of the origin by the same factor to keep the decisions of a real time playback
+PLAYBACK_SPEED = 1
+# Load generation (dash_client.py -clients): the sessions start evenly spread over this many seconds
+LOAD_RAMP = 0
+# Per second statistics of all the sessions of a load generation run
+LOAD_STATS_FILENAME = os.path.join(LOG_FOLDER, strftime('LOAD_STATS_%Y-%m-%d.%H_%M_%S.csv'))
+
+# Mirror mode (dash_client.py -p all, mirror.py): worker threads downloading the files of every representation,
+# and the connections they open to one origin at most
+MIRROR_WORKERS = 8
+MIRROR_CONNECTIONS = 4
+# Socket timeout of the mirror requests in seconds
+MIRROR_TIMEOUT = 30
+# With -d the files are saved in this folder, in the folder layout of the origin
+MIRROR_FOLDER = "MIRROR/"
+
+# Local segment cache (segment_cache.py, dash_client.py -cache): folder of the cached segments, and their maximum
+# total size in bytes. The least recently used segments are evicted first
+SEGMENT_CACHE_FOLDER = "ASTREAM_SEGMENT_CACHE/"
+SEGMENT_CACHE_SIZE = 512 * 1024 * 1024
+
+# Simulator (simulator.py): factor from the trace throughputs to bytes per second (Kbps traces)
+SIM_TRACE_SCALE = 1000 / 8
+# Seconds added to every simulated segment download (eg: the RTT)
+SIM_REQUEST_LATENCY = 0
+# Size in bytes of the initialization segment, which the MPD does not list
+SIM_INIT_SEGMENT_SIZE = 1000
+# Batch evaluation (batch_evaluator.py): QoE penalty in Mbps for every second of interruption
+BATCH_QOE_REBUFFER_PENALTY = 4.3
+# QoE summary of every evaluated trace
+BATCH_SUMMARY_FILENAME = os.path.join(LOG_FOLDER, strftime('BATCH_SUMMARY_%Y-%m-%d.%H_%M_%S.csv'))
+# Results of benchmark.py
+BENCHMARK_FILENAME = os.path.join(LOG_FOLDER, strftime('BENCHMARK_%Y-%m-%d.%H_%M_%S.json'))
+
+# Throughput estimator of the adaptation algorithms (adaptation/throughput.py): 'harmonic' (weighted harmonic mean),
+# 'ewma' or 'percentile'. The windows are BASIC_DELTA_COUNT segments for BASIC-2, SARA_SAMPLE_COUNT + 1 for SARA
+# and the last segment for Netflix
+THROUGHPUT_ESTIMATOR = 'harmonic'
+# Weight of the newest segment in the 'ewma' estimator
+THROUGHPUT_EWMA_WEIGHT = 0.3
+# Percentile of the download rates in the window for the 'percentile' estimator
+THROUGHPUT_PERCENTILE = 50
+# Experimental (dash_client.py -abandon): the downloads in flight report their progress (URLLIB). A download that
+# would complete after the buffer ahead of it has played is abandoned, and the segment requested again at the highest
+# lower bitrate that completes in time (BitrateSelector.abandon_bitrate)
+ABANDON_SEGMENTS = False
+# Once a download in flight has run for this many seconds, its rate lowers the throughput estimate of SARA, Netflix
+# and MPC while it is below the estimate
+PROGRESS_MIN_TIME = 0.5
+
 # player is forced to keep segment bit rate unchanged  for  next  this number segments
 JUMP_BUFFER_COUNTER_CONSTANT = 4
 
@@ -91,6 +170,23 @@ NETFLIX_BUFFER_SIZE = 4
 NETFLIX_INITIAL_BUFFER = 2
 NETFLIX_INITIAL_FACTOR = 0.875
 
+# ---------------------------------------------------
+# MPC (Model Predictive Control) ADAPTATION
+# ---------------------------------------------------
+# Constants for adaptation/mpc_dash.py
+# Number of future segments the QoE is optimized over
+MPC_HORIZON = 5
+# Number of segments for the throughput estimate
+MPC_SAMPLE_COUNT = 5
+# QoE penalties (Mbps) for every second of rebuffering and for every Mbps of bitrate switch
+MPC_REBUFFER_PENALTY = 4.3
+MPC_SWITCH_PENALTY = 1
+# The player waits while the buffer holds more than this many segments
+MPC_BUFFER_SIZE = 10
+# Steps of the decision table: seconds of buffer and relative throughput change
+MPC_BUFFER_STEP = 0.5
+MPC_THROUGHPUT_STEP = 0.05
+
 # For ping.py
 PING_PACKETS = 10
 ping_option_nb_pkts = PING_PACKETS
@@ -2,9 +2,14 @@ import io
 import json
 import logging
 import sys
+import threading
 from time import strftime
 
 import config_dash
+import playback_clock
+
+# Serializes the appends to the event log from the download and the player threads
+EVENT_LOG_LOCK = threading.Lock()
 
 
 def configure_log_file(playback_type="",connection_type="",log_file=config_dash.LOG_FILENAME):
@@ -16,6 +21,9 @@ def configure_log_file(playback_type="",connection_type="",log_file=config_dash.
     
     config_dash.LOG=None
     config_dash.LOG = logging.getLogger(config_dash.LOG_NAME)
+    # Drop the handlers of the previous run (or of the parent process) so each run logs to its own file
+    for handler in list(config_dash.LOG.handlers):
+        config_dash.LOG.removeHandler(handler)
     config_dash.LOG_LEVEL = logging.INFO
     config_dash.LOG.setLevel(config_dash.LOG_LEVEL)
     log_formatter = logging.Formatter('%(asctime)s - %(filename)s:%(lineno)d - %(levelname)s - %(message)s')
@@ -33,12 +41,43 @@ def configure_log_file(playback_type="",connection_type="",log_file=config_dash.
         print("Started logging in the log file:{}".format(log_file))
 
 
-def write_json(json_data=config_dash.JSON_HANDLE, json_file=config_dash.JSON_LOG):
+def write_json(json_data=config_dash.JSON_HANDLE, json_file=None):
     """
     :param json_data: dict
-    :param json_file: json file
+    :param json_file: json file. Default config_dash.JSON_LOG
     :return: None
         Using utf-8 to reduce size of the file
     """
+    if not json_file:
+        json_file = config_dash.JSON_LOG
     with io.open(json_file, 'w', encoding='utf-8') as json_file_handle:
-        json_file_handle.write(unicode(json.dumps(json_data, ensure_ascii=False)))
\ No newline at end of file
+        json_file_handle.write(unicode(json.dumps(json_data, ensure_ascii=False)))
+
+
+def log_event(event_type, event_data=None, event_file=None):
+    """
+    Append one record to the newline delimited JSON (NDJSON) session log.
+    :param event_type: 'session', 'segment', 'interruption', 'shift'
+    :param event_data: dict with the fields of the record
+    :param event_file: NDJSON file. Used when the log is opened by the first event. Default config_dash.JSON_EVENT_LOG
+    :return: None
+    """
+    if not event_file:
+        event_file = config_dash.JSON_EVENT_LOG
+    record = {'event': event_type, 'time': playback_clock.get_clock().time()}
+    if event_data:
+        record.update(event_data)
+    line = json.dumps(record) + "\n"
+    with EVENT_LOG_LOCK:
+        if not config_dash.JSON_EVENT_LOG_HANDLE:
+            config_dash.JSON_EVENT_LOG_HANDLE = open(event_file, 'a')
+        config_dash.JSON_EVENT_LOG_HANDLE.write(line)
+        config_dash.JSON_EVENT_LOG_HANDLE.flush()
+
+
+def close_event_log():
+    """ Close the NDJSON session log. The next event opens it again """
+    with EVENT_LOG_LOCK:
+        if config_dash.JSON_EVENT_LOG_HANDLE:
+            config_dash.JSON_EVENT_LOG_HANDLE.close()
+            config_dash.JSON_EVENT_LOG_HANDLE = None
@@ -1,12 +1,12 @@
 from __future__ import division
 
 import Queue
-import csv
-import os
 import threading
-import time
 
+from buffered_csv_writer import BufferedCsvWriter
 import config_dash
+from configure_log_file import log_event
+import playback_clock
 from stop_watch import StopWatch
 from _ast import Str
 
@@ -15,22 +15,37 @@ from _ast import Str
 PLAYER_STATES = ['INITIALIZED', 'INITIAL_BUFFERING', 'PLAY',
                  'PAUSE', 'BUFFERING', 'STOP', 'END']
 EXIT_STATES = ['STOP', 'END']
+BUFFER_LOG_HEADER = ("EpochTime;CurrentPlaybackTime;CurrentBufferSize;CurrentPlaybackState;Action;Bitrate;"
+                     "ConnectTime;HandshakeTime;FirstByteTime;TransferTime;WriteTime").split(";")
+# Download phases of the timing record of a segment, logged in milliseconds on the Writing row of the segment
+TIMING_LOG_FIELDS = ['connect', 'handshake', 'ttfb', 'transfer', 'write']
+
+
+def format_timing(timing):
+    """ Module to format the download phases of a segment for the buffer log. The missing phases are empty """
+    return ["" if not timing or timing.get(field) is None else "{:.3f}".format(timing[field] * 1000)
+            for field in TIMING_LOG_FIELDS]
 
 
 class DashPlayer:
     """ DASH buffer class """
-    def __init__(self, video_length, segment_duration,connectionType):
+    def __init__(self, video_length, segment_duration,connectionType, clock=None):
+        """ clock: PlaybackClock of all the player timing. Default playback_clock.get_clock() """
         config_dash.LOG.info("Initializing the Buffer")
+        self.clock = clock or playback_clock.get_clock()
         self.player_thread = None
         self.playback_start_time = None
         self.playback_duration = video_length
         self.segment_duration = segment_duration
         # Timers to keep track of playback time and the actual time
-        self.playback_timer = StopWatch()
+        self.playback_timer = StopWatch(self.clock)
         self.actual_start_time = None
         # Playback State
         self.playback_state = "INITIALIZED"
         self.playback_state_lock = threading.Lock()
+        # Wakes the player thread on buffer and state changes (write, jump, stop)
+        self.player_event = threading.Condition()
+        self.player_event_count = 0
         # Buffer size
         if config_dash.MAX_BUFFER_SIZE:
             self.max_buffer_size = config_dash.MAX_BUFFER_SIZE
@@ -49,6 +64,9 @@ class DashPlayer:
         self.buffer_lock = threading.Lock()
         self.current_segment = None
         self.buffer_log_file = config_dash.BUFFER_LOG_FILENAME +"_"+connectionType+".csv"
+        self.buffer_log = BufferedCsvWriter(self.buffer_log_file, BUFFER_LOG_HEADER,
+                                            flush_rows=config_dash.BUFFER_LOG_FLUSH_ROWS,
+                                            flush_interval=config_dash.BUFFER_LOG_FLUSH_INTERVAL)
         config_dash.LOG.info("VideoLength={},segmentDuration={},MaxBufferSize={},InitialBuffer(secs)={},"
                              "BufferAlph(secs)={},BufferBeta(secs)={}".format(self.playback_duration,
                                                                               self.segment_duration,
@@ -64,28 +82,89 @@ class DashPlayer:
                                                                                             self.playback_timer.time()))
             self.playback_state = state
             self.playback_state_lock.release()
+            self.notify_player()
         else:
             config_dash.LOG.error("Unidentified state: {}".format(state))
 
+    def notify_player(self):
+        """ Wake the player thread to re-evaluate the buffer and the playback state"""
+        self.player_event.acquire()
+        self.player_event_count += 1
+        self.player_event.notify_all()
+        self.player_event.release()
+
+    def wait_for_event(self, seen_count, timeout=None):
+        """ Sleep until notify_player is called or the timeout (in seconds of the clock) expires.
+            seen_count is the player_event_count read before the caller checked its condition,
+            so a notification that arrived in between is not lost.
+        """
+        self.player_event.acquire()
+        if self.player_event_count == seen_count:
+            self.clock.wait(self.player_event, timeout)
+        self.player_event.release()
+
+    def buffer_level(self):
+        """ :return: Seconds of video waiting in the buffer. The segment being played is not counted """
+        return self.buffer.qsize() * self.segment_duration
+
+    def wait_until(self, condition, timeout=None):
+        """ Sleep until condition() is true or the timeout (in seconds of the clock) expires.
+            condition is checked again every time notify_player is called
+        :return: True if condition() is true
+        """
+        deadline = self.clock.time() + timeout if timeout is not None else None
+        while True:
+            seen_count = self.player_event_count
+            if condition():
+                return True
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - self.clock.time()
+                if remaining <= 0:
+                    return False
+            self.wait_for_event(seen_count, remaining)
+
+    def wait_for_buffer_level(self, level, timeout=None):
+        """ Sleep until at most `level` seconds of video wait in the buffer, the playback is over
+            or the timeout (in seconds of the clock) expires.
+            The player notifies every segment it takes from the buffer, so the wait ends as soon as there is room
+        :return: True if the buffer level is at most level
+        """
+        self.wait_until(lambda: self.buffer_level() <= level or self.playback_state in EXIT_STATES, timeout)
+        return self.buffer_level() <= level
+
+    def wait_for_exit(self, timeout=None):
+        """ Sleep until the playback is over (EXIT_STATES) or the timeout (in seconds of the clock) expires
+        :return: True if the playback is over
+        """
+        if not self.wait_until(lambda: self.playback_state in EXIT_STATES, timeout):
+            return False
+        # At the END the player thread only writes the last row of the buffer log before it returns
+        if (self.playback_state == "END" and self.player_thread and
+                self.player_thread is not threading.current_thread()):
+            self.player_thread.join()
+        return True
+
     def initialize_player(self):
         """Method that update the current playback time"""
-        start_time = time.time()
+        start_time = self.clock.time()
         initial_wait = 0
         paused = False
         buffering = False
         interruption_start = None
         config_dash.LOG.info("Initialized player with video length {}".format(self.playback_duration))
         while True:
+            seen_count = self.player_event_count
             # Video stopped by the user
             if self.playback_state == "END":
                 config_dash.LOG.info("Finished playback of the video: {} seconds of video played for {} seconds".format(
-                    self.playback_duration, time.time() - start_time))
+                    self.playback_duration, self.clock.time() - start_time))
                 self.playback_timer.pause()
                 return "STOPPED"
 
             if self.playback_state == "STOP":
                 # If video is stopped quit updating the playback time and exit player
-                config_dash.LOG.info("Player Stopped at time {}".format(time.time() - start_time))
+                config_dash.LOG.info("Player Stopped at time {}".format(self.clock.time() - start_time))
                 self.playback_timer.pause()
                 self.log_entry("Stopped")
                 return "STOPPED"
@@ -98,6 +177,7 @@ class DashPlayer:
                         self.playback_timer.time()))
                     self.playback_timer.pause()
                     paused = True
+                self.wait_for_event(seen_count)
                 continue
 
             # If the playback encounters buffering during the playback
@@ -107,7 +187,7 @@ class DashPlayer:
                         self.playback_timer.time()))
                     self.playback_timer.pause()
                     buffering = True
-                    interruption_start = time.time()
+                    interruption_start = self.clock.time()
                     config_dash.JSON_HANDLE['playback_info']['interruptions']['count'] += 1
                 # If the size of the buffer is greater than the RE_BUFFERING_DURATION then start playback
                 else:
@@ -118,19 +198,26 @@ class DashPlayer:
                             and self.buffer.qsize() > 0)):
                         buffering = False
                         if interruption_start:
-                            interruption_end = time.time()
+                            interruption_end = self.clock.time()
                             interruption = interruption_end - interruption_start
                             config_dash.JSON_HANDLE['playback_info']['interruptions']['events'].append(
                                 (interruption_start, interruption_end))
                             config_dash.JSON_HANDLE['playback_info']['interruptions']['total_duration'] += interruption
+                            log_event('interruption', {'start': interruption_start, 'end': interruption_end,
+                                                       'duration': interruption,
+                                                       'playback_time': self.playback_timer.time()})
                             config_dash.LOG.info("Duration of interruption = {}".format(interruption))
                             interruption_start = None
                         self.set_state("PLAY")
                         self.log_entry("Buffering-Play")
+                    else:
+                        self.wait_for_event(seen_count)
+                        continue
 
             if self.playback_state == "INITIAL_BUFFERING":
                 if self.buffer.qsize() < config_dash.INITIAL_BUFFERING_COUNT:
-                    initial_wait = time.time() - start_time
+                    initial_wait = self.clock.time() - start_time
+                    self.wait_for_event(seen_count)
                     continue
                 else:
                     config_dash.LOG.info("Initial Waiting Time = {}".format(initial_wait))
@@ -139,9 +226,10 @@ class DashPlayer:
 
             if self.playback_state == "PLAY":
                     # Check of the buffer has any segments
-                    if self.playback_timer.time() == self.playback_duration:
+                    if self.playback_timer.time() >= self.playback_duration:
                         self.set_state("END")
                         self.log_entry("Play-End")
+                        continue
                     if self.buffer.qsize() == 0:
                         config_dash.LOG.info("Buffer empty after {} seconds of playback".format(
                             self.playback_timer.time()))
@@ -155,6 +243,8 @@ class DashPlayer:
                     play_segment = self.buffer.get()
                     #print play_segment
                     self.buffer_lock.release()
+                    # Wake the downloader waiting for room in the buffer
+                    self.notify_player()
                     config_dash.LOG.info("Reading the segment number {} from the buffer at playtime {}".format(
                         play_segment['segment_number'], self.playback_timer.time()))
                     self.log_entry(action="StillPlaying", bitrate=play_segment["bitrate"])
@@ -165,9 +255,10 @@ class DashPlayer:
                     # Start the playback
                     self.playback_timer.start()
                     while self.playback_timer.time() < future:
+                        seen_count = self.player_event_count
                         # If playback hasn't started yet, set the playback_start_time
                         if not self.playback_start_time:
-                            self.playback_start_time = time.time()
+                            self.playback_start_time = self.clock.time()
                             config_dash.LOG.info("Started playing with representation {} at {}".format(
                                 play_segment['bitrate'], self.playback_timer.time()))
 
@@ -179,6 +270,9 @@ class DashPlayer:
                             self.set_state("END")
                             self.log_entry("TheEnd")
                             return
+                        # Sleep until the segment (or the video) has been played out, or a jump moves the timer
+                        self.wait_for_event(seen_count, self.playback_timer.time_until(
+                            min(future, self.playback_duration)))
                     #  print "self.playback_timer.time():"+self.playback_timer.time()+ "future:"+ future
                     else:
                         self.buffer_length_lock.acquire()
@@ -194,13 +288,14 @@ class DashPlayer:
 
     def write(self, segment):
         """ write segment to the buffer.
-            Segment is dict with keys ['data', 'bitrate', 'playback_length', 'URI', 'size']
+            Segment is dict with keys ['data', 'bitrate', 'playback_length', 'URI', 'size'] and optionally
+            the 'timing' record of its download
         """
         # Acquire Lock on the buffer and add a segment to it
         if not self.actual_start_time:
-            self.actual_start_time = time.time()
+            self.actual_start_time = self.clock.time()
         config_dash.LOG.info("Writing segment {} at time {}".format(segment['segment_number'],
-                                                                    time.time() - self.actual_start_time))
+                                                                    self.clock.time() - self.actual_start_time))
         self.buffer_lock.acquire()
         self.buffer.put(segment)
         self.buffer_lock.release()
@@ -209,13 +304,15 @@ class DashPlayer:
         config_dash.LOG.debug("Incrementing buffer_length by {}. dash_buffer = {}".format(
             segment['playback_length'], self.buffer_length))
         self.buffer_length_lock.release()
-        self.log_entry(action="Writing", bitrate=segment['bitrate'])
+        self.log_entry(action="Writing", bitrate=segment['bitrate'], timing=segment.get('timing'))
+        self.notify_player()
     
     def jump(self, jump_at_second,jump_to_second,current_bitrate):
         """ write segment to the buffer.
-            Segment is dict with keys ['data', 'bitrate', 'playback_length', 'URI', 'size']
+            Segment is dict with keys ['data', 'bitrate', 'playback_length', 'URI', 'size'] and optionally
+            the 'timing' record of its download
         """
-        config_dash.LOG.info("Jumping at second {} to second {} @ EpochTime: {}".format(jump_at_second,jump_to_second,time.time() - self.actual_start_time))
+        config_dash.LOG.info("Jumping at second {} to second {} @ EpochTime: {}".format(jump_at_second,jump_to_second,self.clock.time() - self.actual_start_time))
         config_dash.LOG.debug("Clearing buffer at {}. dash_buffer = {}".format(str(jump_at_second),self.buffer_length))
         self.buffer_lock.acquire()
         #with self.buffer.mutex:
@@ -224,48 +321,54 @@ class DashPlayer:
         self.buffer_length_lock.acquire()
         self.buffer_length =0
         self.buffer_length_lock.release()
+        if jump_to_second > jump_at_second:
+            self.playback_timer.backwardStartTime(jump_to_second - jump_at_second)
+        else:
+            self.playback_timer.forwardStartTime(jump_at_second - jump_to_second)
         config_dash.LOG.debug("Cleared buffer at {}. dash_buffer = {}".format(str(jump_at_second),self.buffer_length))
         self.log_entry(action="Jump At " + str(jump_at_second) +"->"+str(jump_to_second),bitrate=current_bitrate )
+        self.notify_player()
 
     def start(self):
         """ Start playback"""
         self.set_state("INITIAL_BUFFERING")
         self.log_entry("Starting")
         config_dash.LOG.info("Starting the Player")
-        self.player_thread = threading.Thread(target=self.initialize_player)
+        self.player_thread = threading.Thread(target=self.run_player)
         self.player_thread.daemon = True
         self.player_thread.start()
         self.log_entry(action="Starting")
 
+    def run_player(self):
+        """ Player thread. Flushes the buffer log once the playback is over """
+        try:
+            self.initialize_player()
+        finally:
+            self.buffer_log.flush()
+
+    def close_log(self):
+        """ Write the remaining buffer log entries and close the log file """
+        self.buffer_log.close()
+
     def stop(self):
         """Method to stop the playback"""
         self.set_state("STOP")
         self.log_entry("Stopped")
         config_dash.LOG.info("Stopped the playback")
 
-    def log_entry(self, action, bitrate=0):
-        """Method to log the current state"""
+    def log_entry(self, action, bitrate=0, timing=None):
+        """Method to log the current state, and the download phases of the segment being written"""
 
         if self.buffer_log_file:
-            header_row = None
             if self.actual_start_time:
-                log_time = time.time() - self.actual_start_time
+                log_time = self.clock.time() - self.actual_start_time
             else:
                 log_time = 0
                 
             str_log_time_in_milis=int(round(log_time * 1000))#str(log_time).ljust(12, "0")
-            if not os.path.exists(self.buffer_log_file):
-                header_row = "EpochTime;CurrentPlaybackTime;CurrentBufferSize;CurrentPlaybackState;Action;Bitrate".split(";")
-                stats = (str_log_time_in_milis, str(self.playback_timer.time()), self.buffer.qsize(),
-                         self.playback_state, action,bitrate)
-            else:
-                stats = (str_log_time_in_milis, str(self.playback_timer.time()), self.buffer.qsize(),
-                         self.playback_state, action,bitrate)
+            stats = (str_log_time_in_milis, "{:.3f}".format(self.playback_timer.time()), self.buffer.qsize(),
+                     self.playback_state, action,bitrate)
             str_stats = [str(i) for i in stats]
-            with open(self.buffer_log_file, "ab") as log_file_handle:
-                result_writer = csv.writer(log_file_handle, delimiter=";")
-                if header_row:
-                    result_writer.writerow(header_row)
-                result_writer.writerow(str_stats)
+            self.buffer_log.writerow(str_stats + format_timing(timing))
             config_dash.LOG.info("BufferStats: EpochTime=%s,CurrentPlaybackTime=%s,CurrentBufferSize=%s,"
                                  "CurrentPlaybackState=%s,Action=%s,Bitrate=%s" % tuple(str_stats))
\ No newline at end of file
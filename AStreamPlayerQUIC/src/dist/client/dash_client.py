@@ -16,35 +16,33 @@ from __future__ import division
 from datetime import datetime
 
 from argparse import ArgumentParser
-from collections import defaultdict
 import errno
 import httplib
-from multiprocessing import Process, Queue
 import os
 import random
-import signal
 from string import ascii_letters, digits
 import sys
-import time
-import timeit
 import urllib2
 import urlparse
 import string
 import urllib2
-import fcntl
-import psutil
-from subprocess import *
 
-from adaptation import basic_dash, basic_dash2, weighted_dash, netflix_dash
-from adaptation.adaptation import WeightedMean
+from bitrate_selector import BitrateSelector
 import config_dash
-from configure_log_file import configure_log_file, write_json
+from configure_log_file import configure_log_file, write_json, log_event, close_event_log
 import dash_buffer
+import load_generator
+import playback_clock
 import read_mpd
+from helper_supervisor import HelperSupervisor
+from http_pool import HTTPConnectionPool
+from mirror import run_mirror
+from segment_cache import SegmentCache, get_cache_key
+from segment_prefetch import SegmentPrefetcher
+from segment_sink import FileSink, MeasureSink
 from oauthlib.uri_validate import segment
 from twisted.python.util import println
 from cherrypy import quickstart
-import subprocess
 from symbol import except_clause
 
 ''' try:
@@ -54,7 +52,15 @@ from symbol import except_clause
 '''
 # Constants
 DEFAULT_PLAYBACK = 'BASIC'
-DOWNLOAD_CHUNK = 1024
+DOWNLOAD_CHUNK = 256 * 1024
+# A read returns once the whole chunk has arrived: the downloads that report their progress read smaller chunks
+PROGRESS_CHUNK = 16 * 1024
+# Keep-alive connections for the URLLIB transport. Shared by all the runs in main()
+HTTP_POOL = HTTPConnectionPool()
+# Downloaded MPD files by URL
+MPD_FILES = dict()
+# Local segment cache (-cache). Shared by all the runs in main(), opened by the first one
+SEGMENT_CACHE = None
 
 # Globals for arg parser with the default values
 # Not sure if this is the correct way ....
@@ -70,7 +76,12 @@ CONNECTION_TYPE_STR = ""
 JUMP = False
 JUMP_SCENARIO = ""
 CMD = ""
-JUMP_BUFFER_COUNTER = 0
+PREFETCH_WINDOW = config_dash.PREFETCH_WINDOW
+SPEED = config_dash.PLAYBACK_SPEED
+CLIENTS = None
+RAMP = config_dash.LOAD_RAMP
+CACHE = False
+ABANDON = config_dash.ABANDON_SEGMENTS
 
 
 class DashPlayback:
@@ -85,10 +96,16 @@ class DashPlayback:
         self.playback_duration = None
         self.audio = dict()
         self.video = dict()
+        self.manifest = None
 
 
 def get_mpd(url):
-    """ Module to download the MPD from the URL and save it to file"""
+    """ Module to download the MPD from the URL and save it to file.
+        The MPD is downloaded once per process
+    """
+    if url in MPD_FILES and os.path.exists(MPD_FILES[url]):
+        config_dash.LOG.info("Using the downloaded MPD file {}".format(MPD_FILES[url]))
+        return MPD_FILES[url]
     try:
         connection = urllib2.urlopen(url, timeout=9999)
     except urllib2.HTTPError, error:
@@ -111,6 +128,7 @@ def get_mpd(url):
     mpd_file_handle.write(mpd_data)
     mpd_file_handle.close()
     config_dash.LOG.info("Downloaded the MPD file {}".format(mpd_file))
+    MPD_FILES[url] = mpd_file
     return mpd_file
 
 
@@ -137,34 +155,81 @@ def id_generator(id_size=6):
     return TEMP_STR + ''.join(random.choice(ascii_letters + digits) for _ in range(id_size))
 
 
-def download_segment(segment_url, dash_folder, sb):
+def get_segment_cache():
+    """ Module to get the local segment cache. None unless -cache """
+    global SEGMENT_CACHE
+    if not CACHE:
+        return None
+    if SEGMENT_CACHE is None:
+        SEGMENT_CACHE = SegmentCache(config_dash.SEGMENT_CACHE_FOLDER, config_dash.SEGMENT_CACHE_SIZE)
+    return SEGMENT_CACHE
+
+
+def download_segment(segment_url, dash_folder, sb, download=False, cache_key=None, progress=None):
+    """ Download one segment with the selected transport.
+        If download is False the segment data is only measured and never written to disk.
+        With a cache_key the complete segment is also added to the local segment cache (the helpers only
+        write the segment with download).
+        progress is called with the downloaded bytes after every chunk (URLLIB only: the helpers report the
+        completed downloads). When it returns True the download is abandoned and (None, None, timing) returned
+        :return: (segment_size, data, timing) where data is the segment file name, or the digest of the
+                 data (or None) when the segment is only measured. timing is the timing record of the
+                 request (helper_protocol.parse_timing). For URLLIB it also has the 'write' seconds spent
+                 creating, writing (or hashing) and closing the segment file. The URLLIB phases are timed with
+                 the playback clock, like the download time of the segment
+    """
      # URLLIB
     if (not CURL and not QUIC):  # URLLIB
         """ HTTP Module to download the segment """
         try:
          #   print segment_url
-            connection = urllib2.urlopen(segment_url, timeout=None)
+            connection = HTTP_POOL.urlopen(segment_url)
           
         except urllib2.HTTPError, error:
             config_dash.LOG.error("Unable to download DASH Segment {} HTTP Error:{} ".format(segment_url, str(error.code)))
-            return None
+            return None, None, None
         parsed_uri = urlparse.urlparse(segment_url)
         segment_path = '{uri.path}'.format(uri=parsed_uri)
         while segment_path.startswith('/'):
             segment_path = segment_path[1:]        
         segment_filename = os.path.join(dash_folder, os.path.basename(segment_path))
-        make_sure_path_exists(os.path.dirname(segment_filename))
-        segment_file_handle = open(segment_filename, 'wb')
-        segment_size = 0
+        clock = playback_clock.get_clock()
+        write_start = clock.time()
+        if download:
+            make_sure_path_exists(os.path.dirname(segment_filename))
+            segment_sink = FileSink(segment_filename)
+        else:
+            segment_sink = MeasureSink(config_dash.SEGMENT_HASH)
+        cache_writer = SEGMENT_CACHE.writer(cache_key) if cache_key and SEGMENT_CACHE else None
+        write_time = clock.time() - write_start
+        chunk_size = PROGRESS_CHUNK if progress else DOWNLOAD_CHUNK
         while True:
-            segment_data = connection.read(DOWNLOAD_CHUNK)
-            segment_size += len(segment_data)
-            segment_file_handle.write(segment_data)
-            if len(segment_data) < DOWNLOAD_CHUNK:
+            segment_data = connection.read(chunk_size)
+            if not segment_data:
                 break
+            write_start = clock.time()
+            segment_sink.write(segment_data)
+            if cache_writer:
+                cache_writer.write(segment_data)
+            write_time += clock.time() - write_start
+            if progress and progress(segment_sink.size):
+                # The rest of the body is not read: the connection is closed instead of going back to the pool
+                connection.close()
+                segment_sink.close()
+                if download:
+                    os.remove(segment_filename)
+                if cache_writer:
+                    cache_writer.discard()
+                config_dash.LOG.info("Abandoned {} after {} bytes".format(segment_url, segment_sink.size))
+                return None, None, connection.timing()
         connection.close()
-        segment_file_handle.close()
-        return segment_size, segment_filename
+        write_start = clock.time()
+        segment_data = segment_sink.close()
+        if cache_writer:
+            cache_writer.commit()
+        timing = connection.timing()
+        timing['write'] = write_time + clock.time() - write_start
+        return segment_sink.size, segment_data, timing
 
     if (CURL or QUIC):  # CURL or QUIC client
         """ CURL or QUIC client Module to download the segment """
@@ -180,43 +245,14 @@ def download_segment(segment_url, dash_folder, sb):
             requested_url = string.replace(segment_url, 'https://' + HOST, config_dash.QUIC_FILES_HEADER_XORIGINAL_URL_DOMAIN)
         
         print "Write requested_url to subprocess stdin: ", requested_url
-        print sb.stdin.write(requested_url + '\n')
-        while True:
-            out = non_block_read(sb.stdout)  # will return '' instead of hanging for ever
-            if "FATAL" in out or "Failed to connect" in out or "ERROR" in out:    
-                segment_size = "-1" 
-                print "calculated segment size:", int(segment_size)
-                int_segment_size = int(segment_size)
-                check_kill_process("quic_client")
-                break
-            if "file_size_start:" in out:
-                start_index = out.find("file_size_start:") + len("file_size_start:")
-                end_index = out.find(":file_size_end")    
-                segment_size = out[start_index:end_index]
-                print "calculated segment size:", int(segment_size)
-                int_segment_size = int(segment_size)
-                if int_segment_size == -1:
-                    check_kill_process("LibCurlCppConsole")
-                break
-        return int_segment_size, segment_filename
-
-
-def get_media_all(domain, media_info, file_identifier, done_queue):
-    """ Download the media from the list of URL's in media
-    """
-    bandwidth, media_dict = media_info
-    media = media_dict[bandwidth]
-    media_start_time = timeit.default_timer()
-    for segment in [media.initialization] + media.url_list:
-        start_time = timeit.default_timer()
-        segment_url = urlparse.urljoin(domain, segment)
-        _, segment_file = download_segment(segment_url, file_identifier)
-        elapsed = timeit.default_timer() - start_time
-        if segment_file:
-            done_queue.put((bandwidth, segment_url, elapsed))
-    media_download_time = timeit.default_timer() - media_start_time
-    done_queue.put((bandwidth, 'STOP', media_download_time))
-    return None
+        int_segment_size, timing = sb.request(requested_url)
+        print "calculated segment size:", int_segment_size
+        # Without DOWNLOAD the helpers are started without a folder and do not write the segment
+        if not download:
+            segment_filename = None
+        elif cache_key and SEGMENT_CACHE and int_segment_size > 0:
+            SEGMENT_CACHE.put_file(cache_key, segment_filename)
+        return int_segment_size, segment_filename, timing
 
 
 def make_sure_path_exists(path):
@@ -236,7 +272,7 @@ def print_representations(dp_object):
         print bandwidth
 
 
-def start_playback_smart(dp_object, domain, playback_type=None, download=False, video_segment_duration=None, connection_type="", JUMP_SCENARIO=""):
+def start_playback_smart(dp_object, domain, playback_type=None, download=False, video_segment_duration=None, connection_type="", JUMP_SCENARIO="", prefetch_window=1):
     """ Module that downloads the MPD-FIle and download
         all the representations of the Module to download
         the MPEG-DASH media.
@@ -249,75 +285,55 @@ def start_playback_smart(dp_object, domain, playback_type=None, download=False,
                                 2. 'SARA' - Segment Aware Rate Adaptation
                                 3. 'NETFLIX' - Buffer based adaptation used by Netflix
         :param download: Set to True if the segments are to be stored locally (Boolean). Default False
+                         (the segments are only measured)
         :param video_segment_duration: Playback duratoin of each segment
+        :param prefetch_window: Number of segment requests kept in flight. The segments are still
+                                handed to the player in order
         :return:
     """
     
+    log_event('session', {'connection_type': connection_type, 'playback_type': playback_type})
+    # All the timing of the session reads the playback clock (-speed)
+    clock = playback_clock.get_clock()
     # Initialize the DASH buffer
-    dash_player = dash_buffer.DashPlayer(dp_object.playback_duration, video_segment_duration, connection_type)
+    dash_player = dash_buffer.DashPlayer(dp_object.playback_duration, video_segment_duration, connection_type, clock)
     dash_player.start()
     # A folder to save the segments in
     file_identifier = 'URLLIB_'   #id_generator()
     config_dash.LOG.info("The segments are stored in %s" % file_identifier)
-    dp_list = defaultdict(defaultdict)
-    # Creating a Dictionary of all that has the URLs for each segment and different bitrates
-    for bitrate in dp_object.video:
-        # Getting the URL list for each bitrate
-        dp_object.video[bitrate] = read_mpd.get_url_list(dp_object.video[bitrate], video_segment_duration,
-                                                         dp_object.playback_duration, bitrate)
-        if "$Bandwidth$" in dp_object.video[bitrate].initialization:
-            dp_object.video[bitrate].initialization = dp_object.video[bitrate].initialization.replace(
-                "$Bandwidth$", str(bitrate))
-        media_urls = [dp_object.video[bitrate].initialization] + dp_object.video[bitrate].url_list
-        for segment_count, segment_url in enumerate(media_urls, dp_object.video[bitrate].start):
-            # segment_duration = dp_object.video[bitrate].segment_duration
-            dp_list[segment_count][bitrate] = segment_url
-         #   print segment_count,bitrate,segment_url
-    bitrates = dp_object.video.keys()
-    bitrates.sort()
-    average_dwn_time = 0
+    # Segment URLs and sizes are generated from the compiled MPD when they are needed
+    manifest = dp_object.manifest
+    # Rate adaptation state of the session
+    selector = BitrateSelector(playback_type, dp_object)
     segment_files = []
-    # For basic adaptation
-    previous_segment_times = []
-    recent_download_sizes = []
-    weighted_mean_object = None
-    current_bitrate = bitrates[0]
+    current_bitrate = selector.current_bitrate
     previous_bitrate = None
     total_downloaded = 0
     # Delay in terms of the number of segments
     delay = 0
     segment_duration = 0
-    segment_size = segment_download_time = None
-    # Netflix Variables
-    average_segment_sizes = netflix_rate_map = None
-    netflix_state = "INITIAL"
     sb = None
-    global JUMP_BUFFER_COUNTER
-    JUMP_BUFFER_COUNTER=0
+    # Segments downloaded by earlier requests (-cache), eg: before a jump back or in an earlier run
+    segment_cache = get_segment_cache()
     # Start playback of all the segments
     
-    """  
-     for segment1 in dp_list.keys():
-        for bitrate1 in dp_list[segment1]:
-            print segment1, bitrate1, dp_list[segment1][bitrate1]    
-    """
-    
     if (CURL or QUIC):  # CURL or QUIC client
         """ CURL or QUIC client Module to download the segment """
                
         if CURL:
             CMD = config_dash.CURL_CLIENT_CMD
+            if download:
+                CMD += config_dash.CURL_CLIENT_FOLDER_OPTION
             print CMD
         if QUIC:
             CMD = config_dash.QUIC_CLIENT_CMD
+            if download:
+                CMD += config_dash.QUIC_CLIENT_FOLDER_OPTION
             print CMD
                
-        sb = Popen(CMD, shell=True, stdout=PIPE, stdin=PIPE, stderr=STDOUT)
-        while True:
-            out = non_block_read(sb.stdout)  # will return '' instead of hanging for ever
-            if "started" in out:
-                print out
-                break
+        # The active helper and its warm standby. Only the helpers of this session are ever killed
+        sb = HelperSupervisor(CMD)
+        sb.start()
     
     max_jump_count = 0
     current_jump_index = 0
@@ -326,138 +342,156 @@ def start_playback_smart(dp_object, domain, playback_type=None, download=False,
         JUMP_SCENARIO_ARR = JUMP_SCENARIO.split(',')
         max_jump_count = len(JUMP_SCENARIO_ARR)
      
-    total_segment_count = len(dp_list)
+    total_segment_count = manifest.segment_count
     segment_number = 1
-    
-    while segment_number <= total_segment_count:
-        config_dash.LOG.info("*************** segment_number:" + str(segment_number) + "*********************")
-        config_dash.LOG.info(" {}: Processing the segment {}".format(playback_type.upper(), segment_number))
-        write_json()
-        if not previous_bitrate:
-            previous_bitrate = current_bitrate
-        if SEGMENT_LIMIT:
-            if not dash_player.segment_limit:
-                dash_player.segment_limit = int(SEGMENT_LIMIT)
-            if segment_number > int(SEGMENT_LIMIT):
-                config_dash.LOG.info("Segment limit reached")
-                break
-        if segment_number == dp_object.video[bitrate].start:
-            current_bitrate = bitrates[0]
-        else:
-            if playback_type.upper() == "BASIC":
-                current_bitrate, average_dwn_time = basic_dash2.basic_dash2(segment_number, bitrates, average_dwn_time,
-                                                                            recent_download_sizes,
-                                                                            previous_segment_times, current_bitrate)
-
-                if dash_player.buffer.qsize() > config_dash.BASIC_THRESHOLD:
-                    delay = dash_player.buffer.qsize() - config_dash.BASIC_THRESHOLD
-                config_dash.LOG.info("Basic-DASH: Selected {} for the segment {}".format(current_bitrate,
-                                                                                         segment_number + 1))
-            elif playback_type.upper() == "SMART":
-                if not weighted_mean_object:
-                    weighted_mean_object = WeightedMean(config_dash.SARA_SAMPLE_COUNT)
-                    config_dash.LOG.debug("Initializing the weighted Mean object")
-                # Checking the segment number is in acceptable range
-                if segment_number < len(dp_list) - 1 + dp_object.video[bitrate].start:
-                    try:
-                        config_dash.LOG.info("JUMP_BUFFER_COUNTER: %s",str(JUMP_BUFFER_COUNTER))
-                        current_bitrate, delay,JUMP_BUFFER_COUNTER = weighted_dash.weighted_dash(bitrates, dash_player,
-                                                                             weighted_mean_object.weighted_mean_rate,
-                                                                             current_bitrate,
-                                                                             get_segment_sizes(dp_object,
-                                                                                               segment_number + 1),JUMP_BUFFER_COUNTER)
-                    except IndexError, e:
-                        config_dash.LOG.error(e)
-
-            elif playback_type.upper() == "NETFLIX":
-                config_dash.LOG.info("Playback is NETFLIX")
-                # Calculate the average segment sizes for each bitrate
-                if not average_segment_sizes:
-                    average_segment_sizes = get_average_segment_sizes(dp_object)
-                if segment_number < len(dp_list) - 1 + dp_object.video[bitrate].start:
-                    try:
-                        if segment_size and segment_download_time:
-                            segment_download_rate = segment_size / segment_download_time
-                        else:
-                            segment_download_rate = 0
-                        config_dash.LOG.info("JUMP_BUFFER_COUNTER: %s",str(JUMP_BUFFER_COUNTER))
-                        current_bitrate, netflix_rate_map, netflix_state,JUMP_BUFFER_COUNTER = netflix_dash.netflix_dash(
-                            bitrates, dash_player, segment_download_rate, current_bitrate, average_segment_sizes,
-                            netflix_rate_map, netflix_state,JUMP_BUFFER_COUNTER)
-                        config_dash.LOG.info("NETFLIX: Next bitrate = {}".format(current_bitrate))
-                    except IndexError, e:
-                        config_dash.LOG.error(e)
-                else:
-                    config_dash.LOG.critical("Completed segment playback for Netflix")
-                    break
-
-                # If the buffer is full wait till it gets empty
-                if dash_player.buffer.qsize() >= config_dash.NETFLIX_BUFFER_SIZE:
-                    delay = (dash_player.buffer.qsize() - config_dash.NETFLIX_BUFFER_SIZE + 1) * segment_duration
-                    config_dash.LOG.info("NETFLIX: delay = {} seconds".format(delay))
+    requests_done = False
+    if (CURL or QUIC) and prefetch_window > 1 and not sb.tagged:
+        # Helpers without tagged requests take one URL at a time on stdin
+        config_dash.LOG.warning("The {} helper handles one request at a time. Setting the prefetch window to 1".format(
+            "QUIC" if QUIC else "CURL"))
+        prefetch_window = 1
+    if segment_cache and (CURL or QUIC) and not download:
+        config_dash.LOG.warning("The helpers only write the segments with -d: the segment cache is not filled")
+
+    def report_progress(request, downloaded_size, elapsed_time, requests_ahead):
+        """ Sample the rate of a download in flight, and abandon it if it would stall the playback """
+        selector.progress(request.segment_number, downloaded_size, elapsed_time)
+        if dash_player.playback_state != "PLAY":
+            return False
+        # The segments requested before this one play before it is needed
+        buffer_left = dash_player.buffer_level() + requests_ahead * dash_player.segment_duration
+        request.lower_bitrate = selector.abandon_bitrate(request.segment_number, request.bitrate, downloaded_size,
+                                                         elapsed_time, buffer_left)
+        return request.lower_bitrate is not None
+
+    # Without -abandon the downloads do not report their progress
+    prefetcher = SegmentPrefetcher(download_segment, prefetch_window, clock, report_progress if ABANDON else None)
+
+    while (segment_number <= total_segment_count and not requests_done) or prefetcher.in_flight():
+        # Keep up to prefetch_window segment requests in flight. The rate adaptation needs
+        # the measurement of at least one downloaded segment before choosing a bitrate, unless nothing is
+        # downloading (eg: the segments so far came from the segment cache)
+        if segment_number <= total_segment_count and not requests_done and not prefetcher.is_full() and (
+                segment_number == manifest.start or selector.segment_size is not None or
+                not prefetcher.in_flight()):
+            config_dash.LOG.info("*************** segment_number:" + str(segment_number) + "*********************")
+            config_dash.LOG.info(" {}: Processing the segment {}".format(playback_type.upper(), segment_number))
+            if not previous_bitrate:
+                previous_bitrate = current_bitrate
+            if SEGMENT_LIMIT:
+                if not dash_player.segment_limit:
+                    dash_player.segment_limit = int(SEGMENT_LIMIT)
+                if segment_number > int(SEGMENT_LIMIT):
+                    config_dash.LOG.info("Segment limit reached")
+                    requests_done = True
+                    continue
+            current_bitrate, delay, requests_done = selector.select(segment_number, dash_player, segment_duration)
+            if requests_done:
+                continue
+            segment_path = manifest.segment_url(segment_number, current_bitrate)
+            segment_url = urlparse.urljoin(domain, segment_path)
+            config_dash.LOG.info("{}: Segment URL = {}".format(playback_type.upper(), segment_url))
+            if delay:
+                # Request the segment as soon as the buffer has drained by delay segments
+                delay_start = clock.time()
+                buffer_level = max(dash_player.buffer.qsize() - delay, 0) * dash_player.segment_duration
+                config_dash.LOG.info("WAITING for the buffer level {} seconds".format(buffer_level))
+                dash_player.wait_for_buffer_level(buffer_level)
+                delay = 0
+                config_dash.LOG.debug("WAITED for {} seconds".format(clock.time() - delay_start))
+            cache_key = None
+            if segment_cache:
+                cache_key = get_cache_key(manifest.mpd_hash, current_bitrate, segment_number)
+            cached_segment = segment_cache.get(cache_key) if cache_key else None
+            if cached_segment:
+                config_dash.LOG.info("{}: Segment {} at {} is in the segment cache".format(
+                    playback_type.upper(), segment_number, current_bitrate))
+                prefetcher.complete(segment_number, current_bitrate, segment_url, cached_segment[1],
+                                    cached_segment[0])
             else:
-                config_dash.LOG.error("Unknown playback type:{}. Continuing with basic playback".format(playback_type))
-                current_bitrate, average_dwn_time = basic_dash.basic_dash(segment_number, bitrates, average_dwn_time,
-                                                                          segment_download_time, current_bitrate)
-        segment_path = dp_list[segment_number][current_bitrate]
-        segment_url = urlparse.urljoin(domain, segment_path)
-        config_dash.LOG.info("{}: Segment URL = {}".format(playback_type.upper(), segment_url))
-        if delay:
-            delay_start = time.time()
-            config_dash.LOG.info("SLEEPING for {}seconds ".format(delay * segment_duration))
-            while time.time() - delay_start < (delay * segment_duration):
-                time.sleep(1)
-            delay = 0
-            config_dash.LOG.debug("SLEPT for {}seconds ".format(time.time() - delay_start))
-        start_time = timeit.default_timer()
+                prefetcher.submit(segment_number, current_bitrate, segment_url, segment_url, file_identifier, sb,
+                                  download, cache_key)
+            segment_number += 1
+            if segment_number <= total_segment_count and not prefetcher.is_full():
+                continue
+        # Hand the oldest request to the player
         try:
-            while True:
-                # print "CALLING download_segment"
-                segment_size, segment_filename = download_segment(segment_url, file_identifier, sb)
-                if segment_size > -1:  # SUCCESS DOWNLOAD
-                    config_dash.LOG.info("{}: Downloaded segment {}".format(playback_type.upper(), segment_url))
-                    break
-                else:  # FAIL DOWNLOAD
-                    config_dash.LOG.error("Unable to download segment %s" % segment_url)
-                    config_dash.LOG.info("TRYING to GET NEW SUBRPOCESS, SLEEPING for 0.5 SECOND")
-                    sb = get_sub_process(CMD)
-                    config_dash.LOG.info("GOT NEW SUBRPOCESS")
+            request = prefetcher.next_completed()
+            while request.segment_size is None or request.segment_size <= -1:  # FAIL DOWNLOAD
+                if request.abandoned and request.lower_bitrate:
+                    # Too slow for the buffer: the partial download is a throughput sample
+                    config_dash.LOG.info("Abandoned segment {} at {} after {} bytes. Requesting it at {}".format(
+                        request.segment_number, request.bitrate, request.downloaded_size, request.lower_bitrate))
+                    log_event('abandon', {'segment_number': request.segment_number, 'bitrate': request.bitrate,
+                                          'to_bitrate': request.lower_bitrate, 'size': request.downloaded_size,
+                                          'download_time': request.progress_time})
+                    selector.abandon(request.segment_number, request.lower_bitrate, request.downloaded_size,
+                                     request.progress_time)
+                    segment_url = urlparse.urljoin(domain, manifest.segment_url(request.segment_number,
+                                                                                request.lower_bitrate))
+                    cache_key = None
+                    if segment_cache:
+                        cache_key = get_cache_key(manifest.mpd_hash, request.lower_bitrate, request.segment_number)
+                    prefetcher.switch(request, request.lower_bitrate, segment_url, segment_url, file_identifier, sb,
+                                      download, cache_key)
+                else:
+                    config_dash.LOG.error("Unable to download segment %s" % request.segment_url)
+                    # A helper that stopped answering has been replaced: the retry goes to the standby
+                    prefetcher.retry(request, *request.fetch_args)
+                request = prefetcher.next_completed()
         except IOError, e:
             config_dash.LOG.error("Unable to save segment %s" % e)
             return None
-        segment_download_time = timeit.default_timer() - start_time
-        previous_segment_times.append(segment_download_time)
-        recent_download_sizes.append(segment_size)
-        # Updating the JSON information
+        segment_size = request.segment_size
+        segment_filename = request.segment_filename
+        segment_url = request.segment_url
+        segment_download_time = request.download_time
         segment_name = os.path.split(segment_url)[1]
-        if "segment_info" not in config_dash.JSON_HANDLE:
-            config_dash.JSON_HANDLE["segment_info"] = list()
-        config_dash.JSON_HANDLE["segment_info"].append((segment_name, current_bitrate, segment_size,
-                                                        segment_download_time))
-        total_downloaded += segment_size
-        config_dash.LOG.info("{} : The total downloaded = {}, segment_size = {}, segment_number = {}".format(
-            playback_type.upper(),
-            total_downloaded, segment_size, segment_number))
-        if playback_type.upper() == "SMART" and weighted_mean_object:
-            weighted_mean_object.update_weighted_mean(segment_size, segment_download_time)
+        if request.cached:
+            # Served locally: kept out of the throughput estimate and of the downloaded segments
+            if "cache_hits" not in config_dash.JSON_HANDLE:
+                config_dash.JSON_HANDLE["cache_hits"] = list()
+            config_dash.JSON_HANDLE["cache_hits"].append((segment_name, request.bitrate, segment_size))
+            log_event('cache_hit', {'segment_name': segment_name, 'segment_number': request.segment_number,
+                                    'bitrate': request.bitrate, 'size': segment_size})
+        else:
+            config_dash.LOG.info("{}: Downloaded segment {}".format(playback_type.upper(), segment_url))
+            selector.update(segment_size, segment_download_time, request.segment_number)
+            # Updating the JSON information. The timing has the download phases of the segment
+            if "segment_info" not in config_dash.JSON_HANDLE:
+                config_dash.JSON_HANDLE["segment_info"] = list()
+            config_dash.JSON_HANDLE["segment_info"].append((segment_name, request.bitrate, segment_size,
+                                                            segment_download_time, request.timing))
+            log_event('segment', {'segment_name': segment_name, 'segment_number': request.segment_number,
+                                  'bitrate': request.bitrate, 'size': segment_size,
+                                  'download_time': segment_download_time, 'timing': request.timing})
+            total_downloaded += segment_size
+            config_dash.LOG.info("{} : The total downloaded = {}, segment_size = {}, segment_number = {}".format(
+                playback_type.upper(),
+                total_downloaded, segment_size, request.segment_number))
 
         segment_info = {'playback_length': video_segment_duration,
                         'size': segment_size,
-                        'bitrate': current_bitrate,
+                        'bitrate': request.bitrate,
                         'data': segment_filename,
                         'URI': segment_url,
-                        'segment_number': segment_number}
+                        'segment_number': request.segment_number,
+                        'timing': request.timing}
         segment_duration = segment_info['playback_length']
         dash_player.write(segment_info)
         segment_files.append(segment_filename)
         config_dash.LOG.info("Downloaded %s. Size = %s in %s seconds" % (
             segment_url, segment_size, str(segment_download_time)))
         if previous_bitrate:
-            if previous_bitrate < current_bitrate:
+            if previous_bitrate < request.bitrate:
                 config_dash.JSON_HANDLE['playback_info']['up_shifts'] += 1
-            elif previous_bitrate > current_bitrate:
+                log_event('shift', {'direction': 'up', 'from_bitrate': previous_bitrate,
+                                    'to_bitrate': request.bitrate, 'segment_number': request.segment_number})
+            elif previous_bitrate > request.bitrate:
                 config_dash.JSON_HANDLE['playback_info']['down_shifts'] += 1
-            previous_bitrate = current_bitrate
+                log_event('shift', {'direction': 'down', 'from_bitrate': previous_bitrate,
+                                    'to_bitrate': request.bitrate, 'segment_number': request.segment_number})
+            previous_bitrate = request.bitrate
         
         if JUMP and  current_jump_index < int(max_jump_count) :
             current_jump_scenario = JUMP_SCENARIO_ARR[current_jump_index]
@@ -467,115 +501,36 @@ def start_playback_smart(dp_object, domain, playback_type=None, download=False,
                           
             if dash_player.playback_timer.time() >= float(jump_at_second):
                 current_jump_index = current_jump_index + 1
-                segment_number = int(jump_to_second / segment_duration) - 1
-                JUMP_BUFFER_COUNTER = config_dash.JUMP_BUFFER_COUNTER_CONSTANT
-                dash_player.jump(jump_at_second, jump_to_second, current_bitrate)
-                if(jump_to_second > jump_at_second):
-                    dash_player.playback_timer.backwardStartTime(jump_to_second - jump_at_second)
-                else:
-                    dash_player.playback_timer.forwardStartTime(jump_at_second - jump_to_second)
+                segment_number = int(jump_to_second / segment_duration)
+                # Requests still in flight are for the old playback position
+                discarded = prefetcher.discard()
+                if discarded:
+                    config_dash.LOG.info("Discarded {} prefetched segments".format(discarded))
+                selector.jump()
+                dash_player.jump(jump_at_second, jump_to_second, request.bitrate)
                     
-                config_dash.LOG.info("Jumped to segment: %s", segment_number + 1)
-                
-        segment_number = segment_number + 1
+                config_dash.LOG.info("Jumped to segment: %s", segment_number)
             
     # waiting for the player to finish playing
-    while dash_player.playback_state not in dash_buffer.EXIT_STATES:
-        time.sleep(1)
+    dash_player.wait_for_exit()
+    dash_player.close_log()
+    if segment_cache:
+        config_dash.JSON_HANDLE['segment_cache'] = segment_cache.get_stats()
+        config_dash.LOG.info("Segment cache: {hits} hits, {misses} misses, {evictions} evictions, "
+                             "{segments} segments, {bytes} bytes".format(**segment_cache.get_stats()))
     write_json()
     if not download:
         clean_files(file_identifier)
     
     if (CURL or QUIC):
         print "Exiting From Client Library"
-        print sb.stdin.write("exit" + '\n')
+        # The helpers that do not exit are killed
+        sb.close()
         print "Exit Command Send To Client Library"
 
-        if QUIC:
-            try:
-                print "Killing Process quic_client"
-                check_kill_process("quic_client")
-                print "Killed Process quic_client"
-            except:
-                None
-        if CURL: 
-            try:
-                print "Killing Process LibCurlCppConsole"
-                check_kill_process("LibCurlCppConsole")
-                print "Killed Process LibCurlCppConsole"
-            except:
-                None
-            
     return dash_player.playback_timer.time(), total_downloaded
 
 
-def get_sub_process(command):
-    
-    if CURL:
-        config_dash.LOG.info("get_sub_process for CURL")
-        sb = Popen(command, shell=True, stdout=PIPE, stdin=PIPE, stderr=STDOUT)
-        time.sleep(0.5)  #wait for initialization of subprocess
-        config_dash.LOG.info("got_sub_process for CURL")
-        while True:
-            out = non_block_read(sb.stdout)  # will return '' instead of hanging for ever
-            print "non_block_read result:",out
-            if "started" in out:
-                break
-        return sb
-    elif QUIC:
-        sleeped = False
-        while True:
-            if not sleeped:
-                # libcurl's timeout is set to 5 seconds
-                # Because of this quic_client must also sleep 5 seconds only once when a connection loss is detected.
-                # Assumption: The maximum segment download time is less than 5 seconds for libcurl
-                # If it's longer, quic_timeout_seconds and libcurl timeout must be  set to higher but same values
-                quic_timeout_seconds=5;
-                config_dash.LOG.info("get_sub_process for QUIC SLEEPING for "+str(quic_timeout_seconds)+" secs")
-                time.sleep(quic_timeout_seconds)
-                sleeped = True
-            config_dash.LOG.info("get_sub_process for QUIC")
-            sb = Popen(command, shell=True, stdout=PIPE, stdin=PIPE, stderr=STDOUT)
-            time.sleep(0.5)  #wait for initialization of subprocess
-            config_dash.LOG.info("got_sub_process for QUIC")
-            out = non_block_read(sb.stdout)  # will return '' instead of hanging for ever
-            print "non_block_read result:",out
-            if "started" in out:
-                break
-            check_kill_process("quic_client")
-        return sb
-    
-    
-def get_segment_sizes(dp_object, segment_number):
-    """ Module to get the segment sizes for the segment_number
-    :param dp_object:
-    :param segment_number:
-    :return:
-    """
-    segment_sizes = dict([(bitrate, dp_object.video[bitrate].segment_sizes[segment_number]) for bitrate in dp_object.video])
-    config_dash.LOG.debug("The segment sizes of {} are {}".format(segment_number, segment_sizes))
-    return segment_sizes
-
-
-def get_average_segment_sizes(dp_object):
-    """
-    Module to get the avearge segment sizes for each bitrate
-    :param dp_object:
-    :return: A dictionary of aveage segment sizes for each bitrate
-    """
-    average_segment_sizes = dict()
-    for bitrate in dp_object.video:
-        segment_sizes = dp_object.video[bitrate].segment_sizes
-        segment_sizes = [float(i) for i in segment_sizes]
-        # average_segment_sizes[bitrate] = sum(segment_sizes) / len(segment_sizes)
-        try:
-            average_segment_sizes[bitrate] = sum(segment_sizes) / len(segment_sizes)
-        except ZeroDivisionError:
-            average_segment_sizes[bitrate] = 0
-    config_dash.LOG.info("The avearge segment size for is {}".format(average_segment_sizes.items()))
-    return average_segment_sizes
-
-
 def clean_files(folder_path):
     """
     :param folder_path: Local Folder to be deleted
@@ -593,36 +548,15 @@ def clean_files(folder_path):
 
 
 def start_playback_all(dp_object, domain):
-    """ Module that downloads the MPD-FIle and download all the representations of 
-        the Module to download the MPEG-DASH media.
+    """ Module that mirrors all the representations of the MPD: the MPD and the initialization and media segments
+        of every bitrate, downloaded by a bounded pool of workers (mirror.py).
+        With DOWNLOAD the files are saved in config_dash.MIRROR_FOLDER, resuming the files of a previous run.
+        Otherwise they are only measured
+        :return: the statistics of the mirror, with the aggregate throughput
     """
-    # audio_done_queue = Queue()
-    video_done_queue = Queue()
-    processes = []
-    file_identifier = id_generator(6)
-    config_dash.LOG.info("File Segments are in %s" % file_identifier)
-
-    for bitrate in dp_object.video:
-        dp_object.video[bitrate] = read_mpd.get_url_list(bitrate, dp_object.video[bitrate],
-                                                         dp_object.playback_duration,
-                                                         dp_object.video[bitrate].segment_duration)
-        # Same as download audio
-        process = Process(target=get_media_all, args=(domain, (bitrate, dp_object.video),
-                                                      file_identifier, video_done_queue))
-        process.start()
-        processes.append(process)
-    for process in processes:
-        process.join()
-    count = 0
-    for queue_values in iter(video_done_queue.get, None):
-        bitrate, status, elapsed = queue_values
-        if status == 'STOP':
-            config_dash.LOG.critical("Completed download of %s in %f " % (bitrate, elapsed))
-            count += 1
-            if count == len(dp_object.video):
-                # If the download of all the videos is done the stop the
-                config_dash.LOG.critical("Finished download of all video segments")
-                break
+    folder = config_dash.MIRROR_FOLDER if DOWNLOAD else None
+    mpd_url = MPD if urlparse.urlparse(MPD).scheme in ('http', 'https') else None
+    return run_mirror(dp_object, domain, folder, mpd_url)
 
 
 def create_arguments(parser):
@@ -633,13 +567,13 @@ def create_arguments(parser):
                         help="List all the representations")
     parser.add_argument('-p', '--PLAYBACK',
                         default=DEFAULT_PLAYBACK,
-                        help="Playback type (basic, sara, netflix, or all)")
+                        help="Playback type (basic, sara, netflix, mpc, or all)")
     parser.add_argument('-n', '--SEGMENT_LIMIT',
                         default=SEGMENT_LIMIT,
                         help="The Segment number limit")
     parser.add_argument('-d', '--DOWNLOAD', action='store_true',
                         default=False,
-                        help="Keep the video files after playback")
+                        help="Save the segments and keep them after playback. Otherwise they are only measured")
     parser.add_argument('-quic', '--QUIC', action='store_true',
                         default=False,
                         help="Use Quic Downloder")
@@ -653,21 +587,113 @@ def create_arguments(parser):
                         help="Jump sceneario enabled")
     parser.add_argument('-js', '--JUMP_SCENARIO',
                         help="Jump Scenario")
+    parser.add_argument('-w', '--PREFETCH_WINDOW', type=int,
+                        default=PREFETCH_WINDOW,
+                        help="Number of segment requests kept in flight")
+    parser.add_argument('-cache', '--CACHE', action='store_true',
+                        default=False,
+                        help="Serve the segments downloaded before (eg: before a jump back) from a local cache")
+    parser.add_argument('-abandon', '--ABANDON', action='store_true',
+                        default=ABANDON,
+                        help="Experimental: sample the downloads in flight and abandon the ones that would stall")
+    parser.add_argument('-speed', '--SPEED', type=float,
+                        default=SPEED,
+                        help="Speed of the playback clock. Scale the bandwidth of the origin by the same factor")
+    parser.add_argument('-clients', '--CLIENTS', type=int,
+                        default=CLIENTS,
+                        help="Load generation: number of concurrent player sessions")
+    parser.add_argument('-ramp', '--RAMP', type=float,
+                        default=RAMP,
+                        help="Load generation: seconds over which the session starts are spread")
+
+
+def get_connection_type(run_label):
+    """ Module to get the connection type that names the logs of a run. Eg: 'QUIC_1_netflix' """
+    if QUIC:
+        transport = "QUIC"
+    elif CURL:
+        transport = "CURL"
+    else:
+        transport = "URLLIB"
+    return transport + "_" + str(run_label) + "_" + PLAYBACK
+
+
+def play_session(run_label):
+    """ Module to download the MPD and play the video once
+    :param run_label: run number or session name used in the log names
+    :return: (playback_time, total_downloaded). None if nothing was played
+    """
+    connection_type = get_connection_type(run_label)
+    configure_log_file(playback_type=PLAYBACK.lower(), connection_type=connection_type)
+    config_dash.JSON_HANDLE['playback_type'] = PLAYBACK.lower()
+    if not MPD:
+        print "ERROR: Please provide the URL to the MPD file. Try Again.."
+        return None
+    config_dash.LOG.info('Downloading MPD file %s' % MPD)
+
+    # Retrieve the MPD files for the video
+    mpd_file = None
+    while mpd_file == None:
+        mpd_file = get_mpd(MPD)
+        if mpd_file != None:
+            break;
+
+    domain = get_domain_name(MPD)
+
+    dp_object = DashPlayback()
+    # Reading the MPD file created
+    dp_object, video_segment_duration = read_mpd.read_mpd(mpd_file, dp_object)
+    config_dash.LOG.info("The DASH media has %d video representations" % len(dp_object.video))
+    if LIST:
+        # Print the representations and EXIT
+        print_representations(dp_object)
+        return None
+    if "all" in PLAYBACK.lower():
+        config_dash.LOG.critical("Start ALL Parallel PLayback")
+        return start_playback_all(dp_object, domain)
+    elif "basic" in PLAYBACK.lower():
+        config_dash.LOG.critical("Started Basic-DASH Playback")
+        return start_playback_smart(dp_object, domain, "BASIC", DOWNLOAD, video_segment_duration, connection_type, JUMP_SCENARIO, PREFETCH_WINDOW)
+    elif "sara" in PLAYBACK.lower():
+        config_dash.LOG.critical("Started SARA-DASH Playback")
+        return start_playback_smart(dp_object, domain, "SMART", DOWNLOAD, video_segment_duration, connection_type, JUMP_SCENARIO, PREFETCH_WINDOW)
+    elif "netflix" in PLAYBACK.lower():
+        config_dash.LOG.critical("Started Netflix-DASH Playback")
+        return start_playback_smart(dp_object, domain, "NETFLIX", DOWNLOAD, video_segment_duration, connection_type, JUMP_SCENARIO, PREFETCH_WINDOW)
+    elif "mpc" in PLAYBACK.lower():
+        config_dash.LOG.critical("Started MPC-DASH Playback")
+        return start_playback_smart(dp_object, domain, "MPC", DOWNLOAD, video_segment_duration, connection_type, JUMP_SCENARIO, PREFETCH_WINDOW)
+    else:
+        config_dash.LOG.error("Unknown Playback parameter {}".format(PLAYBACK))
+        return None
 
 
-def non_block_read(output):
-    fd = output.fileno()
-    fl = fcntl.fcntl(fd, fcntl.F_GETFL)
-    fcntl.fcntl(fd, fcntl.F_SETFL, fl | os.O_NONBLOCK)
-    time.sleep(0.5)
-    try:
-        output_str = output.read()
-        print "non_block_read_ouptut >>>" + output_str + "<<< non_block_read_ouptut"
-        return output_str
-    except:
-        return ""
+def start_load_generation():
+    """ Module to play CLIENTS concurrent sessions against the same origin, started over RAMP seconds """
+    configure_log_file(playback_type=PLAYBACK.lower(), connection_type=get_connection_type("LOAD"))
+    if not MPD:
+        print "ERROR: Please provide the URL to the MPD file. Try Again.."
+        return None
+    # Download and compile the MPD once. The session processes inherit both
+    mpd_file = get_mpd(MPD)
+    if not mpd_file or not read_mpd.load_manifest(mpd_file):
+        return None
+    program_start_time = datetime.now()
+    results, stats_rows = load_generator.run_load(play_session, CLIENTS, RAMP)
+    total_downloaded = 0
+    for session_number, result, event_log in results:
+        if result:
+            print "Session:", session_number, "PLAYBACK TIME: ", result[0], "TOTAL DOWNLOADED: ", result[1]
+            total_downloaded += result[1]
+        else:
+            print "Session:", session_number, "FAILED. Events in", event_log
+    print "LOAD", "SESSIONS: ", CLIENTS, "RAMP: ", RAMP
+    print "LOAD", "PEAK ACTIVE SESSIONS: ", max([row[2] for row in stats_rows] or [0])
+    print "LOAD", "SUM TOTAL DOWNLOADED: ", total_downloaded
+    print "LOAD", "PROGRAM DURATION: ", (datetime.now() - program_start_time).total_seconds()
+    print "LOAD", "PER SECOND STATISTICS: ", config_dash.LOAD_STATS_FILENAME
+
 
-    
 def main():
     """ Main Program wrapper """
     # configure the log file
@@ -680,54 +706,23 @@ def main():
         create_arguments(parser)
         args = parser.parse_args()
         globals().update(vars(args))
-        
-        if QUIC:
-            CONNECTION_TYPE_STR = "QUIC_" + str(runNo) + "_" + PLAYBACK
-        elif CURL:
-            CONNECTION_TYPE_STR = "CURL_" + str(runNo) + "_" + PLAYBACK
-        else:
-            CONNECTION_TYPE_STR = "URLLIB_" + str(runNo) + "_" + PLAYBACK
- 
-        configure_log_file(playback_type=PLAYBACK.lower(), connection_type=CONNECTION_TYPE_STR)
-        config_dash.JSON_HANDLE['playback_type'] = PLAYBACK.lower()
-        if not MPD:
-            print "ERROR: Please provide the URL to the MPD file. Try Again.."
-            return None
-        config_dash.LOG.info('Downloading MPD file %s' % MPD)
-        
-        # Retrieve the MPD files for the video
-        mpd_file = None
-        while mpd_file == None:
-            mpd_file = get_mpd(MPD)
-            if mpd_file != None:
-                break;
-            
-        domain = get_domain_name(MPD)
-        
-        dp_object = DashPlayback()
-        # Reading the MPD file created
-        dp_object, video_segment_duration = read_mpd.read_mpd(mpd_file, dp_object)
-        config_dash.LOG.info("The DASH media has %d video representations" % len(dp_object.video))
-        if LIST:
-            # Print the representations and EXIT
-            print_representations(dp_object)
+        if SPEED != playback_clock.get_clock().speed:
+            playback_clock.set_speed(SPEED)
+
+        if CLIENTS:
+            # Load generation replaces the consecutive runs
+            return start_load_generation()
+        CONNECTION_TYPE_STR = get_connection_type(runNo)
+        session_result = play_session(runNo)
+        if not session_result:
             return None
         if "all" in PLAYBACK.lower():
-            if mpd_file:
-                config_dash.LOG.critical("Start ALL Parallel PLayback")
-                playbackTime, totalDownloaded = start_playback_all(dp_object, domain)
-        elif "basic" in PLAYBACK.lower():
-            config_dash.LOG.critical("Started Basic-DASH Playback")
-            playbackTime, totalDownloaded = start_playback_smart(dp_object, domain, "BASIC", DOWNLOAD, video_segment_duration, CONNECTION_TYPE_STR, JUMP_SCENARIO)
-        elif "sara" in PLAYBACK.lower():
-            config_dash.LOG.critical("Started SARA-DASH Playback")
-            playbackTime, totalDownloaded = start_playback_smart(dp_object, domain, "SMART", DOWNLOAD, video_segment_duration, CONNECTION_TYPE_STR, JUMP_SCENARIO)
-        elif "netflix" in PLAYBACK.lower():
-            config_dash.LOG.critical("Started Netflix-DASH Playback")
-            playbackTime, totalDownloaded = start_playback_smart(dp_object, domain, "NETFLIX", DOWNLOAD, video_segment_duration, CONNECTION_TYPE_STR, JUMP_SCENARIO)
-        else:
-            config_dash.LOG.error("Unknown Playback parameter {}".format(PLAYBACK))
+            # The mirror downloads every file once: it replaces the consecutive runs
+            print "MIRROR", "FILES: ", session_result['files'], "FAILED: ", session_result['failed']
+            print "MIRROR", "TOTAL DOWNLOADED: ", session_result['bytes'], "IN", session_result['seconds'], "SECONDS"
+            print "MIRROR", "THROUGHPUT (bytes/s): ", session_result['throughput']
             return None
+        playbackTime, totalDownloaded = session_result
         
         sumOfTotalDownloaded = sumOfTotalDownloaded + totalDownloaded
         sumOfPlaybackTime = sumOfPlaybackTime + playbackTime
@@ -746,28 +741,9 @@ def main():
     print CONNECTION_TYPE_STR, "PROGRAM DURATION: ", delta.total_seconds()
     print CONNECTION_TYPE_STR, "FINAL SUM OF TOTAL DOWNLOADED: ", sumOfTotalDownloaded
     print CONNECTION_TYPE_STR, "FINAL SUM OF PLAYPACK TIME: ", sumOfPlaybackTime
+    close_event_log()
 
 
-def kill(proc_pid):
-    try:
-        process = psutil.Process(proc_pid)
-        for proc in process.children(recursive=True):
-            proc.kill()
-        process.kill()
-    except:
-        return
-
-
-def check_kill_process(pstring):
-    for line in os.popen("ps ax | grep " + pstring + " | grep -v grep"):
-        fields = line.split()
-        pid = fields[0]
-        try:
-            os.kill(int(pid), signal.SIGKILL)
-        except:
-            return
-
-        
 if __name__ == "__main__":
 
 
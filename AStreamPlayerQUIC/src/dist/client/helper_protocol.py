@@ -0,0 +1,341 @@
+""" Module to talk to the quic_client and LibCurlCppConsole helper processes.
+    The helpers read one segment URL per line from stdin and report each download on stdout as
+        file_size_start:<segment size>:file_size_end
+    followed by the rest of the status line. A size of -1 means the download failed.
+    Newer helpers also print a versioned timing record on its own line before the result frame:
+        result_v1 id=<request number> bytes=<n> connect=<s> handshake=<s> ttfb=<s> transfer=<s> error=<code>
+    The request number counts the URLs the helper has read, from 1. The times are in seconds, '-' when the phase
+    did not happen (eg: ttfb of a failed request); connect and handshake are 0 on a reused connection.
+    error is 0 for a successful request, otherwise the error code of the transport library.
+    Later versions only add fields. reference_helper.py implements the protocol in Python.
+
+    Helpers that end their start-up line with the word 'tagged' take several requests at a time. Each request
+    line is tagged with its request id:
+        <request id> <url>
+    and each request is answered with its timing record only, in the order the downloads complete, so one QUIC
+    connection can carry a stream per request. The record is the completion: bytes is -1 and error is set for a
+    failed request. Other helpers get one URL at a time and concurrent callers are served one after the other.
+
+    The stdout pipe is read with select() so that a result is returned as soon as the helper
+    prints it, instead of polling the pipe at a fixed interval.
+    Every helper runs in its own process group, so kill() stops the helper and the shell that started it
+    without touching the helpers of other sessions.
+"""
+from __future__ import division
+
+import errno
+import os
+import re
+import select
+import signal
+from subprocess import Popen, PIPE, STDOUT
+import threading
+import time
+
+import config_dash
+
+
+READY_MARKER = "started"
+EXIT_COMMAND = "exit"
+# Word of the start-up line of the helpers that take tagged concurrent requests
+TAGGED_CAPABILITY = "tagged"
+RESULT_PATTERN = re.compile(r"file_size_start:(-?\d+):file_size_end")
+TIMING_PATTERN = re.compile(r"result_v(\d+)\s(.*)")
+# Fields of the timing record: name in the record -> (key in the parsed record, type)
+TIMING_FIELDS = {'id': ('request_id', int),
+                 'bytes': ('bytes', int),
+                 'connect': ('connect', float),
+                 'handshake': ('handshake', float),
+                 'ttfb': ('ttfb', float),
+                 'transfer': ('transfer', float),
+                 'error': ('error', int)}
+ERROR_MARKERS = ("FATAL", "Failed to connect", "ERROR")
+READ_SIZE = 64 * 1024
+
+
+def parse_timing(line):
+    """ Module to parse a timing record
+    :return: dict with the 'version' and the TIMING_FIELDS of the record (None for '-' and missing fields),
+             or None if the line is not a timing record
+    """
+    match = TIMING_PATTERN.match(line.strip())
+    if not match:
+        return None
+    timing = dict((key, None) for key, _ in TIMING_FIELDS.values())
+    timing['version'] = int(match.group(1))
+    for field in match.group(2).split():
+        name, _, value = field.partition('=')
+        if name not in TIMING_FIELDS or value == '-':
+            continue
+        key, field_type = TIMING_FIELDS[name]
+        try:
+            timing[key] = field_type(value)
+        except ValueError:
+            config_dash.LOG.warning("Invalid {} in the timing record: {}".format(name, line))
+    return timing
+
+
+class HelperProcess(object):
+    """ A running transport helper and the framed reader for its stdout """
+    def __init__(self, command):
+        self.command = command
+        self.process = Popen(command, shell=True, stdout=PIPE, stdin=PIPE, stderr=STDOUT, preexec_fn=os.setsid)
+        self.pid = self.process.pid
+        self.stdout_fd = self.process.stdout.fileno()
+        # Output read from the helper that has not been parsed yet
+        self.pending = ""
+        self.closed = False
+        # Set when the helper stops answering: a request timed out, its input closed or it reported a transport
+        # error. A failed request of a working helper (eg: HTTP 404) does not set it
+        self.failed = False
+        # Set once the helper has been asked to exit
+        self.exiting = False
+        # Number of URLs sent to the helper and the timing record of the last request (None if it printed none)
+        self.request_count = 0
+        self.timing = None
+        # Set by wait_until_ready when the helper takes tagged concurrent requests
+        self.tagged = False
+        # Serializes the writes to stdin, and the requests of helpers that are not tagged
+        self.lock = threading.Lock()
+        # Tagged requests: timing records by request id, the ids given up on, and whether a thread reads stdout
+        self.condition = threading.Condition()
+        self.results = dict()
+        self.abandoned = set()
+        self.reading = False
+
+    def read_available(self, deadline):
+        """ Wait until the helper writes to stdout or the deadline passes.
+        :param deadline: time.time() value to give up at. None waits for ever
+        :return: False if the deadline passed or the helper closed its stdout
+        """
+        if self.closed:
+            return False
+        timeout = None
+        if deadline is not None:
+            timeout = max(deadline - time.time(), 0)
+        try:
+            readable, _, _ = select.select([self.stdout_fd], [], [], timeout)
+        except select.error as error:
+            if error.args[0] == errno.EINTR:
+                return True
+            raise
+        if not readable:
+            return False
+        data = os.read(self.stdout_fd, READ_SIZE)
+        if not data:
+            log = config_dash.LOG.info if self.exiting else config_dash.LOG.error
+            log("Helper process {} closed its output".format(self.pid))
+            self.closed = True
+            return False
+        self.pending += data
+        return True
+
+    def wait_until_ready(self, timeout=config_dash.HELPER_READY_TIMEOUT):
+        """ Wait for the helper to print its start-up line
+        :return: True if the helper is ready to take requests
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while READY_MARKER not in self.pending:
+            if not self.read_available(deadline):
+                if self.closed:
+                    config_dash.LOG.error("Helper process {} exited before its start-up line. Output: {!r}".format(
+                        self.pid, self.pending))
+                else:
+                    config_dash.LOG.error("Helper process {} did not start within {} seconds. Output: {!r}".format(
+                        self.pid, timeout, self.pending))
+                return False
+        # Drop everything up to the end of the start-up line
+        ready_line_start = self.pending.rfind("\n", 0, self.pending.find(READY_MARKER)) + 1
+        ready_line_end = self.pending.find("\n", ready_line_start)
+        if ready_line_end == -1:
+            ready_line_end = len(self.pending)
+        self.tagged = TAGGED_CAPABILITY in self.pending[ready_line_start:ready_line_end].split()
+        self.pending = self.pending[ready_line_end + 1:]
+        config_dash.LOG.info("Helper process {} started{}".format(
+            self.pid, " with tagged requests" if self.tagged else ""))
+        return True
+
+    def parse_result(self):
+        """ Parse the first result frame or error line out of the pending output.
+            Timing records printed before the frame are kept in self.timing
+        :return: segment size, -1 for a failed download, or None if no complete frame is pending
+        """
+        result = RESULT_PATTERN.search(self.pending)
+        frame_start = result.start() if result else len(self.pending)
+        # Error lines printed before the result frame mean the request failed
+        line_start = 0
+        while True:
+            line_end = self.pending.find("\n", line_start, frame_start)
+            if line_end == -1:
+                break
+            line = self.pending[line_start:line_end]
+            timing = parse_timing(line)
+            if timing:
+                self.timing = timing
+            elif any(marker in line for marker in ERROR_MARKERS):
+                # The result frame of the request may still follow: the output of the helper cannot be trusted
+                config_dash.LOG.error("Helper process {} reported: {}".format(self.pid, line))
+                self.failed = True
+                self.pending = self.pending[line_end + 1:]
+                return -1
+            line_start = line_end + 1
+        if result:
+            self.pending = self.pending[result.end():]
+            return int(result.group(1))
+        # Complete lines without a result frame are status messages
+        self.pending = self.pending[line_start:]
+        return None
+
+    def send(self, line):
+        """ Write a request line to the helper
+        :return: False if the helper does not read its input any more
+        """
+        if self.closed:
+            self.failed = True
+            return False
+        try:
+            self.process.stdin.write(line + '\n')
+            self.process.stdin.flush()
+        except (IOError, ValueError) as error:
+            # ValueError: the helper has been killed by another thread
+            config_dash.LOG.error("Unable to send {} to helper process {}: {}".format(line, self.pid, error))
+            self.failed = True
+            return False
+        return True
+
+    def request(self, url, timeout=config_dash.HELPER_REQUEST_TIMEOUT):
+        """ Ask the helper to download url and wait for the result. Can be called from several threads
+        :return: (segment_size, timing): size of the downloaded segment in bytes or -1 if the download failed or
+                 timed out, and the timing record of the request (parse_timing) or None if the helper printed none
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        if self.tagged:
+            with self.lock:
+                self.request_count += 1
+                request_id = self.request_count
+                if not self.send("{} {}".format(request_id, url)):
+                    return -1, None
+            timing = self.wait_for_record(request_id, deadline)
+            if timing is None:
+                self.failed = True
+                if not self.closed:
+                    config_dash.LOG.error("Helper process {} timed out after {} seconds on {}".format(
+                        self.pid, timeout, url))
+                return -1, None
+            if timing['error'] or timing['bytes'] is None:
+                config_dash.LOG.error("Helper process {} failed to download {} (error {})".format(
+                    self.pid, url, timing['error']))
+                return -1, timing
+            return timing['bytes'], timing
+        with self.lock:
+            return self.request_sequential(url, deadline, timeout), self.timing
+
+    def request_sequential(self, url, deadline, timeout):
+        """ Send url to a helper that takes one request at a time and wait for its result frame
+        :return: size of the downloaded segment in bytes or -1. The timing record of the request is in self.timing
+        """
+        self.request_count += 1
+        self.timing = None
+        if not self.send(url):
+            return -1
+        while True:
+            segment_size = self.parse_result()
+            if segment_size is not None:
+                if self.timing and self.timing['request_id'] not in (None, self.request_count):
+                    config_dash.LOG.warning("Helper process {} sent the timing of request {} for request {}".format(
+                        self.pid, self.timing['request_id'], self.request_count))
+                    self.timing = None
+                return segment_size
+            if not self.read_available(deadline):
+                self.failed = True
+                if not self.closed:
+                    config_dash.LOG.error("Helper process {} timed out after {} seconds on {}".format(
+                        self.pid, timeout, url))
+                return -1
+
+    def parse_records(self):
+        """ Move the timing records of the complete pending lines to self.results. Called with self.condition held
+        """
+        lines = self.pending.split("\n")
+        self.pending = lines.pop()
+        for line in lines:
+            timing = parse_timing(line)
+            if timing is None:
+                if any(marker in line for marker in ERROR_MARKERS):
+                    config_dash.LOG.error("Helper process {} reported: {}".format(self.pid, line))
+                continue
+            request_id = timing['request_id']
+            if request_id is None or request_id > self.request_count:
+                config_dash.LOG.warning("Helper process {} sent a record for an unknown request: {}".format(
+                    self.pid, line))
+            elif request_id in self.abandoned:
+                self.abandoned.discard(request_id)
+            else:
+                self.results[request_id] = timing
+
+    def wait_for_record(self, request_id, deadline):
+        """ Wait for the timing record of a tagged request. The records complete in any order: one of the waiting
+            threads reads the output of the helper and hands the records of the other requests to their threads
+        :return: the timing record, or None if the deadline passed or the helper closed its output
+        """
+        with self.condition:
+            while request_id not in self.results:
+                if self.closed or (deadline is not None and time.time() >= deadline):
+                    self.abandoned.add(request_id)
+                    return None
+                if self.reading:
+                    # Woken up by the reading thread after every read
+                    self.condition.wait(None if deadline is None else max(deadline - time.time(), 0))
+                    continue
+                self.reading = True
+                self.condition.release()
+                try:
+                    self.read_available(deadline)
+                finally:
+                    self.condition.acquire()
+                    self.reading = False
+                    if self.closed:
+                        self.process.stdout.close()
+                self.parse_records()
+                self.condition.notify_all()
+            return self.results.pop(request_id)
+
+    def is_alive(self):
+        """ :return: True while the helper process runs and its output is open """
+        return not self.closed and self.process.poll() is None
+
+    def close(self):
+        """ Ask the helper to exit """
+        self.exiting = True
+        try:
+            self.process.stdin.write(EXIT_COMMAND + '\n')
+            self.process.stdin.flush()
+        except (IOError, ValueError) as error:
+            config_dash.LOG.info("Unable to send exit to helper process {}: {}".format(self.pid, error))
+
+    def wait_for_exit(self, timeout=config_dash.HELPER_EXIT_TIMEOUT):
+        """ Read the output of the helper until it closes it or the timeout expires
+        :return: True if the helper closed its output
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while self.read_available(deadline):
+            self.pending = ""
+        return self.closed
+
+    def kill(self):
+        """ Kill the process group of the helper and release its pipes """
+        try:
+            os.killpg(self.pid, signal.SIGKILL)
+        except OSError as error:
+            if error.errno != errno.ESRCH:
+                raise
+        self.exiting = True
+        self.process.wait()
+        self.process.stdin.close()
+        with self.condition:
+            self.closed = True
+            # A thread waiting for a tagged request reads stdout until the end of the output and closes it
+            if not self.reading:
+                self.process.stdout.close()
+            self.condition.notify_all()
+        config_dash.LOG.info("Stopped helper process {}".format(self.pid))
@@ -0,0 +1,146 @@
+""" Module to supervise the quic_client and LibCurlCppConsole helpers of a session.
+    HelperSupervisor keeps the active helper and, with config_dash.HELPER_STANDBY, a standby helper that is
+    started in advance. When the active helper dies or stops answering (a request timed out, or it reported a
+    transport error), the supervisor kills the process group of that helper only and the standby takes over at
+    once; a new standby is started behind it. The failed requests of a working helper (eg: HTTP 404) are only
+    returned to the caller. A standby that died is replaced before the next request, and a standby is only
+    promoted once it is ready. When config_dash.HELPER_START_ATTEMPTS helpers in a row do not get ready, with
+    growing delays between them, the supervisor gives up with a RuntimeError.
+    The supervisor only ever kills the helpers it started, so concurrent sessions keep theirs.
+    request() can be called from several threads: a helper with tagged requests (see helper_protocol.py) downloads
+    them concurrently, and the requests in flight on a failed helper cause a single fail over.
+
+    Usage:
+        helpers = HelperSupervisor(config_dash.QUIC_CLIENT_CMD)
+        helpers.start()
+        segment_size, timing = helpers.request(url)
+        helpers.close()
+"""
+from __future__ import division
+
+import threading
+import time
+
+import config_dash
+from helper_protocol import HelperProcess
+
+
+class HelperSupervisor(object):
+    """ The active helper of a session and its warm standby """
+    def __init__(self, command, standby=config_dash.HELPER_STANDBY):
+        """
+        :param command: command line of the helper
+        :param standby: keep a started helper ready to replace the active one
+        """
+        self.command = command
+        self.standby_enabled = standby
+        self.active = None
+        self.standby = None
+        # Helpers started by this supervisor that have not been killed
+        self.children = set()
+        self.lock = threading.RLock()
+
+    @property
+    def pid(self):
+        """ :return: Process id of the active helper """
+        return self.active.pid if self.active else None
+
+    @property
+    def tagged(self):
+        """ :return: True if the active helper takes tagged concurrent requests """
+        return self.active.tagged if self.active else False
+
+    def spawn(self):
+        """ Start a helper. It is not waited for """
+        helper = HelperProcess(self.command)
+        self.children.add(helper)
+        config_dash.LOG.info("Started helper process {}".format(helper.pid))
+        return helper
+
+    def kill(self, helper):
+        """ Kill a helper of this supervisor """
+        if helper in self.children:
+            self.children.discard(helper)
+            helper.kill()
+
+    def make_ready(self, helper, attempts=config_dash.HELPER_START_ATTEMPTS, delay=config_dash.HELPER_RESTART_DELAY):
+        """ Wait for a started helper to be ready. Helpers that fail are killed and replaced, waiting `delay`
+            seconds after the first failure and twice as long after every following one
+        :param attempts: number of helpers started (including helper) before giving up
+        :return: The ready helper. Raises RuntimeError if no helper got ready
+        """
+        failures = 0
+        while not (helper and helper.is_alive() and helper.wait_until_ready()):
+            if helper:
+                config_dash.LOG.error("Helper process {} is not ready".format(helper.pid))
+                self.kill(helper)
+                failures += 1
+            if failures >= attempts:
+                config_dash.LOG.critical("{} helpers did not start: {}".format(failures, self.command))
+                raise RuntimeError("Unable to start the helper: {}".format(self.command))
+            if failures:
+                time.sleep(delay * 2 ** (failures - 1))
+            helper = self.spawn()
+        return helper
+
+    def start(self):
+        """ Start the active helper and the standby. Returns when the active helper is ready """
+        self.active = self.make_ready(self.spawn())
+        if self.standby_enabled:
+            self.standby = self.spawn()
+
+    def check_standby(self):
+        """ Replace the standby if it has died """
+        with self.lock:
+            standby = self.standby
+            if standby and not standby.is_alive():
+                config_dash.LOG.error("Standby helper process {} is not running".format(standby.pid))
+                self.kill(standby)
+                self.standby = self.spawn()
+
+    def fail_over(self, failed=None):
+        """ Replace the active helper with the standby (or a new helper) and start a new standby
+        :param failed: the helper that failed. Nothing is done if it is not the active helper any more,
+                       eg: when several requests in flight on it failed. None replaces the active helper
+        """
+        with self.lock:
+            if failed is None:
+                failed = self.active
+            elif failed is not self.active:
+                return
+            if failed:
+                config_dash.LOG.info("Replacing helper process {}".format(failed.pid))
+                self.kill(failed)
+            standby, self.standby = self.standby, None
+            self.active = self.make_ready(standby)
+            if self.standby_enabled:
+                self.standby = self.spawn()
+            config_dash.LOG.info("Helper process {} is active".format(self.active.pid))
+
+    def request(self, url, timeout=config_dash.HELPER_REQUEST_TIMEOUT):
+        """ Ask the active helper to download url. A helper that has died is replaced first, and a helper that
+            stopped answering is replaced so that the retry goes to the standby
+        :return: (segment_size, timing): size of the downloaded segment in bytes or -1 if the download failed or
+                 timed out, and the timing record of the request (helper_protocol.parse_timing) or None
+        """
+        self.check_standby()
+        helper = self.active
+        if not helper.is_alive():
+            config_dash.LOG.error("Helper process {} is not running".format(helper.pid))
+            self.fail_over(helper)
+            helper = self.active
+        segment_size, timing = helper.request(url, timeout)
+        if segment_size == -1 and (helper.failed or not helper.is_alive()):
+            self.fail_over(helper)
+        return segment_size, timing
+
+    def close(self):
+        """ Ask the helpers to exit. The helpers that do not exit in time are killed """
+        with self.lock:
+            for helper in list(self.children):
+                helper.close()
+            for helper in list(self.children):
+                if not helper.wait_for_exit():
+                    config_dash.LOG.info("Helper process {} did not exit".format(helper.pid))
+                self.kill(helper)
+            self.active = self.standby = None
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+""" Test of the tagged helper requests (helper_protocol.py, helper_supervisor.py) with reference_helper.py -t.
+    A local origin serves segments and 404s with random delays, so the downloads of one helper complete out of
+    order with mixed successes and errors:
+    1. Every successful request gets its own size, every 404 gets -1, and the helper is never replaced
+    2. Killing the helper while requests are in flight fails them with -1 and causes a single fail over
+    3. A standby that died is replaced before it is needed
+    4. A helper that never starts is given up on after config_dash.HELPER_START_ATTEMPTS attempts
+
+    From commandline:
+    python helper_test.py
+"""
+from __future__ import division
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+import os
+import random
+import signal
+from SocketServer import ThreadingMixIn
+import sys
+import threading
+import time
+
+import config_dash
+from configure_log_file import configure_log_file
+from helper_supervisor import HelperSupervisor
+
+HELPER_CMD = "{} {} -t".format(sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                             "reference_helper.py"))
+REQUEST_COUNT = 40
+# Every MISSING_EVERY request is a 404
+MISSING_EVERY = 5
+# Maximum delay of a response of the origin in seconds
+MAX_DELAY = 0.5
+# Helper that exits without printing its start-up line
+BROKEN_HELPER_CMD = "exit 1"
+
+
+class SegmentHandler(BaseHTTPRequestHandler):
+    """ /segment/<n> is n kB long, /missing/<n> does not exist """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(random.uniform(0, MAX_DELAY))
+        _, kind, number = self.path.split('/')
+        if kind != "segment":
+            self.send_error(404)
+            return
+        body = "x" * (int(number) * 1000)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # The connections of a killed helper are reset in the middle of a response
+        pass
+
+
+def start_origin():
+    """ Start the origin in a thread. Returns its base URL """
+    server = ThreadingServer(("127.0.0.1", 0), SegmentHandler)
+    origin_thread = threading.Thread(target=server.serve_forever)
+    origin_thread.daemon = True
+    origin_thread.start()
+    return "http://127.0.0.1:{}/".format(server.server_address[1])
+
+
+def get_url(origin, number):
+    """ :return: (url, expected size) of request number """
+    if number % MISSING_EVERY == 0:
+        return origin + "missing/{}".format(number), -1
+    return origin + "segment/{}".format(number), number * 1000
+
+
+def run_requests(helpers, urls):
+    """ Request all urls at the same time
+    :return: list of (segment_size, timing), in the order of urls
+    """
+    results = [None] * len(urls)
+
+    def request(index):
+        try:
+            results[index] = helpers.request(urls[index])
+        except Exception as error:
+            results[index] = (error, None)
+    threads = [threading.Thread(target=request, args=(index,)) for index in range(len(urls))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_mixed_results(helpers, origin):
+    """ Successes and errors of concurrent requests are returned to their callers, the helper keeps running """
+    pid = helpers.pid
+    requests = [get_url(origin, number) for number in range(1, REQUEST_COUNT + 1)]
+    results = run_requests(helpers, [url for url, _ in requests])
+    passed = True
+    for (url, expected_size), (segment_size, timing) in zip(requests, results):
+        if segment_size != expected_size:
+            print "ERROR: {} returned {} instead of {}".format(url, segment_size, expected_size)
+            passed = False
+        elif expected_size == -1 and (not timing or timing['error'] != 404):
+            print "ERROR: {} did not report the HTTP error: {}".format(url, timing)
+            passed = False
+    if helpers.pid != pid:
+        print "ERROR: The helper was replaced after failed requests"
+        passed = False
+    return passed
+
+
+def test_killed_helper(helpers, origin):
+    """ The requests in flight on a killed helper fail and the standby takes over once """
+    killed = helpers.active
+    urls = [origin + "segment/{}".format(number) for number in range(1, REQUEST_COUNT + 1)]
+    killer = threading.Timer(MAX_DELAY / 2, helpers.kill, args=(killed,))
+    killer.start()
+    results = run_requests(helpers, urls)
+    killer.join()
+    passed = True
+    for url, (segment_size, _) in zip(urls, results):
+        if not isinstance(segment_size, int):
+            print "ERROR: {} raised {!r}".format(url, segment_size)
+            passed = False
+    if helpers.pid in (killed.pid, None):
+        print "ERROR: The killed helper was not replaced"
+        passed = False
+    # A request that reaches the helper after another thread killed it
+    try:
+        segment_size, _ = killed.request(urls[0])
+        if segment_size != -1:
+            print "ERROR: The killed helper returned {}".format(segment_size)
+            passed = False
+    except Exception as error:
+        print "ERROR: The killed helper raised {!r}".format(error)
+        passed = False
+    started = len(helpers.children) + 1
+    if started != 3:
+        print "ERROR: {} helpers were started instead of 3".format(started)
+        passed = False
+    # The new helper serves the next requests
+    for url, (segment_size, _) in zip(urls, run_requests(helpers, urls)):
+        if segment_size != int(url.split('/')[-1]) * 1000:
+            print "ERROR: {} returned {} after the fail over".format(url, segment_size)
+            passed = False
+    return passed
+
+
+def test_dead_standby(helpers, origin):
+    """ A standby that died is replaced by the next request, and the new standby takes over the fail over """
+    dead = helpers.standby
+    os.killpg(dead.pid, signal.SIGKILL)
+    dead.process.wait()
+    passed = True
+    segment_size, _ = helpers.request(origin + "segment/1")
+    if segment_size != 1000:
+        print "ERROR: The request returned {} with a dead standby".format(segment_size)
+        passed = False
+    if helpers.standby in (dead, None) or dead in helpers.children:
+        print "ERROR: The dead standby was not replaced"
+        passed = False
+    helpers.fail_over()
+    if not helpers.active.is_alive() or helpers.pid == dead.pid:
+        print "ERROR: The fail over did not promote a running helper"
+        passed = False
+    return passed
+
+
+def test_broken_helper(helpers, origin):
+    """ Starting a helper that never gets ready gives up after HELPER_START_ATTEMPTS helpers """
+    broken = HelperSupervisor(BROKEN_HELPER_CMD)
+    started = list()
+    spawn = broken.spawn
+
+    def counted_spawn():
+        started.append(spawn())
+        return started[-1]
+    broken.spawn = counted_spawn
+    passed = True
+    try:
+        broken.make_ready(None, delay=0.01)
+        print "ERROR: The broken helper was reported ready"
+        passed = False
+    except RuntimeError:
+        pass
+    if len(started) != config_dash.HELPER_START_ATTEMPTS or broken.children:
+        print "ERROR: {} helpers were started, {} left running".format(len(started), len(broken.children))
+        passed = False
+    return passed
+
+
+def run_test():
+    """ :return: True if all the tests passed """
+    origin = start_origin()
+    passed = True
+    for test in (test_mixed_results, test_killed_helper, test_dead_standby, test_broken_helper):
+        helpers = HelperSupervisor(HELPER_CMD)
+        helpers.start()
+        if not helpers.tagged:
+            print "ERROR: The helper does not take tagged requests"
+            return False
+        try:
+            result = test(helpers, origin)
+        finally:
+            helpers.close()
+        print "{}: {}".format(test.__name__, "OK" if result else "FAILED")
+        passed = passed and result
+    return passed
+
+
+if __name__ == "__main__":
+    configure_log_file(playback_type="test", connection_type="HELPER_TEST", log_file=None)
+    sys.exit(0 if run_test() else 1)
@@ -0,0 +1,212 @@
+""" Module for keep-alive HTTP connections to the media origins.
+    HTTPConnectionPool keeps the connections to each origin (scheme, host, port) open and reuses them
+    for the following requests, so the URLLIB transport does not pay a TCP (and TLS) handshake
+    for every segment. Every response is timed by phase like the timing records of the helpers
+    (see helper_protocol.py): connect, TLS handshake, time to first byte and body transfer. The phases are
+    timed with the playback clock (playback_clock.py) like the download times of the player.
+
+    Usage (like urllib2.urlopen):
+        pool = HTTPConnectionPool()
+        response = pool.urlopen(url)
+        data = response.read(DOWNLOAD_CHUNK)
+        ...
+        response.close()  # Returns the connection to the pool
+"""
+from collections import defaultdict
+import httplib
+import socket
+import ssl
+import threading
+import urllib2
+import urlparse
+
+import config_dash
+import playback_clock
+
+
+# Number of redirects followed before giving up
+MAX_REDIRECTS = 5
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+
+def get_origin(url):
+    """ Module to get the (scheme, host, port) of a URL """
+    parsed_uri = urlparse.urlsplit(url)
+    port = parsed_uri.port
+    if not port:
+        port = httplib.HTTPS_PORT if parsed_uri.scheme == 'https' else httplib.HTTP_PORT
+    return parsed_uri.scheme, parsed_uri.hostname, port
+
+
+class PooledResponse(object):
+    """ Response of a pooled request. close() returns the connection to the pool if the body was read """
+    def __init__(self, pool, origin, connection, response, url, connect=0, handshake=0, ttfb=None):
+        """
+        :param connect: seconds to open the TCP connection, 0 on a reused connection
+        :param handshake: seconds of the TLS handshake, 0 on a reused or plain HTTP connection
+        :param ttfb: seconds from sending the request to reading the response headers
+        """
+        self.pool = pool
+        self.origin = origin
+        self.connection = connection
+        self.response = response
+        self.url = url
+        self.code = response.status
+        self.connect = connect
+        self.handshake = handshake
+        self.ttfb = ttfb
+        # Seconds spent reading the body
+        self.transfer = 0
+        self.size = 0
+
+    def read(self, amt=None):
+        start_time = self.pool.time()
+        data = self.response.read(amt)
+        self.transfer += self.pool.time() - start_time
+        self.size += len(data)
+        return data
+
+    def timing(self):
+        """ :return: The phases of the request as a timing record (helper_protocol.parse_timing) """
+        return {'version': 1, 'request_id': None, 'bytes': self.size, 'connect': self.connect,
+                'handshake': self.handshake, 'ttfb': self.ttfb, 'transfer': self.transfer, 'error': 0}
+
+    def info(self):
+        return self.response.msg
+
+    def close(self):
+        if not self.connection:
+            return
+        # The connection can only be reused once the body has been read completely
+        reusable = self.response.isclosed() and not self.response.will_close
+        self.pool.release(self.origin, self.connection, reusable)
+        self.connection = None
+
+
+class HTTPConnectionPool(object):
+    """ Keep-alive connections, shared by all the requests to the same origin """
+    def __init__(self, max_connections=config_dash.HTTP_POOL_MAX_CONNECTIONS, timeout=None, clock=None):
+        """
+        :param max_connections: maximum number of connections open to one origin at a time
+        :param timeout: socket timeout in seconds. None blocks
+        :param clock: PlaybackClock timing the requests. Default the current playback_clock.get_clock()
+        """
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.clock = clock
+        self.idle_connections = defaultdict(list)
+        self.open_connections = defaultdict(int)
+        self.lock = threading.Condition()
+        self.ssl_context = None
+
+    def time(self):
+        """ :return: The time of the clock timing the requests """
+        return (self.clock or playback_clock.get_clock()).time()
+
+    def acquire(self, origin):
+        """ Get an idle connection to origin or open a new one. Waits if max_connections are busy
+        :return: (connection, reused)
+        """
+        self.lock.acquire()
+        try:
+            while not self.idle_connections[origin] and self.open_connections[origin] >= self.max_connections:
+                self.lock.wait()
+            if self.idle_connections[origin]:
+                return self.idle_connections[origin].pop(), True
+            self.open_connections[origin] += 1
+        finally:
+            self.lock.release()
+        scheme, host, port = origin
+        if scheme == 'https':
+            connection = httplib.HTTPSConnection(host, port, timeout=self.timeout)
+        else:
+            connection = httplib.HTTPConnection(host, port, timeout=self.timeout)
+        config_dash.LOG.debug("Opened a new connection to {}://{}:{}".format(scheme, host, port))
+        return connection, False
+
+    def release(self, origin, connection, reusable=True):
+        """ Return a connection to the pool. Connections that can not be reused are closed """
+        self.lock.acquire()
+        if reusable:
+            self.idle_connections[origin].append(connection)
+        else:
+            connection.close()
+            self.open_connections[origin] -= 1
+        self.lock.notify()
+        self.lock.release()
+
+    def connect(self, connection):
+        """ Open a new connection. The TLS handshake of HTTPS connections is timed apart from the TCP connect
+        :return: (connect, handshake) in seconds
+        """
+        start_time = self.time()
+        sock = socket.create_connection((connection.host, connection.port), self.timeout)
+        connect_time = self.time() - start_time
+        handshake_time = 0
+        if isinstance(connection, httplib.HTTPSConnection):
+            if not self.ssl_context:
+                self.ssl_context = ssl.create_default_context()
+            start_time = self.time()
+            sock = self.ssl_context.wrap_socket(sock, server_hostname=connection.host)
+            handshake_time = self.time() - start_time
+        connection.sock = sock
+        return connect_time, handshake_time
+
+    def close(self):
+        """ Close all the idle connections """
+        self.lock.acquire()
+        for origin, connections in self.idle_connections.items():
+            for connection in connections:
+                connection.close()
+            self.open_connections[origin] -= len(connections)
+        self.idle_connections.clear()
+        self.lock.notify_all()
+        self.lock.release()
+
+    def request(self, url, headers=None):
+        """ Send a GET for url on a pooled connection
+        :param headers: dict of extra request headers (eg: Range)
+        :return: PooledResponse
+        """
+        origin = get_origin(url)
+        parsed_uri = urlparse.urlsplit(url)
+        path = parsed_uri.path or '/'
+        if parsed_uri.query:
+            path += '?' + parsed_uri.query
+        while True:
+            connection, reused = self.acquire(origin)
+            connect_time = handshake_time = 0
+            try:
+                if not reused:
+                    connect_time, handshake_time = self.connect(connection)
+                start_time = self.time()
+                connection.request('GET', path, headers=headers or {})
+                response = connection.getresponse()
+                first_byte_time = self.time() - start_time
+            except (httplib.HTTPException, socket.error):
+                self.release(origin, connection, reusable=False)
+                if reused:
+                    # The server closed the idle keep-alive connection. Retry on a new one
+                    config_dash.LOG.debug("Stale connection to {}. Reconnecting".format(origin))
+                    continue
+                raise
+            return PooledResponse(self, origin, connection, response, url, connect_time, handshake_time,
+                                  first_byte_time)
+
+    def urlopen(self, url, headers=None):
+        """ Open url like urllib2.urlopen. Follows redirects.
+            Raises urllib2.HTTPError for error responses
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self.request(url, headers)
+            if response.code in REDIRECT_CODES and response.info().getheader('location'):
+                response.read()
+                response.close()
+                url = urlparse.urljoin(url, response.info().getheader('location'))
+                continue
+            if response.code >= 400:
+                response.read()
+                response.close()
+                raise urllib2.HTTPError(url, response.code, response.response.reason, response.info(), None)
+            return response
+        raise urllib2.HTTPError(url, response.code, "Too many redirects", response.info(), None)
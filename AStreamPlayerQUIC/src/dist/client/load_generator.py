@@ -0,0 +1,156 @@
+""" Module to emulate many viewers from one machine.
+    run_load plays `client_count` sessions at the same time in a process pool, so each session has its own
+    playback clock, player thread and logs. The session start times follow a linear ramp.
+    When all the sessions are done their NDJSON event logs are aggregated into per second statistics.
+
+    Usage:
+        results, stats = run_load(play_session, client_count=20, ramp=60)
+"""
+from __future__ import division
+
+from collections import defaultdict
+import csv
+import json
+import multiprocessing
+import os
+import traceback
+
+import config_dash
+from configure_log_file import close_event_log
+import playback_clock
+
+LOAD_STATS_HEADER = ("EpochTime;Second;ActiveSessions;Segments;Bytes;MeanBitrate;MeanDownloadRate;"
+                     "Interruptions").split(";")
+# Pool results are waited for with a timeout, otherwise Python 2 does not deliver KeyboardInterrupt
+POOL_WAIT_TIMEOUT = 365 * 24 * 60 * 60
+
+
+def get_session_log_name(log_filename, session_number):
+    """ Module to get the log file of a session. Eg: 'ASTREAM_x.json' -> 'ASTREAM_x_S3.json' """
+    root, extension = os.path.splitext(log_filename)
+    return "{}_S{}{}".format(root, session_number, extension)
+
+
+def get_start_delays(client_count, ramp):
+    """ Module to get the start time of each session in seconds after the start of the load.
+        The sessions are spread evenly over `ramp` seconds
+    """
+    if client_count < 2 or not ramp:
+        return [0] * client_count
+    return [ramp * session_index / (client_count - 1) for session_index in range(client_count)]
+
+
+def run_session(session):
+    """ Pool worker that plays one session
+    :param session: (session_function, session_number, start_delay)
+    :return: (session_number, result, event_log). result is the return value of session_function or None
+    """
+    session_function, session_number, start_delay = session
+    playback_clock.get_clock().sleep(start_delay)
+    config_dash.JSON_LOG = get_session_log_name(config_dash.JSON_LOG, session_number)
+    config_dash.JSON_EVENT_LOG = get_session_log_name(config_dash.JSON_EVENT_LOG, session_number)
+    # Do not write to the event log of the parent process
+    close_event_log()
+    result = None
+    try:
+        result = session_function("S{}".format(session_number))
+    except Exception:
+        config_dash.LOG.error("Session {} failed: {}".format(session_number, traceback.format_exc()))
+    finally:
+        close_event_log()
+    return session_number, result, config_dash.JSON_EVENT_LOG
+
+
+def read_events(event_log):
+    """ Module to read the records of an NDJSON event log. Truncated lines are skipped """
+    events = list()
+    try:
+        with open(event_log) as event_log_handle:
+            for line in event_log_handle:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+    except IOError, e:
+        config_dash.LOG.error("Unable to read the event log {}: {}".format(event_log, e))
+    return events
+
+
+def aggregate_stats(event_logs):
+    """ Module to aggregate the event logs of the sessions into per second statistics
+    :param event_logs: NDJSON event log of each session
+    :return: list of rows (LOAD_STATS_HEADER), one for each second from the first to the last event
+    """
+    # (first second, last second) of each session
+    session_spans = list()
+    second_stats = defaultdict(lambda: defaultdict(float))
+    for event_log in event_logs:
+        events = read_events(event_log)
+        if not events:
+            continue
+        event_seconds = [int(event['time']) for event in events]
+        session_spans.append((min(event_seconds), max(event_seconds)))
+        for event in events:
+            stats = second_stats[int(event['time'])]
+            if event['event'] == 'segment':
+                stats['segments'] += 1
+                stats['bytes'] += event['size']
+                stats['bitrate_sum'] += event['bitrate']
+                if event['download_time']:
+                    stats['download_rate_sum'] += event['size'] / event['download_time']
+                    stats['download_rate_count'] += 1
+            elif event['event'] == 'interruption':
+                stats['interruptions'] += 1
+    if not session_spans:
+        return list()
+    first_second = min(start for start, _ in session_spans)
+    last_second = max(end for _, end in session_spans)
+    stats_rows = list()
+    for second in range(first_second, last_second + 1):
+        stats = second_stats.get(second, {})
+        segments = int(stats.get('segments', 0))
+        mean_bitrate = stats['bitrate_sum'] / segments if segments else 0
+        download_rate_count = stats.get('download_rate_count', 0)
+        mean_download_rate = stats['download_rate_sum'] / download_rate_count if download_rate_count else 0
+        active_sessions = sum(1 for start, end in session_spans if start <= second <= end)
+        stats_rows.append([second, second - first_second, active_sessions, segments, int(stats.get('bytes', 0)),
+                           mean_bitrate, mean_download_rate, int(stats.get('interruptions', 0))])
+    return stats_rows
+
+
+def write_stats(stats_rows, stats_file):
+    """ Module to write the per second statistics to a CSV file """
+    with open(stats_file, 'wb') as stats_file_handle:
+        stats_writer = csv.writer(stats_file_handle, delimiter=";")
+        stats_writer.writerow(LOAD_STATS_HEADER)
+        stats_writer.writerows(stats_rows)
+
+
+def run_load(session_function, client_count, ramp=config_dash.LOAD_RAMP, stats_file=None):
+    """ Module to play client_count concurrent sessions
+    :param session_function: module level function called with the session label (eg: 'S3') in a worker process.
+                             Returns the result of the session
+    :param client_count: number of concurrent sessions
+    :param ramp: seconds over which the session starts are spread
+    :param stats_file: CSV file for the per second statistics. Default config_dash.LOAD_STATS_FILENAME
+    :return: (results, stats_rows). results holds (session_number, result, event_log) for each session
+    """
+    if not stats_file:
+        stats_file = config_dash.LOAD_STATS_FILENAME
+    sessions = [(session_function, session_number, start_delay)
+                for session_number, start_delay in enumerate(get_start_delays(client_count, ramp), 1)]
+    config_dash.LOG.info("Starting {} sessions over {} seconds".format(client_count, ramp))
+    # One process for each session, so that every session has its own clock and logs
+    pool = multiprocessing.Pool(processes=client_count, maxtasksperchild=1)
+    try:
+        results = pool.map_async(run_session, sessions, chunksize=1).get(POOL_WAIT_TIMEOUT)
+    except KeyboardInterrupt:
+        pool.terminate()
+        pool.join()
+        raise
+    pool.close()
+    pool.join()
+    stats_rows = aggregate_stats([event_log for _, _, event_log in results])
+    write_stats(stats_rows, stats_file)
+    config_dash.LOG.info("Wrote the per second statistics of {} sessions to {}".format(client_count, stats_file))
+    return results, stats_rows
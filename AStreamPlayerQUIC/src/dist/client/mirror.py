@@ -0,0 +1,249 @@
+""" Module to mirror every representation of a DASH video (dash_client.py -p all).
+    run_mirror downloads the MPD and the initialization and media segments of every bitrate with a pool of worker
+    threads. The URLLIB connection pool limits the connections opened to each origin.
+    With a folder, every file is saved under the path it has on the origin, so the folder can be served as a local
+    origin. A file is written as <file>.part and renamed once complete: complete files are skipped when the mirror
+    is run again, and a partial file is resumed with a Range request if the origin supports it.
+    Without a folder the files are only measured, to measure the raw throughput of the origin apart from any
+    adaptation logic.
+
+    Usage:
+        stats = run_mirror(dp_object, domain, folder="MIRROR/", mpd_url=MPD)
+"""
+from __future__ import division
+
+from collections import defaultdict
+import errno
+import httplib
+import os
+import Queue
+import threading
+import time
+import urllib2
+import urlparse
+
+import config_dash
+from http_pool import HTTPConnectionPool
+from segment_sink import MeasureSink
+
+DOWNLOAD_CHUNK = 256 * 1024
+PART_SUFFIX = ".part"
+# Seconds between two progress reports of a running mirror
+REPORT_INTERVAL = 5
+# Status of a mirrored file
+DOWNLOADED, SKIPPED, FAILED = 'downloaded', 'skipped', 'failed'
+
+
+def get_mirror_jobs(dp_object, domain, mpd_url=None):
+    """ Module to list the files of every representation: the initialization segment then the media segments
+    :param mpd_url: URL of the MPD, mirrored first. None to leave it out
+    :return: list of (bitrate, url). The bitrate of the MPD is None
+    """
+    manifest = dp_object.manifest
+    jobs = list()
+    if mpd_url:
+        jobs.append((None, mpd_url))
+    for bitrate in manifest.bitrates:
+        for segment_number in range(manifest.start, manifest.start + manifest.segment_count):
+            jobs.append((bitrate, urlparse.urljoin(domain, manifest.segment_url(segment_number, bitrate))))
+    return jobs
+
+
+def get_mirror_path(folder, url):
+    """ Module to get the file of url in the mirror: the path of the URL under folder.
+        ValueError for the paths that would leave the folder
+    """
+    url_path = os.path.normpath(urlparse.urlparse(url).path.lstrip('/'))
+    if url_path in (os.curdir, os.pardir) or url_path.startswith(os.pardir + os.sep) or os.path.isabs(url_path):
+        raise ValueError("Unable to mirror {}: the path is outside of the origin".format(url))
+    return os.path.join(folder, url_path)
+
+
+def make_folder(path):
+    """ Module to create the folder of path if it does not exist """
+    folder = os.path.dirname(path)
+    try:
+        os.makedirs(folder)
+    except OSError as error:
+        if error.errno != errno.EEXIST or not os.path.isdir(folder):
+            raise
+
+
+def read_body(response, sink):
+    """ Module to pass the body of a response to sink
+    :return: The number of bytes read. IOError if the origin closed the connection before the end of the body
+    """
+    size = 0
+    while True:
+        data = response.read(DOWNLOAD_CHUNK)
+        if not data:
+            break
+        size += len(data)
+        sink.write(data)
+    content_length = response.info().getheader('content-length')
+    if content_length is not None and int(content_length) != size:
+        raise IOError("Incomplete body: {} of {} bytes".format(size, content_length))
+    return size
+
+
+def fetch(pool, url, mirror_path=None):
+    """ Module to download one file of the mirror
+    :param mirror_path: file to save it to. None to only measure the file
+    :return: (status, bytes downloaded)
+    """
+    if not mirror_path:
+        response = pool.urlopen(url)
+        try:
+            return DOWNLOADED, read_body(response, MeasureSink())
+        finally:
+            response.close()
+    if os.path.exists(mirror_path):
+        return SKIPPED, 0
+    part_path = mirror_path + PART_SUFFIX
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    try:
+        response = pool.urlopen(url, {'Range': 'bytes={}-'.format(offset)} if offset else None)
+    except urllib2.HTTPError as error:
+        if not offset or error.code != httplib.REQUESTED_RANGE_NOT_SATISFIABLE:
+            raise
+        # The partial file does not match the file on the origin any more
+        os.remove(part_path)
+        return fetch(pool, url, mirror_path)
+    try:
+        if offset and response.code != httplib.PARTIAL_CONTENT:
+            # The origin sent the whole file
+            offset = 0
+        make_folder(part_path)
+        with open(part_path, 'ab' if offset else 'wb') as part_file:
+            size = read_body(response, part_file)
+    finally:
+        response.close()
+    os.rename(part_path, mirror_path)
+    return DOWNLOADED, size
+
+
+class Mirror(object):
+    """ Downloads the files of a mirror with a pool of worker threads """
+    def __init__(self, jobs, folder=None, workers=config_dash.MIRROR_WORKERS,
+                 connections=config_dash.MIRROR_CONNECTIONS, timeout=config_dash.MIRROR_TIMEOUT):
+        """
+        :param jobs: list of (bitrate, url) (get_mirror_jobs)
+        :param folder: folder to save the files in. None to only measure them
+        :param workers: number of worker threads
+        :param connections: maximum number of connections to one origin
+        :param timeout: socket timeout of the requests in seconds
+        """
+        self.job_count = len(jobs)
+        self.jobs = Queue.Queue()
+        for job in jobs:
+            self.jobs.put(job)
+        self.folder = folder
+        self.worker_count = max(min(int(workers), len(jobs)), 1)
+        self.pool = HTTPConnectionPool(connections, timeout)
+        # Statistics by bitrate: files of each status, bytes and seconds spent downloading
+        self.stats = defaultdict(lambda: defaultdict(float))
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def work(self):
+        """ Worker thread: mirrors files until there are none left or the mirror is stopped """
+        while not self.stopped.is_set():
+            try:
+                bitrate, url = self.jobs.get_nowait()
+            except Queue.Empty:
+                return
+            start_time = time.time()
+            try:
+                mirror_path = get_mirror_path(self.folder, url) if self.folder else None
+                status, size = fetch(self.pool, url, mirror_path)
+            except (IOError, OSError, ValueError, httplib.HTTPException) as error:
+                config_dash.LOG.error("Unable to mirror {}: {}".format(url, error))
+                status, size = FAILED, 0
+            download_time = time.time() - start_time
+            with self.lock:
+                stats = self.stats[bitrate]
+                stats[status] += 1
+                stats['bytes'] += size
+                if status == DOWNLOADED:
+                    stats['download_time'] += download_time
+
+    def get_totals(self):
+        """ :return: The statistics of all the bitrates """
+        totals = defaultdict(float)
+        with self.lock:
+            for stats in self.stats.values():
+                for key, value in stats.items():
+                    totals[key] += value
+        return totals
+
+    def run(self):
+        """ Mirror all the files
+        :return: dict with the totals, the statistics of each bitrate and the aggregate throughput
+        """
+        config_dash.LOG.info("Mirroring {} files with {} workers{}".format(
+            self.job_count, self.worker_count, " to " + self.folder if self.folder else ""))
+        start_time = time.time()
+        workers = [threading.Thread(target=self.work) for _ in range(self.worker_count)]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        try:
+            for worker in workers:
+                # Joined with a timeout, otherwise Python 2 does not deliver KeyboardInterrupt
+                while worker.is_alive():
+                    worker.join(REPORT_INTERVAL)
+                    if worker.is_alive():
+                        totals = self.get_totals()
+                        config_dash.LOG.info("Mirrored {} of {} files, {} bytes, {:.0f} bytes/s".format(
+                            int(totals[DOWNLOADED] + totals[SKIPPED] + totals[FAILED]), self.job_count,
+                            int(totals['bytes']), totals['bytes'] / (time.time() - start_time)))
+        except KeyboardInterrupt:
+            # The files in progress are resumed by the next run
+            self.stopped.set()
+            raise
+        finally:
+            self.pool.close()
+        return self.get_report(time.time() - start_time)
+
+    def get_report(self, elapsed):
+        """ :return: The statistics of the mirror after elapsed seconds """
+        totals = self.get_totals()
+        bitrates = dict()
+        for bitrate, stats in self.stats.items():
+            bitrates[bitrate] = {'downloaded': int(stats[DOWNLOADED]), 'skipped': int(stats[SKIPPED]),
+                                 'failed': int(stats[FAILED]), 'bytes': int(stats['bytes']),
+                                 # Mean rate of one download of the bitrate
+                                 'download_rate': (stats['bytes'] / stats['download_time']
+                                                   if stats['download_time'] else 0)}
+        return {'files': self.job_count, 'downloaded': int(totals[DOWNLOADED]), 'skipped': int(totals[SKIPPED]),
+                'failed': int(totals[FAILED]), 'bytes': int(totals['bytes']), 'seconds': elapsed,
+                # Bytes per second of all the workers together
+                'throughput': totals['bytes'] / elapsed if elapsed else 0, 'bitrates': bitrates}
+
+
+def log_report(report):
+    """ Module to log the statistics of a mirror """
+    for bitrate in sorted(report['bitrates']):
+        stats = report['bitrates'][bitrate]
+        config_dash.LOG.info("{}: {} downloaded, {} skipped, {} failed, {} bytes at {:.0f} bytes/s per download".format(
+            bitrate if bitrate is not None else "MPD", stats['downloaded'], stats['skipped'], stats['failed'],
+            stats['bytes'], stats['download_rate']))
+    config_dash.LOG.info("Mirrored {} files ({} downloaded, {} skipped, {} failed): {} bytes in {:.3f} seconds, "
+                         "{:.0f} bytes/s ({:.3f} Mbps)".format(
+                             report['files'], report['downloaded'], report['skipped'], report['failed'],
+                             report['bytes'], report['seconds'], report['throughput'],
+                             report['throughput'] * 8 / 1e6))
+
+
+def run_mirror(dp_object, domain, folder=None, mpd_url=None, workers=config_dash.MIRROR_WORKERS,
+               connections=config_dash.MIRROR_CONNECTIONS):
+    """ Module to mirror every representation of the MPD
+    :param dp_object: DashPlayback with the compiled manifest
+    :param domain: base URL of the segment URLs
+    :param folder: folder to save the files in. None to only measure them
+    :param mpd_url: URL of the MPD, mirrored with the segments
+    :return: the statistics of the mirror (Mirror.get_report)
+    """
+    report = Mirror(get_mirror_jobs(dp_object, domain, mpd_url), folder, workers, connections).run()
+    log_report(report)
+    return report
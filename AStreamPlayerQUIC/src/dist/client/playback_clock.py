@@ -0,0 +1,107 @@
+""" Module with the clock of the player.
+    PlaybackClock reads a monotonic clock with sub-second resolution and runs `speed` times faster than the wall
+    clock. The player (DashPlayer, StopWatch), the request delays and jumps of dash_client, the download times of
+    SegmentPrefetcher and the event log all read the same clock (get_clock), so with a speed of 10 and the bandwidth
+    of the origin scaled by 10, a 10 minute video plays in 1 minute with the same decisions.
+
+    Usage:
+        playback_clock.set_speed(10)
+        clock = playback_clock.get_clock()
+        start = clock.time()
+        clock.sleep(4)      # 0.4 seconds of wall time
+"""
+from __future__ import division
+
+import ctypes
+import ctypes.util
+import sys
+import time
+
+import config_dash
+
+# Clock used by the player. Created by get_clock with config_dash.PLAYBACK_SPEED
+CLOCK = None
+# clock_gettime clock id of CLOCK_MONOTONIC on Linux
+CLOCK_MONOTONIC = 1
+
+
+class TimeSpec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def get_monotonic():
+    """ Module to get a function returning the seconds of a monotonic clock.
+        Python 2 has no time.monotonic: on Linux clock_gettime is called through ctypes.
+        Elsewhere the clock falls back to time.time, which can go back when the system time is set
+    """
+    if hasattr(time, 'monotonic'):
+        return time.monotonic
+    if sys.platform.startswith('linux'):
+        try:
+            librt = ctypes.CDLL(ctypes.util.find_library('rt') or 'libc.so.6', use_errno=True)
+            clock_gettime = librt.clock_gettime
+        except (OSError, AttributeError):
+            return time.time
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(TimeSpec)]
+        time_spec = TimeSpec()
+
+        def monotonic():
+            if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(time_spec)):
+                raise OSError(ctypes.get_errno(), "clock_gettime failed")
+            return time_spec.tv_sec + time_spec.tv_nsec / 1e9
+        return monotonic
+    return time.time
+
+
+monotonic = get_monotonic()
+
+
+class PlaybackClock(object):
+    """ Monotonic clock that runs `speed` times faster than the wall clock """
+    def __init__(self, speed=1):
+        """
+        :param speed: clock seconds per wall clock second
+        """
+        if speed <= 0:
+            raise ValueError("The clock speed must be positive: {}".format(speed))
+        self.speed = speed
+        self.start_monotonic = monotonic()
+        self.start_time = time.time()
+
+    def time(self):
+        """ :return: Seconds since the epoch. Starts at time.time() and never goes back """
+        return self.start_time + (monotonic() - self.start_monotonic) * self.speed
+
+    def wall_seconds(self, seconds):
+        """ :return: Wall clock seconds in `seconds` of the clock """
+        return seconds / self.speed
+
+    def sleep(self, seconds):
+        """ Sleep for `seconds` of the clock """
+        if seconds > 0:
+            time.sleep(seconds / self.speed)
+
+    def wait(self, condition, timeout=None):
+        """ Wait on a threading.Condition or Event for at most `timeout` seconds of the clock """
+        if timeout is None:
+            return condition.wait()
+        return condition.wait(max(timeout, 0) / self.speed)
+
+
+def get_clock():
+    """ Module to get the clock of the player """
+    global CLOCK
+    if CLOCK is None:
+        CLOCK = PlaybackClock(config_dash.PLAYBACK_SPEED)
+    return CLOCK
+
+
+def set_speed(speed):
+    """ Module to replace the clock of the player by a clock running `speed` times faster than the wall clock.
+        Components created before keep the clock they were given
+    """
+    global CLOCK
+    CLOCK = PlaybackClock(speed)
+    if config_dash.LOG:
+        config_dash.LOG.info("Playback clock speed = {}".format(speed))
+    return CLOCK
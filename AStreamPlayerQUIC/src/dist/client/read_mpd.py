@@ -5,6 +5,10 @@
 """
 from __future__ import division
 
+from array import array
+import cPickle as pickle
+import hashlib
+import os
 import re
 
 import config_dash
@@ -27,6 +31,10 @@ except ImportError:
 
 MEDIA_PRESENTATION_DURATION = 'mediaPresentationDuration'
 MIN_BUFFER_TIME = 'minBufferTime'
+# Version of the CompiledManifest format. Cached manifests of other versions are ignored
+MANIFEST_VERSION = 3
+# Compiled manifests of this process by MPD hash
+MANIFEST_CACHE = dict()
 
 
 def get_tag_name(xml_element):
@@ -85,17 +93,121 @@ class DashPlayback:
         self.playback_duration = None
         self.audio = dict()
         self.video = dict()
+        self.manifest = None
 
 
-def get_url_list(media, segment_duration,  playback_duration, bitrate):
+class SegmentSizeRow(object):
+    """ The sizes of one segment for every bitrate. Indexed by bitrate like the dict weighted_dash expects """
+    __slots__ = ('segment_sizes', 'offset')
+
+    def __init__(self, segment_sizes, offset):
+        self.segment_sizes = segment_sizes
+        self.offset = offset
+
+    def __getitem__(self, bitrate):
+        return self.segment_sizes.sizes[self.offset + self.segment_sizes.columns[bitrate]]
+
+    def __repr__(self):
+        return repr(dict((bitrate, self[bitrate]) for bitrate in self.segment_sizes.bitrates))
+
+
+class SegmentSizes(object):
+    """ The SegmentSize lists (bits) of the sorted bitrates as one dense segments x bitrates array, with the
+        cumulative sums of every bitrate so the size of any run of segments is one subtraction.
+        Only the segments listed for all the bitrates are kept. Segment indexes are the SegmentSize indexes
     """
-    Module to get the List of URLs
+    def __init__(self, bitrates, size_lists):
+        self.bitrates = tuple(bitrates)
+        self.columns = dict((bitrate, column) for column, bitrate in enumerate(self.bitrates))
+        self.segment_count = min(len(sizes) for sizes in size_lists) if size_lists else 0
+        width = len(self.bitrates)
+        # sizes[index * width + column] and cumulative[index * width + column] = sum of sizes[:index] of the column
+        self.sizes = array('d', [0]) * (self.segment_count * width)
+        self.cumulative = array('d', [0]) * ((self.segment_count + 1) * width)
+        self.average_sizes = dict()
+        for column, (bitrate, sizes) in enumerate(zip(self.bitrates, size_lists)):
+            total = 0
+            for index in range(self.segment_count):
+                self.sizes[index * width + column] = sizes[index]
+                total += sizes[index]
+                self.cumulative[(index + 1) * width + column] = total
+            # The averages are over the complete SegmentSize lists
+            self.average_sizes[bitrate] = sum(sizes) / len(sizes) if len(sizes) else 0
+
+    def size(self, index, bitrate):
+        """ :return: The size of segment index at bitrate """
+        if not 0 <= index < self.segment_count:
+            raise IndexError("segment index out of range")
+        return self.sizes[index * len(self.bitrates) + self.columns[bitrate]]
+
+    def row(self, index):
+        """ :return: The sizes of segment index for every bitrate """
+        if not 0 <= index < self.segment_count:
+            raise IndexError("segment index out of range")
+        return SegmentSizeRow(self, index * len(self.bitrates))
+
+    def window_size(self, index, count, bitrate):
+        """ :return: The size of the `count` segments from segment index at bitrate. The window stops at the last
+                     segment
+        """
+        width = len(self.bitrates)
+        column = self.columns[bitrate]
+        start = max(0, min(index, self.segment_count))
+        end = max(start, min(index + count, self.segment_count))
+        return self.cumulative[end * width + column] - self.cumulative[start * width + column]
+
+
+class CompiledManifest(object):
+    """ The video representations of an MPD, parsed once and cached on disk by the MPD content hash.
+        Segment URLs are generated on demand from the SegmentTemplate of each bitrate, so memory does not
+        grow with the number of segments.
+        Segments are numbered like the playback loop: segment `start` is the initialization segment and
+        segment `start + i` is the i-th media segment.
+    """
+    def __init__(self, mpd_hash):
+        self.mpd_hash = mpd_hash
+        self.playback_duration = None
+        self.min_buffer_time = None
+        # Playback duration of a video segment in seconds
+        self.segment_duration = None
+        # Bitrates in the order of the MPD and sorted
+        self.available_bitrates = list()
+        self.bitrates = list()
+        self.start = None
+        # Number of segments including the initialization segment
+        self.segment_count = 0
+        self.media_objects = dict()
+        # SegmentSizes of the sorted bitrates
+        self.segment_sizes = None
+        self.url_templates = dict()
+        self.initializations = dict()
+
+    def segment_url(self, segment_number, bitrate):
+        """ :return: The relative URL of the segment """
+        media_index = segment_number - self.start
+        if media_index == 0:
+            return self.initializations[bitrate]
+        return self.url_templates[bitrate] % (self.start + media_index - 1)
+
+    def fill_dash_playback(self, dashplayback):
+        """ Set the duration and the video representations of a DashPlayback object """
+        dashplayback.playback_duration = self.playback_duration
+        dashplayback.min_buffer_time = self.min_buffer_time
+        for bitrate, cached_media in self.media_objects.items():
+            media_object = MediaObject()
+            media_object.base_url = cached_media.base_url
+            media_object.start = cached_media.start
+            media_object.timescale = cached_media.timescale
+            media_object.initialization = cached_media.initialization
+            dashplayback.video[bitrate] = media_object
+        dashplayback.manifest = self
+        return dashplayback
+
+
+def get_url_template(base_url, bitrate):
+    """ Module to convert the media attribute of a SegmentTemplate into a %-format string
+        Eg: 'video_$Bandwidth$/seg_$Number%05d$.m4s' -> 'video_100000/seg_%05d.m4s'
     """
-    # Counting the init file
-    total_playback = segment_duration
-    segment_count = media.start
-    # Get the Base URL string
-    base_url = media.base_url
     if "$Bandwidth$" in base_url:
         base_url = base_url.replace("$Bandwidth$", str(bitrate))
     if "$Number" in base_url:
@@ -103,52 +215,68 @@ def get_url_list(media, segment_duration,  playback_duration, bitrate):
         base_url[1] = base_url[1].replace('$', '')
         base_url[1] = base_url[1].replace('Number', '')
         base_url = ''.join(base_url)
-    while True:
-        media.url_list.append(base_url % segment_count)
+    return base_url
+
+
+def get_media_segment_count(segment_duration, playback_duration):
+    """ Module to get the number of media segments that get_url_list generates """
+    # Counting the init file
+    total_playback = segment_duration
+    segment_count = 1
+    while total_playback <= playback_duration:
         segment_count += 1
-        if total_playback > playback_duration:
-            break
         total_playback += segment_duration
+    return segment_count
+
+
+def get_url_list(media, segment_duration,  playback_duration, bitrate):
+    """
+    Module to get the List of URLs
+    """
+    base_url = get_url_template(media.base_url, bitrate)
+    for segment_count in range(media.start, media.start + get_media_segment_count(segment_duration,
+                                                                                  playback_duration)):
+        media.url_list.append(base_url % segment_count)
     return media
 
 
-def read_mpd(mpd_file, dashplayback):
-    """ Module to read the MPD file"""
+def compile_mpd(mpd_file, mpd_hash=None):
+    """ Module to parse the MPD file into a CompiledManifest"""
     config_dash.LOG.info("Reading the MPD file")
     try:
         tree = ET.parse(mpd_file)
     except IOError:
         config_dash.LOG.error("MPD file not found. Exiting")
         return None
-    config_dash.JSON_HANDLE["video_metadata"] = {'mpd_file': mpd_file}
+    manifest = CompiledManifest(mpd_hash)
     root = tree.getroot()
     if 'MPD' in get_tag_name(root.tag).upper():
         if MEDIA_PRESENTATION_DURATION in root.attrib:
-            dashplayback.playback_duration = get_playback_time(root.attrib[MEDIA_PRESENTATION_DURATION])
-            config_dash.JSON_HANDLE["video_metadata"]['playback_duration'] = dashplayback.playback_duration
+            manifest.playback_duration = get_playback_time(root.attrib[MEDIA_PRESENTATION_DURATION])
         if MIN_BUFFER_TIME in root.attrib:
-            dashplayback.min_buffer_time = get_playback_time(root.attrib[MIN_BUFFER_TIME])
+            manifest.min_buffer_time = get_playback_time(root.attrib[MIN_BUFFER_TIME])
     child_period = root[0]
     video_segment_duration = None
+    media_object = manifest.media_objects
+    # SegmentSize lists (bits) of every bitrate
+    size_lists = dict()
     for adaptation_set in child_period:
         if 'mimeType' in adaptation_set.attrib:
             media_found = False
             if 'audio' in adaptation_set.attrib['mimeType']:
-                media_object = dashplayback.audio
                 media_found = False
                 config_dash.LOG.info("Found Audio")
             elif 'video' in adaptation_set.attrib['mimeType']:
-                media_object = dashplayback.video
                 media_found = True
                 config_dash.LOG.info("Found Video")
             if media_found:
                 config_dash.LOG.info("Retrieving Media")
-                config_dash.JSON_HANDLE["video_metadata"]['available_bitrates'] = list()
+                manifest.available_bitrates = list()
                 for representation in adaptation_set:
                     bandwidth = int(representation.attrib['bandwidth'])
-                    config_dash.JSON_HANDLE["video_metadata"]['available_bitrates'].append(bandwidth)
+                    manifest.available_bitrates.append(bandwidth)
                     media_object[bandwidth] = MediaObject()
-                    media_object[bandwidth].segment_sizes = []
+                    segment_sizes = size_lists[bandwidth] = array('d')
                     for segment_info in representation:
                         if "SegmentTemplate" in get_tag_name(segment_info.tag):
                             media_object[bandwidth].base_url = segment_info.attrib['media']
@@ -163,9 +291,72 @@ def read_mpd(mpd_file, dashplayback):
                                 except KeyError, e:
                                     config_dash.LOG.error("Error in reading Segment sizes :{}".format(e))
                                     continue
-                                media_object[bandwidth].segment_sizes.append(segment_size)
+                                segment_sizes.append(segment_size)
                             elif "SegmentTemplate" in get_tag_name(segment_info.tag):
                                 video_segment_duration = (float(segment_info.attrib['duration'])/float(
                                     segment_info.attrib['timescale']))
                                 config_dash.LOG.debug("Segment Playback Duration = {}".format(video_segment_duration))
-    return dashplayback, int(video_segment_duration)
\ No newline at end of file
+    manifest.segment_duration = int(video_segment_duration)
+    manifest.bitrates = sorted(media_object.keys())
+    for bitrate in manifest.bitrates:
+        initialization = media_object[bitrate].initialization
+        if "$Bandwidth$" in initialization:
+            initialization = initialization.replace("$Bandwidth$", str(bitrate))
+        manifest.initializations[bitrate] = initialization
+        manifest.url_templates[bitrate] = get_url_template(media_object[bitrate].base_url, bitrate)
+    # The SegmentSize lists are only kept in the matrix
+    manifest.segment_sizes = SegmentSizes(manifest.bitrates, [size_lists[bitrate] for bitrate in manifest.bitrates])
+    manifest.start = media_object[manifest.bitrates[0]].start
+    manifest.segment_count = 1 + get_media_segment_count(manifest.segment_duration, manifest.playback_duration)
+    return manifest
+
+
+def load_manifest(mpd_file):
+    """ Module to get the CompiledManifest of an MPD file.
+        Manifests are cached in memory and in config_dash.MPD_CACHE_FOLDER, keyed by the hash of the MPD content
+    """
+    try:
+        with open(mpd_file, 'rb') as mpd_file_handle:
+            mpd_hash = hashlib.sha1(mpd_file_handle.read()).hexdigest()
+    except IOError:
+        config_dash.LOG.error("MPD file not found. Exiting")
+        return None
+    if mpd_hash in MANIFEST_CACHE:
+        return MANIFEST_CACHE[mpd_hash]
+    cache_file = None
+    if config_dash.MPD_CACHE_FOLDER:
+        cache_file = os.path.join(config_dash.MPD_CACHE_FOLDER, "{}_v{}.pickle".format(mpd_hash, MANIFEST_VERSION))
+        try:
+            with open(cache_file, 'rb') as cache_file_handle:
+                manifest = pickle.load(cache_file_handle)
+            config_dash.LOG.info("Loaded the compiled MPD from {}".format(cache_file))
+            MANIFEST_CACHE[mpd_hash] = manifest
+            return manifest
+        except (IOError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            pass
+    manifest = compile_mpd(mpd_file, mpd_hash)
+    if not manifest:
+        return None
+    MANIFEST_CACHE[mpd_hash] = manifest
+    if cache_file:
+        try:
+            if not os.path.exists(config_dash.MPD_CACHE_FOLDER):
+                os.makedirs(config_dash.MPD_CACHE_FOLDER)
+            with open(cache_file, 'wb') as cache_file_handle:
+                pickle.dump(manifest, cache_file_handle, pickle.HIGHEST_PROTOCOL)
+        except (IOError, OSError), e:
+            config_dash.LOG.error("Unable to cache the compiled MPD: {}".format(e))
+    return manifest
+
+
+def read_mpd(mpd_file, dashplayback):
+    """ Module to read the MPD file"""
+    manifest = load_manifest(mpd_file)
+    if not manifest:
+        return None
+    config_dash.JSON_HANDLE["video_metadata"] = {'mpd_file': mpd_file}
+    if manifest.playback_duration is not None:
+        config_dash.JSON_HANDLE["video_metadata"]['playback_duration'] = manifest.playback_duration
+    config_dash.JSON_HANDLE["video_metadata"]['available_bitrates'] = list(manifest.available_bitrates)
+    manifest.fill_dash_playback(dashplayback)
+    return dashplayback, manifest.segment_duration
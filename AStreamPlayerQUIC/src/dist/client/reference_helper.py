@@ -0,0 +1,240 @@
+#!/usr/local/bin/python
+""" Reference transport helper: speaks the helper protocol of quic_client and LibCurlCppConsole
+    (see helper_protocol.py) over HTTP/1.1, so the protocol and the timing records can be tested without the
+    C++ builds. The helper reads one URL per line from stdin and keeps the keep-alive connections of each origin.
+    For every URL it prints the timing record and the result frame; 'exit' ends the helper.
+    With -t the helper takes tagged requests ('<request id> <url>' lines) and downloads them concurrently, each on
+    an idle connection of the origin or a new one, and answers with the timing records in completion order.
+
+    From commandline:
+    python reference_helper.py [-f FOLDER] [-k] [-t]
+    eg: config_dash.CURL_CLIENT_CMD = "python reference_helper.py -t"
+"""
+from __future__ import division
+
+from argparse import ArgumentParser
+import httplib
+import os
+import socket
+import ssl
+import sys
+import threading
+import time
+import urlparse
+
+EXIT_COMMAND = "exit"
+TAGGED_CAPABILITY = "tagged"
+READ_SIZE = 64 * 1024
+# Seconds without progress before a request fails, like the CURLOPT_TIMEOUT of LibCurlCppConsole
+REQUEST_TIMEOUT = 5
+# Error code of the failures that have no errno or HTTP status
+UNKNOWN_ERROR = 1
+
+
+class TimedConnection(object):
+    """ Keep-alive connection to one origin. The TCP connect and the TLS handshake are timed separately """
+    def __init__(self, scheme, host, port, verify=True):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.verify = verify
+        self.connection = None
+        self.origin = (scheme, host, port)
+
+    def connect(self):
+        """ Open the connection
+        :return: (connect, handshake) in seconds
+        """
+        start_time = time.time()
+        sock = socket.create_connection((self.host, self.port), REQUEST_TIMEOUT)
+        connect_time = time.time() - start_time
+        handshake_time = 0
+        if self.scheme == 'https':
+            context = ssl.create_default_context()
+            if not self.verify:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            start_time = time.time()
+            sock = context.wrap_socket(sock, server_hostname=self.host)
+            handshake_time = time.time() - start_time
+        self.connection = httplib.HTTPConnection(self.host, self.port, timeout=REQUEST_TIMEOUT)
+        self.connection.sock = sock
+        return connect_time, handshake_time
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    def get(self, path, sink):
+        """ Send a GET request and pass the body to sink
+        :return: (status, size, ttfb, transfer). ttfb counts until the response headers have been read
+        """
+        start_time = time.time()
+        self.connection.request('GET', path)
+        response = self.connection.getresponse()
+        first_byte_time = time.time()
+        size = 0
+        while True:
+            data = response.read(READ_SIZE)
+            if not data:
+                break
+            size += len(data)
+            sink(data)
+        transfer_time = time.time() - first_byte_time
+        if response.will_close:
+            self.close()
+        return response.status, size, first_byte_time - start_time, transfer_time
+
+
+def format_seconds(seconds):
+    """ Module to format a phase of the timing record. '-' if the phase did not happen """
+    return "-" if seconds is None else "{:.6f}".format(seconds)
+
+
+class ReferenceHelper(object):
+    """ Downloads the requested URLs and prints the results in the helper protocol """
+    def __init__(self, folder=None, verify=True, output=sys.stdout, tagged=False):
+        self.folder = folder
+        self.verify = verify
+        self.output = output
+        self.tagged = tagged
+        # Idle keep-alive connections by origin
+        self.connections = dict()
+        self.request_count = 0
+        # Guards the connections and the output, which the downloads of tagged requests share
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def get_connection(self, parsed_url):
+        """ :return: (connection, connect, handshake). Reused connections have 0 connect and handshake times """
+        port = parsed_url.port or (443 if parsed_url.scheme == 'https' else 80)
+        with self.lock:
+            idle = self.connections.setdefault((parsed_url.scheme, parsed_url.hostname, port), [])
+            while idle:
+                connection = idle.pop()
+                if connection.connection:
+                    return connection, 0, 0
+        connection = TimedConnection(parsed_url.scheme, parsed_url.hostname, port, self.verify)
+        connect_time, handshake_time = connection.connect()
+        return connection, connect_time, handshake_time
+
+    def release(self, connection):
+        """ Keep a connection for the next request to its origin, unless it has been closed """
+        if connection.connection:
+            with self.lock:
+                self.connections[connection.origin].append(connection)
+
+    def download(self, url):
+        """ Module to download url
+        :return: timing record fields: dict with bytes, connect, handshake, ttfb, transfer and error
+        """
+        parsed_url = urlparse.urlparse(url)
+        path = parsed_url.path or "/"
+        if parsed_url.query:
+            path += "?" + parsed_url.query
+        segment_file = None
+        if self.folder:
+            segment_file = open(os.path.join(self.folder, os.path.basename(parsed_url.path)), 'wb')
+        sink = segment_file.write if segment_file else lambda data: None
+        result = {'bytes': -1, 'connect': None, 'handshake': None, 'ttfb': None, 'transfer': None, 'error': 0}
+        connection = None
+        try:
+            # A keep-alive connection closed by the server fails on the first attempt. It is opened again once
+            for attempt in range(2):
+                connection, result['connect'], result['handshake'] = self.get_connection(parsed_url)
+                reused = result['connect'] == 0 and result['handshake'] == 0
+                try:
+                    status, size, result['ttfb'], result['transfer'] = connection.get(path, sink)
+                    break
+                except (httplib.BadStatusLine, socket.error):
+                    connection.close()
+                    if not reused or attempt:
+                        raise
+            if 200 <= status < 300:
+                result['bytes'] = size
+            else:
+                result['error'] = status
+        except (socket.error, ssl.SSLError, httplib.HTTPException, IOError) as error:
+            result['error'] = getattr(error, 'errno', None) or UNKNOWN_ERROR
+            if connection:
+                connection.close()
+        finally:
+            if connection:
+                self.release(connection)
+            if segment_file:
+                segment_file.close()
+        return result
+
+    def write_result(self, request_id, result):
+        """ Print the timing record of a request, followed by the result frame unless the requests are tagged """
+        lines = ["result_v1 id={} bytes={} connect={} handshake={} ttfb={} transfer={} error={}\n".format(
+            request_id, result['bytes'], format_seconds(result['connect']), format_seconds(result['handshake']),
+            format_seconds(result['ttfb']), format_seconds(result['transfer']), result['error'])]
+        if not self.tagged and result['error']:
+            lines.append("file_size_start:-1:file_size_end Request failed ({}).\n".format(result['error']))
+        elif not self.tagged:
+            lines.append("file_size_start:{}:file_size_end Request succeeded (200).\n".format(result['bytes']))
+        with self.lock:
+            self.output.write("".join(lines))
+            self.output.flush()
+
+    def serve(self, request_id, url):
+        """ Download url and print its result """
+        self.write_result(request_id, self.download(url))
+
+    def submit(self, line):
+        """ Start the download of a tagged request line in its own thread """
+        words = line.split()
+        if len(words) != 2 or not words[0].isdigit():
+            with self.lock:
+                self.output.write("ERROR Invalid tagged request: {}\n".format(line.strip()))
+                self.output.flush()
+            return
+        self.threads = [thread for thread in self.threads if thread.is_alive()]
+        thread = threading.Thread(target=self.serve, args=(int(words[0]), words[1]))
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+
+    def run(self, requests=sys.stdin):
+        """ Serve the URLs read from requests until the exit command or the end of the input.
+            The downloads in flight are completed before the helper exits
+        """
+        self.output.write("started at {}{}\n".format(time.ctime(), " " + TAGGED_CAPABILITY if self.tagged else ""))
+        self.output.flush()
+        for line in iter(requests.readline, ''):
+            if self.tagged:
+                if line.strip() == EXIT_COMMAND:
+                    break
+                if line.strip():
+                    self.submit(line)
+                continue
+            # Like the C++ helpers, every word of the input is a request
+            for url in line.split():
+                if url == EXIT_COMMAND:
+                    return self.exit()
+                self.request_count += 1
+                self.serve(self.request_count, url)
+        self.exit()
+
+    def exit(self):
+        """ Wait for the downloads in flight and say goodbye """
+        for thread in self.threads:
+            thread.join()
+        self.output.write("Exiting...\n")
+        self.output.flush()
+
+
+def main():
+    parser = ArgumentParser(description="Reference transport helper")
+    parser.add_argument('-f', '--folder', help="Folder to save the segments in. Otherwise they are only measured")
+    parser.add_argument('-k', '--insecure', action='store_true', help="Do not verify the server certificates")
+    parser.add_argument('-t', '--tagged', action='store_true',
+                        help="Take tagged requests ('<request id> <url>') and download them concurrently")
+    args = parser.parse_args()
+    ReferenceHelper(args.folder, not args.insecure, tagged=args.tagged).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
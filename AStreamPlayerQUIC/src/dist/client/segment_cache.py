@@ -0,0 +1,185 @@
+""" Module with the local cache of the downloaded segments (dash_client.py -cache).
+    A jump back in the video (eg: -js "150->40") or another run over the same video requests segments that were
+    downloaded moments ago. SegmentCache keeps their data on disk, keyed by (MPD hash, bitrate, segment number),
+    so these requests are served locally. The cache is bounded by the total size of the files: the least
+    recently used segments are evicted first.
+
+    A segment is written as a temporary file while it downloads (CacheWriter) and only enters the cache once it
+    is complete. The index is rebuilt from the files of the folder when a cache is opened: the modification time
+    of a file is its last use, so the cache survives across processes.
+
+    Usage:
+        cache = SegmentCache("ASTREAM_SEGMENT_CACHE/", 512 * 1024 * 1024)
+        cached = cache.get(key)                 # (segment_filename, segment_size) or None
+        writer = cache.writer(key)
+        writer.write(data)
+        writer.commit()                         # or writer.discard() for an incomplete segment
+"""
+from collections import OrderedDict
+import errno
+import os
+import shutil
+import tempfile
+import threading
+
+import config_dash
+
+TEMP_PREFIX = ".part_"
+# Separator of the fields of the key in the file names
+KEY_SEPARATOR = "_"
+
+
+def get_cache_key(mpd_hash, bitrate, segment_number):
+    """ Module to get the cache key of a segment. None if the MPD has no hash """
+    if not mpd_hash:
+        return None
+    return mpd_hash, int(bitrate), int(segment_number)
+
+
+class CacheWriter(object):
+    """ Writes a downloading segment to a temporary file of the cache """
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        file_descriptor, self.temp_filename = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=cache.folder)
+        self.temp_file_handle = os.fdopen(file_descriptor, 'wb')
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        self.temp_file_handle.write(data)
+
+    def commit(self):
+        """ Add the complete segment to the cache """
+        self.temp_file_handle.close()
+        self.cache.add(self.key, self.temp_filename, self.size)
+
+    def discard(self):
+        """ Drop an incomplete segment """
+        self.temp_file_handle.close()
+        remove_file(self.temp_filename)
+
+
+def remove_file(filename):
+    """ Module to remove a file. Files already removed (eg: by another process) are ignored """
+    try:
+        os.remove(filename)
+    except OSError as error:
+        if error.errno != errno.ENOENT:
+            raise
+
+
+class SegmentCache(object):
+    """ Segment files on disk, bounded by their total size, with least recently used eviction """
+    def __init__(self, folder, max_size):
+        """
+        :param folder: folder of the cache files. Created if it does not exist
+        :param max_size: maximum total size of the cached segments in bytes
+        """
+        self.folder = folder
+        self.max_size = max_size
+        # Cached segments from the least to the most recently used: key -> size in bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        # Statistics of the cache since it was opened
+        self.hits = self.misses = self.evictions = 0
+        # The downloads of the prefetcher add their segments from several threads
+        self.lock = threading.Lock()
+        try:
+            os.makedirs(folder)
+        except OSError as error:
+            if error.errno != errno.EEXIST or not os.path.isdir(folder):
+                raise
+        self.load()
+
+    def get_filename(self, key):
+        return os.path.join(self.folder, KEY_SEPARATOR.join(str(field) for field in key))
+
+    def load(self):
+        """ Rebuild the index from the files of the folder. Temporary files left by a killed run are removed """
+        files = list()
+        for filename in os.listdir(self.folder):
+            path = os.path.join(self.folder, filename)
+            if filename.startswith(TEMP_PREFIX):
+                remove_file(path)
+                continue
+            fields = filename.split(KEY_SEPARATOR)
+            if len(fields) != 3 or not fields[1].isdigit() or not fields[2].isdigit():
+                continue
+            try:
+                status = os.stat(path)
+            except OSError:
+                continue
+            files.append((status.st_mtime, (fields[0], int(fields[1]), int(fields[2])), status.st_size))
+        with self.lock:
+            for _, key, size in sorted(files):
+                self.entries[key] = size
+                self.size += size
+            self.evict()
+        config_dash.LOG.info("Segment cache {}: {} segments, {} bytes".format(
+            self.folder, len(self.entries), self.size))
+
+    def get(self, key):
+        """ Look up a segment and mark it as the most recently used
+        :return: (segment_filename, segment_size), or None if the segment is not cached
+        """
+        filename = self.get_filename(key)
+        with self.lock:
+            size = self.entries.pop(key, None)
+            if size is not None:
+                try:
+                    os.utime(filename, None)
+                except OSError:
+                    # Evicted by another process sharing the folder
+                    self.size -= size
+                    size = None
+            if size is None:
+                self.misses += 1
+                return None
+            self.entries[key] = size
+            self.hits += 1
+        return filename, size
+
+    def writer(self, key):
+        """ :return: CacheWriter to add the segment of key while it downloads """
+        return CacheWriter(self, key)
+
+    def put_file(self, key, segment_filename):
+        """ Add a copy of a downloaded segment file """
+        writer = self.writer(key)
+        try:
+            with open(segment_filename, 'rb') as segment_file_handle:
+                shutil.copyfileobj(segment_file_handle, writer)
+        except IOError as error:
+            writer.discard()
+            config_dash.LOG.error("Unable to cache the segment {}: {}".format(segment_filename, error))
+            return
+        writer.commit()
+
+    def add(self, key, temp_filename, size):
+        """ Move a complete temporary file into the cache and evict the least recently used segments.
+            Segments larger than the whole cache are not kept
+        """
+        if size > self.max_size:
+            remove_file(temp_filename)
+            return
+        with self.lock:
+            os.rename(temp_filename, self.get_filename(key))
+            self.size -= self.entries.pop(key, 0)
+            self.entries[key] = size
+            self.size += size
+            self.evict()
+
+    def evict(self):
+        """ Remove the least recently used segments until the cache fits in max_size. Called with self.lock held """
+        while self.size > self.max_size and self.entries:
+            key, size = self.entries.popitem(last=False)
+            remove_file(self.get_filename(key))
+            self.size -= size
+            self.evictions += 1
+
+    def get_stats(self):
+        """ :return: dict with the hits, misses and evictions since the cache was opened, and its size """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'segments': len(self.entries), 'bytes': self.size}
@@ -0,0 +1,172 @@
+""" Module to pipeline the segment downloads.
+    SegmentPrefetcher keeps up to `window` segment requests in flight and hands them back in the order
+    they were requested, so segments still reach the player buffer in sequence.
+    With a window of 1 the download runs in the calling thread, exactly like a plain download_segment call.
+    With a progress function, the downloads report their progress while they run and can be abandoned, eg: to
+    request the segment again at a lower bitrate (switch).
+    Segments available locally (eg: in the segment cache) are queued already complete, in their place (complete).
+"""
+from __future__ import division
+
+from collections import deque
+import sys
+import threading
+
+import playback_clock
+
+
+class SegmentRequest(object):
+    """ One segment download and its result """
+    def __init__(self, segment_number, bitrate, segment_url, fetch_args):
+        self.segment_number = segment_number
+        self.bitrate = bitrate
+        self.segment_url = segment_url
+        self.fetch_args = fetch_args
+        self.segment_size = None
+        self.segment_filename = None
+        # Timing record reported by the transport (helper_protocol.parse_timing), None if there is none
+        self.timing = None
+        # Time on the playback clock from the first attempt until the segment was downloaded, including retries
+        self.start_time = None
+        self.download_time = None
+        self.error = None
+        self.done = threading.Event()
+        # Start of the current attempt, and the last progress of the download: bytes and seconds since the start
+        self.attempt_start_time = None
+        self.downloaded_size = 0
+        self.progress_time = 0
+        # Set when the progress function abandoned the download, with the bitrate it chose (if any)
+        self.abandoned = False
+        self.lower_bitrate = None
+        # Set when the request was dropped (discard): its download stops at the next progress report
+        self.discarded = False
+        # Set for the segments that were not downloaded (complete)
+        self.cached = False
+
+
+class SegmentPrefetcher(object):
+    """ Runs the segment downloads with at most `window` requests in flight """
+    def __init__(self, fetch, window=1, clock=None, progress=None):
+        """
+        :param fetch: function called with the fetch_args of a request.
+                      Returns (segment_size, segment_filename, timing)
+        :param window: number of requests kept in flight
+        :param clock: PlaybackClock timing the downloads. Default playback_clock.get_clock()
+        :param progress: function called as progress(request, downloaded_size, elapsed_time, requests_ahead) while
+                         a segment downloads. requests_ahead is the number of requests handed back before it.
+                         Returning True abandons the download. fetch is then called with a progress keyword
+                         argument: a function of the downloaded bytes that returns True to stop the download
+        """
+        self.fetch = fetch
+        self.clock = clock or playback_clock.get_clock()
+        self.window = max(int(window), 1)
+        self.requests = deque()
+        self.progress = progress
+        # Orders the progress reports with discard, so no report of a dropped request follows it
+        self.lock = threading.Lock()
+
+    def in_flight(self):
+        """ :return: Number of requests that have not been handed back yet """
+        return len(self.requests)
+
+    def is_full(self):
+        return len(self.requests) >= self.window
+
+    def submit(self, segment_number, bitrate, segment_url, *fetch_args):
+        """ Start downloading a segment. Returns the SegmentRequest """
+        request = SegmentRequest(segment_number, bitrate, segment_url, fetch_args)
+        self.requests.append(request)
+        self.start(request)
+        return request
+
+    def complete(self, segment_number, bitrate, segment_url, segment_size, segment_filename):
+        """ Queue a segment that is already available locally. It is handed back in its place, without a download
+        """
+        request = SegmentRequest(segment_number, bitrate, segment_url, ())
+        request.segment_size = segment_size
+        request.segment_filename = segment_filename
+        request.cached = True
+        request.download_time = 0
+        request.done.set()
+        self.requests.append(request)
+        return request
+
+    def start(self, request):
+        if self.window == 1:
+            self.run(request)
+        else:
+            download_thread = threading.Thread(target=self.run, args=(request,))
+            download_thread.daemon = True
+            download_thread.start()
+
+    def run(self, request):
+        request.attempt_start_time = self.clock.time()
+        if request.start_time is None:
+            request.start_time = request.attempt_start_time
+        fetch_kwargs = dict()
+        if self.progress:
+            fetch_kwargs['progress'] = lambda downloaded_size: self.report(request, downloaded_size)
+        try:
+            request.segment_size, request.segment_filename, request.timing = self.fetch(*request.fetch_args,
+                                                                                         **fetch_kwargs)
+        except Exception:
+            request.error = sys.exc_info()
+        request.download_time = self.clock.time() - request.start_time
+        request.done.set()
+
+    def report(self, request, downloaded_size):
+        """ Pass the progress of a download to the progress function
+        :return: True to abandon the download
+        """
+        with self.lock:
+            if request.discarded:
+                # Nobody waits for the segment any more
+                return True
+            request.downloaded_size = downloaded_size
+            request.progress_time = self.clock.time() - request.attempt_start_time
+            try:
+                requests_ahead = max(request.segment_number - self.requests[0].segment_number, 0)
+            except IndexError:
+                requests_ahead = 0
+            request.abandoned = bool(self.progress(request, downloaded_size, request.progress_time, requests_ahead))
+            return request.abandoned
+
+    def next_completed(self):
+        """ Wait for the oldest request in flight and return it.
+            Exceptions raised by the download are raised again here
+        """
+        request = self.requests.popleft()
+        request.done.wait()
+        if request.error:
+            error_type, error_value, error_traceback = request.error
+            raise error_type, error_value, error_traceback
+        return request
+
+    def retry(self, request, *fetch_args):
+        """ Download a failed request again. It keeps its place at the head of the queue """
+        request.fetch_args = fetch_args
+        request.error = None
+        request.abandoned = False
+        request.done.clear()
+        self.requests.appendleft(request)
+        self.start(request)
+
+    def switch(self, request, bitrate, segment_url, *fetch_args):
+        """ Request an abandoned segment again at another bitrate. Its download time starts again """
+        request.bitrate = bitrate
+        request.segment_url = segment_url
+        request.start_time = None
+        request.lower_bitrate = None
+        self.retry(request, *fetch_args)
+
+    def discard(self):
+        """ Forget all the requests in flight (eg: after a jump). Their results are ignored, and the downloads that
+            report their progress are stopped
+        :return: Number of discarded requests
+        """
+        with self.lock:
+            discarded = len(self.requests)
+            for request in self.requests:
+                request.discarded = True
+            self.requests.clear()
+        return discarded
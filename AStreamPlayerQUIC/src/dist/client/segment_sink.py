@@ -0,0 +1,45 @@
+""" Module with the destinations of the downloaded segment data.
+    FileSink writes the segment to a file (DOWNLOAD mode).
+    MeasureSink only counts the bytes, and optionally hashes them, without touching the disk.
+
+    Both have the same interface:
+        sink.write(data)
+        data_reference = sink.close()
+"""
+import hashlib
+
+
+class FileSink(object):
+    """ Writes the segment data to segment_filename. The folder must exist """
+    def __init__(self, segment_filename):
+        self.segment_filename = segment_filename
+        self.segment_file_handle = open(segment_filename, 'wb')
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        self.segment_file_handle.write(data)
+
+    def close(self):
+        """ :return: The name of the segment file """
+        self.segment_file_handle.close()
+        return self.segment_filename
+
+
+class MeasureSink(object):
+    """ Counts the segment bytes straight from the receive buffer """
+    def __init__(self, hash_name=None):
+        """ :param hash_name: hashlib algorithm (eg: 'sha1') to digest the data with. None to only count bytes """
+        self.size = 0
+        self.digest = hashlib.new(hash_name) if hash_name else None
+
+    def write(self, data):
+        self.size += len(data)
+        if self.digest:
+            self.digest.update(data)
+
+    def close(self):
+        """ :return: The hex digest of the segment data or None if hashing is disabled """
+        if self.digest:
+            return self.digest.hexdigest()
+        return None
@@ -0,0 +1,386 @@
+#!/usr/local/bin/python
+""" Offline, trace driven simulation of a playback session.
+    The segment downloads follow a throughput trace and the player buffer is modelled like
+    dash_buffer.DashPlayer, all in virtual time. The bitrates are chosen by the same BitrateSelector
+    (and adaptation functions) as the live player, and the buffer CSV and the JSON log have the same format.
+    The times in the logs are virtual seconds since the start of the session.
+
+    Trace file: one line per interval, '<start time in seconds> <throughput>', or only '<throughput>'
+    for one second intervals. Throughputs are in Kbps (see config_dash.SIM_TRACE_SCALE).
+    The trace repeats if the session outlasts it.
+
+    From commandline:
+    python simulator.py -m BigBuckBunny_2s.mpd -t trace.txt -p sara
+"""
+from __future__ import division
+
+from argparse import ArgumentParser
+from bisect import bisect_left, bisect_right
+from collections import deque
+import logging
+import os
+import sys
+import timeit
+
+from bitrate_selector import BitrateSelector
+from buffered_csv_writer import BufferedCsvWriter
+import config_dash
+from configure_log_file import configure_log_file, write_json
+from dash_buffer import BUFFER_LOG_HEADER, format_timing
+import read_mpd
+
+PLAYBACK_TYPES = {'basic': 'BASIC', 'sara': 'SMART', 'netflix': 'NETFLIX', 'mpc': 'MPC'}
+
+
+class ThroughputTrace(object):
+    """ Piecewise constant throughput. The trace repeats after its last interval """
+    def __init__(self, timestamps, throughputs):
+        """
+        :param timestamps: start time of each interval in seconds, increasing
+        :param throughputs: throughput of each interval in bytes per second
+        """
+        if not throughputs or len(timestamps) != len(throughputs):
+            raise ValueError("The trace needs one throughput for each timestamp")
+        # The intervals start at 0 and the last interval is as long as the one before it
+        self.boundaries = [timestamp - timestamps[0] for timestamp in timestamps]
+        if len(self.boundaries) > 1:
+            self.boundaries.append(self.boundaries[-1] + self.boundaries[-1] - self.boundaries[-2])
+        else:
+            self.boundaries.append(1)
+        self.throughputs = list(throughputs)
+        # Bytes transferred from the start of the trace to each boundary
+        self.cumulative_bytes = [0]
+        for index, throughput in enumerate(self.throughputs):
+            self.cumulative_bytes.append(self.cumulative_bytes[-1] +
+                                         throughput * (self.boundaries[index + 1] - self.boundaries[index]))
+        self.duration = self.boundaries[-1]
+        self.cycle_bytes = self.cumulative_bytes[-1]
+        if self.cycle_bytes <= 0:
+            raise ValueError("The trace has no throughput")
+
+    def bytes_until(self, time):
+        """ :return: Bytes transferred from the start of the trace until time """
+        cycles, offset = divmod(time, self.duration)
+        index = min(bisect_right(self.boundaries, offset) - 1, len(self.throughputs) - 1)
+        return (cycles * self.cycle_bytes + self.cumulative_bytes[index] +
+                self.throughputs[index] * (offset - self.boundaries[index]))
+
+    def time_at(self, transferred):
+        """ :return: The earliest time at which `transferred` bytes have been transferred """
+        cycles, remaining = divmod(transferred, self.cycle_bytes)
+        if not remaining:
+            return cycles * self.duration
+        index = bisect_left(self.cumulative_bytes, remaining) - 1
+        return (cycles * self.duration + self.boundaries[index] +
+                (remaining - self.cumulative_bytes[index]) / self.throughputs[index])
+
+    def download_time(self, start_time, size):
+        """ :return: Seconds needed to download size bytes starting at start_time """
+        return self.time_at(self.bytes_until(start_time) + size) - start_time
+
+
+def load_trace(trace_file, scale=config_dash.SIM_TRACE_SCALE):
+    """ Module to read a throughput trace file
+    :param scale: factor to convert the throughputs of the file to bytes per second
+    :return: ThroughputTrace
+    """
+    timestamps = list()
+    throughputs = list()
+    with open(trace_file) as trace_file_handle:
+        for line in trace_file_handle:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            if len(fields) == 1:
+                timestamps.append(len(timestamps))
+                throughputs.append(float(fields[0]) * scale)
+            else:
+                timestamps.append(float(fields[0]))
+                throughputs.append(float(fields[1]) * scale)
+    return ThroughputTrace(timestamps, throughputs)
+
+
+class SimulatedBuffer(object):
+    """ The segments in the player buffer. qsize() like the Queue of DashPlayer """
+    def __init__(self):
+        self.segments = deque()
+
+    def qsize(self):
+        return len(self.segments)
+
+
+class SimulatedPlayer(object):
+    """ Virtual time model of dash_buffer.DashPlayer.
+        A segment leaves the buffer when its playback starts, like in DashPlayer.
+        No buffer log is written when connection_type is None.
+    """
+    def __init__(self, video_length, segment_duration, connection_type):
+        self.playback_duration = video_length
+        self.segment_duration = segment_duration
+        self.playback_state = "INITIALIZED"
+        # Virtual time of the player and played video in seconds
+        self.time = 0.0
+        self.playback_time = 0.0
+        self.actual_start_time = None
+        self.initial_buffer = config_dash.INITIAL_BUFFERING_COUNT
+        self.alpha = config_dash.ALPHA_BUFFER_COUNT
+        self.beta = config_dash.BETA_BUFFER_COUNT
+        self.segment_limit = None
+        self.buffer = SimulatedBuffer()
+        # Segment being played, its playback length and the times its playback started and ends
+        self.current_segment = None
+        self.segment_length = 0
+        self.segment_start_time = None
+        self.segment_end_time = None
+        self.interruption_start = None
+        self.buffer_log_file = self.buffer_log = None
+        if connection_type:
+            self.buffer_log_file = config_dash.BUFFER_LOG_FILENAME + "_" + connection_type + ".csv"
+            self.buffer_log = BufferedCsvWriter(self.buffer_log_file, BUFFER_LOG_HEADER,
+                                                flush_rows=config_dash.BUFFER_LOG_FLUSH_ROWS, flush_interval=None)
+
+    def start(self):
+        self.playback_state = "INITIAL_BUFFERING"
+        self.log_entry("Starting")
+        self.log_entry(action="Starting")
+
+    def advance(self, now):
+        """ Play the buffered segments until the virtual time now """
+        while self.playback_state == "PLAY":
+            if self.current_segment:
+                if self.segment_end_time > now:
+                    break
+                # The lengths are added rather than the time differences, which do not sum exactly
+                self.playback_time += self.segment_length
+                self.time = self.segment_end_time
+                segment_number = self.current_segment['segment_number']
+                self.current_segment = None
+                if self.playback_time >= self.playback_duration:
+                    self.playback_state = "END"
+                    self.log_entry("TheEnd")
+                elif self.segment_limit and int(segment_number) >= self.segment_limit:
+                    self.playback_state = "STOP"
+                    self.log_entry("Stopped")
+                continue
+            if self.playback_time >= self.playback_duration:
+                self.playback_state = "END"
+                self.log_entry("Play-End")
+            elif not self.buffer.qsize():
+                self.playback_state = "BUFFERING"
+                self.log_entry("Play-Buffering")
+                self.interruption_start = self.time
+                config_dash.JSON_HANDLE['playback_info']['interruptions']['count'] += 1
+            else:
+                self.current_segment = self.buffer.segments.popleft()
+                self.segment_start_time = self.time
+                self.segment_length = min(self.current_segment['playback_length'],
+                                          self.playback_duration - self.playback_time)
+                self.segment_end_time = self.time + self.segment_length
+                self.log_entry(action="StillPlaying", bitrate=self.current_segment['bitrate'])
+        self.time = max(self.time, now)
+
+    def write(self, segment, now):
+        """ Add a segment that finished downloading at the virtual time now """
+        self.advance(now)
+        if self.actual_start_time is None:
+            self.actual_start_time = now
+        self.buffer.segments.append(segment)
+        self.log_entry(action="Writing", bitrate=segment['bitrate'])
+        if self.playback_state == "INITIAL_BUFFERING":
+            if self.buffer.qsize() >= config_dash.INITIAL_BUFFERING_COUNT:
+                config_dash.JSON_HANDLE['playback_info']['initial_buffering_duration'] = now
+                self.playback_state = "PLAY"
+                self.log_entry("InitialBuffering-Play")
+        elif self.playback_state == "BUFFERING":
+            remaining_playback_time = self.playback_duration - self.playback_time
+            if ((self.buffer.qsize() >= config_dash.RE_BUFFERING_COUNT) or (
+                    config_dash.RE_BUFFERING_COUNT * self.segment_duration >= remaining_playback_time
+                    and self.buffer.qsize() > 0)):
+                interruptions = config_dash.JSON_HANDLE['playback_info']['interruptions']
+                interruptions['events'].append((self.interruption_start, now))
+                interruptions['total_duration'] += now - self.interruption_start
+                self.playback_state = "PLAY"
+                self.log_entry("Buffering-Play")
+        self.advance(now)
+
+    def buffer_level(self):
+        """ :return: Seconds of video waiting in the buffer, like DashPlayer.buffer_level """
+        return self.buffer.qsize() * self.segment_duration
+
+    def wait_for_buffer_level(self, level, now):
+        """ Play from the virtual time now until at most `level` seconds of video wait in the buffer or the
+            playback is not playing, like DashPlayer.wait_for_buffer_level
+        :return: The virtual time at which the wait ends
+        """
+        self.advance(now)
+        while self.playback_state == "PLAY" and self.current_segment and self.buffer_level() > level:
+            self.advance(self.segment_end_time)
+        return self.time
+
+    def finish(self):
+        """ Play the rest of the buffer. Returns the virtual time at which the playback ended """
+        while self.playback_state == "PLAY":
+            self.advance(self.segment_end_time if self.current_segment else self.time)
+        return self.time
+
+    def current_playback_time(self):
+        """ :return: Seconds of video played until the virtual time of the player """
+        if self.current_segment:
+            return self.playback_time + self.time - self.segment_start_time
+        return self.playback_time
+
+    def close_log(self):
+        if self.buffer_log:
+            self.buffer_log.close()
+
+    def log_entry(self, action, bitrate=0):
+        """ Buffer log row in the format of DashPlayer.log_entry """
+        if not self.buffer_log:
+            return
+        if self.actual_start_time is not None:
+            log_time = self.time - self.actual_start_time
+        else:
+            log_time = 0
+        stats = (int(round(log_time * 1000)), "{:.3f}".format(self.current_playback_time()), self.buffer.qsize(),
+                 self.playback_state, action, bitrate)
+        # The simulated downloads have no phases
+        self.buffer_log.writerow([str(i) for i in stats] + format_timing(None))
+
+
+def get_segment_size(dp_object, segment_number, bitrate):
+    """ Module to get the size in bytes of a segment from the MPD.
+        Segments without a SegmentSize are assumed to be encoded at exactly the bitrate
+    """
+    manifest = dp_object.manifest
+    media_index = segment_number - manifest.start
+    if media_index == 0:
+        return config_dash.SIM_INIT_SEGMENT_SIZE
+    segment_sizes = manifest.segment_sizes
+    if media_index <= segment_sizes.segment_count:
+        # The MPD sizes are in bits
+        return segment_sizes.size(media_index - 1, bitrate) / 8
+    return bitrate * manifest.segment_duration / 8
+
+
+def reset_playback_info():
+    """ Module to clear the playback metrics of the JSON log before a simulation """
+    config_dash.JSON_HANDLE['playback_info'] = {'start_time': None,
+                                                'end_time': None,
+                                                'initial_buffering_duration': None,
+                                                'interruptions': {'count': 0, 'events': list(), 'total_duration': 0},
+                                                'up_shifts': 0,
+                                                'down_shifts': 0
+                                                }
+    config_dash.JSON_HANDLE['segment_info'] = list()
+
+
+def simulate(dp_object, video_segment_duration, trace, playback_type, connection_type="SIM", segment_limit=None,
+             request_latency=config_dash.SIM_REQUEST_LATENCY):
+    """ Module to simulate start_playback_smart over a throughput trace
+    :param dp_object: DashPlayback from read_mpd.read_mpd
+    :param trace: ThroughputTrace
+    :param playback_type: 'BASIC', 'SMART', 'NETFLIX' or 'MPC'
+    :param connection_type: suffix of the buffer log. None to write neither the buffer log nor the JSON log
+    :param request_latency: seconds added to every download (eg: the RTT)
+    :return: (playback_time, total_downloaded, session_duration) in seconds, bytes and virtual seconds
+    """
+    reset_playback_info()
+    config_dash.JSON_HANDLE['playback_type'] = playback_type.lower()
+    manifest = dp_object.manifest
+    player = SimulatedPlayer(dp_object.playback_duration, video_segment_duration, connection_type)
+    player.segment_limit = segment_limit
+    player.start()
+    selector = BitrateSelector(playback_type, dp_object)
+    now = 0.0
+    segment_duration = 0
+    previous_bitrate = None
+    total_downloaded = 0
+    for segment_number in range(1, manifest.segment_count + 1):
+        if segment_limit and segment_number > segment_limit:
+            break
+        player.advance(now)
+        if not previous_bitrate:
+            previous_bitrate = selector.current_bitrate
+        bitrate, delay, requests_done = selector.select(segment_number, player, segment_duration)
+        if requests_done:
+            break
+        if delay:
+            # The request goes out once the buffer has drained by delay segments
+            now = player.wait_for_buffer_level(max(player.buffer.qsize() - delay, 0) * player.segment_duration,
+                                               now)
+        segment_size = get_segment_size(dp_object, segment_number, bitrate)
+        segment_download_time = trace.download_time(now, segment_size) + request_latency
+        now += segment_download_time
+        selector.update(segment_size, segment_download_time)
+        segment_name = os.path.split(manifest.segment_url(segment_number, bitrate))[1]
+        # Same fields as the live records. The simulated downloads have no timing
+        config_dash.JSON_HANDLE["segment_info"].append((segment_name, bitrate, segment_size, segment_download_time,
+                                                        None))
+        total_downloaded += segment_size
+        if previous_bitrate < bitrate:
+            config_dash.JSON_HANDLE['playback_info']['up_shifts'] += 1
+        elif previous_bitrate > bitrate:
+            config_dash.JSON_HANDLE['playback_info']['down_shifts'] += 1
+        previous_bitrate = bitrate
+        segment_duration = video_segment_duration
+        player.write({'playback_length': video_segment_duration,
+                      'size': segment_size,
+                      'bitrate': bitrate,
+                      'data': None,
+                      'URI': segment_name,
+                      'segment_number': segment_number}, now)
+    session_duration = player.finish()
+    player.close_log()
+    if connection_type:
+        write_json()
+    return player.playback_time, total_downloaded, session_duration
+
+
+def create_arguments(parser):
+    """ Adding arguments to the parser """
+    parser.add_argument('-m', '--MPD', required=True,
+                        help="MPD file")
+    parser.add_argument('-t', '--TRACE', required=True,
+                        help="Throughput trace file")
+    parser.add_argument('-p', '--PLAYBACK', default='sara',
+                        help="Playback type (basic, sara, netflix or mpc)")
+    parser.add_argument('-n', '--SEGMENT_LIMIT', type=int,
+                        help="The Segment number limit")
+    parser.add_argument('-latency', '--LATENCY', type=float, default=config_dash.SIM_REQUEST_LATENCY,
+                        help="Seconds added to every segment download")
+    parser.add_argument('-v', '--VERBOSE', action='store_true', default=False,
+                        help="Log every decision of the player")
+
+
+def main():
+    """ Main Program wrapper """
+    parser = ArgumentParser(description='Simulate a playback session over a throughput trace')
+    create_arguments(parser)
+    args = parser.parse_args()
+    playback_type = PLAYBACK_TYPES.get(args.PLAYBACK.lower(), args.PLAYBACK.upper())
+    connection_type = "SIM_" + os.path.splitext(os.path.basename(args.TRACE))[0] + "_" + args.PLAYBACK
+    configure_log_file(playback_type=args.PLAYBACK.lower(), connection_type=connection_type, log_file=None)
+    if not args.VERBOSE:
+        config_dash.LOG.setLevel(logging.WARNING)
+    start_time = timeit.default_timer()
+    trace = load_trace(args.TRACE)
+    dp_object, video_segment_duration = read_mpd.read_mpd(args.MPD, read_mpd.DashPlayback())
+    playback_time, total_downloaded, session_duration = simulate(dp_object, video_segment_duration, trace,
+                                                                 playback_type, connection_type, args.SEGMENT_LIMIT,
+                                                                 args.LATENCY)
+    playback_info = config_dash.JSON_HANDLE['playback_info']
+    bitrates = [segment_info[1] for segment_info in config_dash.JSON_HANDLE['segment_info']]
+    print "PLAYBACK TIME: ", playback_time
+    print "SESSION DURATION: ", session_duration
+    print "TOTAL DOWNLOADED: ", total_downloaded
+    print "AVERAGE BITRATE: ", sum(bitrates) / len(bitrates) if bitrates else 0
+    print "INTERRUPTIONS: ", playback_info['interruptions']['count'], "TOTAL: ", \
+        playback_info['interruptions']['total_duration']
+    print "UP SHIFTS: ", playback_info['up_shifts'], "DOWN SHIFTS: ", playback_info['down_shifts']
+    print "SIMULATED IN: ", timeit.default_timer() - start_time, "seconds"
+    print "BUFFER LOG: ", config_dash.BUFFER_LOG_FILENAME + "_" + connection_type + ".csv"
+    print "JSON LOG: ", config_dash.JSON_LOG
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,13 @@
-import time
+import playback_clock
 
 
 class StopWatch():
     """ Implements a stop watch function
         Modified from http://code.activestate.com/recipes/124894-stopwatch-in-tkinter/
+        Reads the playback clock (playback_clock.get_clock) with sub-second resolution
     """
-    def __init__(self):
+    def __init__(self, clock=None):
+        self.clock = clock or playback_clock.get_clock()
         self.start_time = 0.0
         self.elapsed_time = 0.0
         self.running = 0
@@ -13,35 +15,46 @@ class StopWatch():
     def start(self):
         """ Start the stopwatch, ignore if running. """
         if not self.running:
-            self.start_time = time.time() - self.elapsed_time
+            self.start_time = self.clock.time() - self.elapsed_time
             self.running = 1
     
     def pause(self):
         """ Stop the stopwatch, ignore if already paused."""
         if self.running:
-            self.elapsed_time = time.time() - self.start_time
+            self.elapsed_time = self.clock.time() - self.start_time
             self.running = 0
     
     def reset(self):
         """ Reset the stopwatch. """
-        self.start_time = time.time()
+        self.start_time = self.clock.time()
         self.elapsed_time = 0.0
         
     def backwardStartTime(self,seconds):
         """ Reset the stopwatch. """
         self.start_time = self.start_time-seconds
-        self.elapsed_time = time.time() - self.start_time
+        self.elapsed_time = self.clock.time() - self.start_time
         
     def forwardStartTime(self,seconds):
         """ Reset the stopwatch. """
         self.start_time = self.start_time+seconds
-        self.elapsed_time = time.time() - self.start_time
+        self.elapsed_time = self.clock.time() - self.start_time
 
     def time(self):
         """
-        :return: elapsed time
+        :return: elapsed time in seconds
         """
         if self.running:
-            self.elapsed_time = time.time() - self.start_time
-        return int(self.elapsed_time)
+            self.elapsed_time = self.clock.time() - self.start_time
+        return self.elapsed_time
+
+    def time_until(self, target):
+        """
+        :param target: stopwatch reading in seconds
+        :return: seconds of running time left before the stopwatch reaches target
+        """
+        if self.running:
+            elapsed_time = self.clock.time() - self.start_time
+        else:
+            elapsed_time = self.elapsed_time
+        return max(target - elapsed_time, 0)
     
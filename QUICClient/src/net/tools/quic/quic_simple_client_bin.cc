@@ -126,6 +126,11 @@ string FLAGS_benchmark_file_url = "";
 
 int32_t FLAGS_max_repeat_count = 0;
 
+// Seconds from start until now, for the timing records
+static double SecondsSince(std::chrono::steady_clock::time_point start) {
+	return std::chrono::duration<double>(std::chrono::steady_clock::now() - start).count();
+}
+
 class FakeProofVerifier: public ProofVerifier {
 public:
 	net::QuicAsyncStatus VerifyProof(const string& hostname, const uint16_t port, const string& server_config,
@@ -179,7 +184,8 @@ int main(int argc, char* argv[]) {
 				"--initial_mtu=<initial_mtu> specify the initial MTU of the connection"
 				"\n"
 				"--disable-certificate-verification do not verify certificates\n"
-				"--folder=<segment_download_folder>\n";
+				"--folder=<segment_download_folder> save the segments in this folder. "
+				"If not set the segments are only measured\n";
 		cout << help_str;
 		exit(0);
 	}
@@ -312,7 +318,11 @@ int main(int argc, char* argv[]) {
 				cerr << "Failed to initialize client." << endl;
 				return 1;
 			}
-			if (!client.Connect()) {
+			// Connect() includes the crypto handshake. It is reported in the timing record of the first request
+			auto connect_start = std::chrono::steady_clock::now();
+			bool connected = client.Connect();
+			double handshake_seconds = SecondsSince(connect_start);
+			if (!connected) {
 				net::QuicErrorCode error = client.session()->error();
 				if (FLAGS_version_mismatch_ok && error == net::QUIC_INVALID_VERSION) {
 					cout << "Server talks QUIC, but none of the versions supported by " << "this client: "
@@ -446,6 +456,8 @@ int main(int argc, char* argv[]) {
 
 			} else {
 
+				// Number of the request in the timing records
+				int request_id = 0;
 				while (true) {
 					cin >> segmentUrl;
 					if (segmentUrl.compare(EXIT_COMMAND) == 0) {
@@ -488,7 +500,21 @@ int main(int argc, char* argv[]) {
 					client.set_store_response(true);
 
 					// Send the request.
+					request_id = request_id + 1;
+					auto request_start = std::chrono::steady_clock::now();
 					client.SendRequestAndWaitForResponse(header_block, body, /*fin=*/true);
+					double request_seconds = SecondsSince(request_start);
+
+					// Versioned timing record of the request (see helper_protocol.py). The request runs synchronously,
+					// so the time to the first byte is not known and the transfer covers the whole request.
+					// QUIC has no separate connect: the handshake is the Connect() of the first request
+					int record_code = client.latest_response_code();
+					bool record_success = (record_code >= 200 && record_code < 300)
+							|| (record_code >= 300 && record_code < 400 && FLAGS_redirect_is_success);
+					cout << "result_v1 id=" << request_id << " bytes="
+							<< (record_success ? (long) client.latest_response_body().size() : -1L)
+							<< " connect=0 handshake=" << (request_id == 1 ? handshake_seconds : 0) << " ttfb=- transfer="
+							<< request_seconds << " error=" << (record_success ? 0 : record_code) << endl;
 
 					// Print request and response details.
 					if (!FLAGS_quiet) {
@@ -503,18 +529,21 @@ int main(int argc, char* argv[]) {
 							cout << "body:\n" << QuicTextUtils::HexDump(response_body) << endl;
 						} else {
 
-							size_t found = segmentUrl.find_last_of("/");
+							// Without --folder the segment is only measured, not saved
+							if (!folder.empty()) {
+								size_t found = segmentUrl.find_last_of("/");
 
-							fileName = folder + segmentUrl.substr(found + 1);
+								fileName = folder + segmentUrl.substr(found + 1);
 
-							ofstream outf(fileName.c_str(), ios::binary);
+								ofstream outf(fileName.c_str(), ios::binary);
 
-							if (!outf) {
-								// Print an error and exit
-								cerr << fileName + " ERROR could not be opened for writing!" << endl;
-								exit(1);
+								if (!outf) {
+									// Print an error and exit
+									cerr << fileName + " ERROR could not be opened for writing!" << endl;
+									exit(1);
+								}
+								outf << response_body;
 							}
-							outf << response_body;
 							cout << "file_size_start:" << response_body.size() << ":file_size_end ";
 
 							totalDownloadedBytes = totalDownloadedBytes + response_body.size();
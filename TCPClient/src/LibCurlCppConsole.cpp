@@ -43,6 +43,33 @@ bool cmdOptionExists(char** begin, char** end, const std::string& option) {
 	return std::find(begin, end, option) != end;
 }
 
+// Seconds of a request phase for the timing record, "-" if the phase did not happen
+static string phaseSeconds(double seconds) {
+	if (seconds < 0) {
+		return "-";
+	}
+	stringstream ss;
+	ss << seconds;
+	return ss.str();
+}
+
+// Prints the versioned timing record of the last request before its result frame (see helper_protocol.py)
+static void printResultRecord(CURL *curl, int requestId, long bytes, CURLcode res) {
+	double connectTime = 0, appConnectTime = 0, startTransferTime = 0, totalTime = 0;
+	curl_easy_getinfo(curl, CURLINFO_CONNECT_TIME, &connectTime);
+	curl_easy_getinfo(curl, CURLINFO_APPCONNECT_TIME, &appConnectTime);
+	curl_easy_getinfo(curl, CURLINFO_STARTTRANSFER_TIME, &startTransferTime);
+	curl_easy_getinfo(curl, CURLINFO_TOTAL_TIME, &totalTime);
+	// libcurl times the phases from the start of the request (connect includes the name lookup).
+	// They are 0 for the phases that did not happen, eg: the connect of a reused connection
+	double connectedTime = appConnectTime > 0 ? appConnectTime : connectTime;
+	cout << "result_v1 id=" << requestId << " bytes=" << bytes << " connect=" << connectTime
+			<< " handshake=" << (appConnectTime > 0 ? appConnectTime - connectTime : 0)
+			<< " ttfb=" << phaseSeconds(startTransferTime > 0 ? startTransferTime - connectedTime : -1)
+			<< " transfer=" << phaseSeconds(startTransferTime > 0 ? totalTime - startTransferTime : -1)
+			<< " error=" << res << endl;
+}
+
 int main(int argc, char* argv[]) {
 	CURL *curl;
 	CURLcode res;
@@ -132,18 +159,20 @@ int main(int argc, char* argv[]) {
 						continue;
 					}
 
-					size_t found = segmentUrl.find_last_of("/");
-
-					fileName = folder + segmentUrl.substr(found + 1);
-
-					ofstream outf(fileName.c_str(), ios::binary);
-					if (!outf) {
-						// Print an error and exit
-						cout << fileName + " ERROR could not be opened for writing!" << endl;
-						exit(1);
+					// Without -f the segment is only measured, not saved
+					if (folder) {
+						size_t found = segmentUrl.find_last_of("/");
+						fileName = folder + segmentUrl.substr(found + 1);
+
+						ofstream outf(fileName.c_str(), ios::binary);
+						if (!outf) {
+							// Print an error and exit
+							cout << fileName + " ERROR could not be opened for writing!" << endl;
+							exit(1);
+						}
+						outf << readBuffer;
+						outf.close();
 					}
-
-					outf << readBuffer;
 					cout << "file_size_start:" << readBuffer.size() << ":file_size_end ";
 					totalDownloadedBytes = totalDownloadedBytes + readBuffer.size();
 					std::cout << " total_downloaded : " << totalDownloadedBytes << " ";
@@ -154,7 +183,6 @@ int main(int argc, char* argv[]) {
 					}
 
 					readBuffer.clear();
-					outf.close();
 
 					segmentNo = segmentNo + 1;
 				}
@@ -171,6 +199,8 @@ int main(int argc, char* argv[]) {
 			std::cout << "sum of total downloaded bytes: " << totalDownloadedBytes << endl;
 		} else {
 
+			// Number of the request in the timing records
+			int requestId = 0;
 			while (true) {
 				std::string readBuffer;
 				cin >> segmentUrl;
@@ -181,6 +211,7 @@ int main(int argc, char* argv[]) {
 					exit(0);
 				}
 
+				requestId = requestId + 1;
 				//CURL START
 				curl_easy_setopt(curl, CURLOPT_URL, segmentUrl.c_str());
 				curl_easy_setopt(curl, CURLOPT_FOLLOWLOCATION, 1L);
@@ -195,6 +226,8 @@ int main(int argc, char* argv[]) {
 				}
 
 
+				printResultRecord(curl, requestId, res == CURLE_OK ? (long) readBuffer.size() : -1, res);
+
 				if (res != CURLE_OK) {
 					readBuffer.clear();
 					cout << "file_size_start:" << "-1" << ":file_size_end ";
@@ -203,23 +236,26 @@ int main(int argc, char* argv[]) {
 					continue;
 				} else {
 
-					size_t found = segmentUrl.find_last_of("/");
-					fileName = folder + segmentUrl.substr(found + 1);
-
-					ofstream outf(fileName.c_str(), ios::binary);
-					if (!outf) {
-						// Print an error and exit
-						cout << fileName + " ERROR could not be opened for writing!" << endl;
-						exit(1);
+					// Without -f the segment is only measured, not saved
+					if (folder) {
+						size_t found = segmentUrl.find_last_of("/");
+						fileName = folder + segmentUrl.substr(found + 1);
+
+						ofstream outf(fileName.c_str(), ios::binary);
+						if (!outf) {
+							// Print an error and exit
+							cout << fileName + " ERROR could not be opened for writing!" << endl;
+							exit(1);
+						}
+						outf << readBuffer;
+						outf.close();
 					}
-					outf << readBuffer;
 					cout << "file_size_start:" << readBuffer.size() << ":file_size_end ";
 					if (res == 0) {
 						cout << "Request succeeded (200)." << endl;
 					}
 					cout.flush();
 					readBuffer.clear();
-					outf.close();
 				}
 			}
 		}